@@ -0,0 +1,193 @@
+"""
+    Fixed-width account store. Every account record takes exactly RECORD_SIZE bytes
+    so a single account can be overwritten in place with one seek and one write.
+
+    Records keep the comma layout of accounts.txt (padded with spaces) so the
+    store can still be read by Menu.load_accounts and by a person.
+
+    Usage (converts the comma separated file into a store):
+        python account_store.py accounts.txt accounts.dat
+"""
+import os
+import sys
+import threading
+
+import bank as b
+
+# column widths of a record
+ID_WIDTH = 10
+TYPE_WIDTH = 1
+BALANCE_WIDTH = 24
+CREDIT_WIDTH = 16
+TIMESTAMP_WIDTH = 19
+# ", " between the five columns and a newline on the end
+RECORD_SIZE = ID_WIDTH + TYPE_WIDTH + BALANCE_WIDTH + CREDIT_WIDTH + TIMESTAMP_WIDTH + 4 * 2 + 1
+
+
+class RecordTooWide(Exception):
+    """Raised if a value does not fit in its fixed-width column"""
+
+
+class AccountStore():
+    """
+    Fixed-width account file with an in memory id -> byte offset index.
+
+        Attributes:
+            filename : str
+                the store file
+            _offsets : dict[int, int]
+                byte offset of every account record
+            _free : list[int]
+                offsets of removed records that can be reused
+
+        Methods:
+            write(account_id, acc_type, balance, credit, timestamp):
+                overwrites (or adds) one account record in place
+            remove(account_id):
+                blanks out an account record
+            close():
+                closes the store file
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._offsets = {}
+        self._free = []
+        self._lock = threading.Lock()
+        # creates the file if it does not exist yet
+        if not os.path.exists(filename):
+            open(filename, "wb").close()
+        self._file = open(filename, "r+b")
+        self.build_index()
+
+    def build_index(self):
+        """Scans the store once and records where each account lives"""
+        self._offsets.clear()
+        self._free.clear()
+        self._file.seek(0)
+        offset = 0
+        while True:
+            record = self._file.read(RECORD_SIZE)
+            if record.__len__() < RECORD_SIZE:
+                break
+            head = record[:ID_WIDTH].strip()
+            # removed records are blank and can be reused
+            if head.isdigit():
+                self._offsets[int(head)] = offset
+            else:
+                self._free.append(offset)
+            offset += RECORD_SIZE
+
+    def __contains__(self, account_id: int):
+        return account_id in self._offsets
+
+    def write(self, account_id: int, acc_type: int, balance: float, credit=None, timestamp=None):
+        """
+        Overwrites one account record in place, adding it if the account is new
+
+            Args:
+                account_id (int): id of the account
+                acc_type (int): 0 - savings, 1 - checking
+                balance (float): balance of the account
+                credit (int): credit limit of checking accounts
+                timestamp (str): last transfer time of savings accounts
+        """
+        record = encode_record(account_id, acc_type, balance, credit, timestamp)
+        with self._lock:
+            offset = self._offsets.get(account_id)
+            if offset is None:
+                # reuses a removed slot before growing the file
+                if self._free:
+                    offset = self._free.pop()
+                else:
+                    offset = self._file.seek(0, os.SEEK_END)
+                self._offsets[account_id] = offset
+            # one seek and one write - no other record is touched
+            self._file.seek(offset)
+            self._file.write(record)
+            self._file.flush()
+
+    def remove(self, account_id: int):
+        """
+        Blanks out an account record so its slot can be reused
+
+            Args:
+                account_id (int): id of the account to remove
+        """
+        with self._lock:
+            offset = self._offsets.pop(account_id, None)
+            if offset is not None:
+                # a comment line is skipped by the account loader
+                self._file.seek(offset)
+                self._file.write(b"#" + b" " * (RECORD_SIZE - 2) + b"\n")
+                self._file.flush()
+                self._free.append(offset)
+
+    def close(self):
+        """Closes the store file"""
+        with self._lock:
+            self._file.close()
+
+
+def encode_record(account_id: int, acc_type: int, balance: float, credit=None, timestamp=None) -> (bytes):
+    """
+    Builds a fixed-width account record
+
+        Args:
+            account_id (int): id of the account
+            acc_type (int): 0 - savings, 1 - checking
+            balance (float): balance of the account
+            credit (int): credit limit of checking accounts
+            timestamp (str): last transfer time of savings accounts
+
+        Returns:
+            bytes: record of exactly RECORD_SIZE bytes
+    """
+    columns = [(str(account_id), ID_WIDTH),
+               (str(acc_type), TYPE_WIDTH),
+               (repr(float(balance)), BALANCE_WIDTH),
+               ("" if credit is None else str(credit), CREDIT_WIDTH),
+               ("" if timestamp is None else str(timestamp), TIMESTAMP_WIDTH)]
+    for value, width in columns:
+        if value.__len__() > width:
+            raise RecordTooWide(f"{value} does not fit in {width} characters")
+    record = ", ".join(value.rjust(width) for value, width in columns)
+    return f"{record}\n".encode("ascii")
+
+
+def convert(csv_file: str, store_file: str) -> (int):
+    """
+    Converts a comma separated accounts file into a fixed-width store
+
+        Args:
+            csv_file (str): the accounts.txt style file to read
+            store_file (str): the store file to create
+
+        Returns:
+            int: number of accounts converted
+    """
+    records = []
+    account_lines = b.file_handler(csv_file)
+    if account_lines is not None:
+        for line in account_lines:
+            # skips comments and broken lines just like the loader does
+            if b.file_line_validator(b.Account, line):
+                row = line.rstrip("\n").split(",")
+                acc_type = int(row[1].strip())
+                if acc_type == 0:
+                    records.append(encode_record(int(row[0].strip()), acc_type,
+                                                 float(row[2].strip()), timestamp=row[4].strip()))
+                else:
+                    records.append(encode_record(int(row[0].strip()), acc_type,
+                                                 float(row[2].strip()), credit=row[3].strip()))
+    # writes the whole store in one go
+    with open(store_file, "wb") as myfile:
+        myfile.write(b"".join(records))
+    return records.__len__()
+
+
+if __name__ == "__main__":
+    if sys.argv.__len__() != 3:
+        print("Usage: python account_store.py <accounts.txt> <store file>")
+        sys.exit(1)
+    print(f"Converted {convert(sys.argv[1], sys.argv[2])} accounts into {sys.argv[2]}.")
@@ -5,17 +5,102 @@
 
 from types import resolve_bases
 from typing import List, Type
+import contextlib
 import datetime
+import os
+from functools import lru_cache
 import shutil
+import threading
+
+import ids
+import journal
+import ledger
+import limits
+import mapped_ledger
+import name_index
+import parallel_load
+import timestamps
 class CustomerOutOfRange(Exception):
     """Raised if the account being references has an id of an invalid customer"""
 class FileCreationReadError(Exception):
     """Raised if the folder is inaccesible"""
+class InvalidRecord(Exception):
+    """Raised if a line of a data file can not be turned into a record"""
+    def __init__(self, reason: str, line: str = ""):
+        super().__init__(reason)
+        self.reason = reason
+        self.line = line
 # GLOBAL VARIABLE DECLARATION
 CUSTOMER_FILE = "customers.txt"
 ACCOUNTS_FILE = "accounts.txt"
 TRANSACTION_FILE = "accountsTransactions.txt"
 NON_DESTRUCT = False
+# fixed-width account store (account_store.AccountStore) - the journal is used when None
+ACCOUNT_STORE = None
+# storage backend (storage.Storage) - the .txt files above are used when None
+STORAGE = None
+# worker processes parsing large data files on load - 1 reads them serially
+LOAD_WORKERS = 1
+# unit of work (unit_of_work.UnitOfWork) - customer and account changes are written straight away when None
+UNIT_OF_WORK = None
+# held by everything that writes the customers file, so an append can't land between a rewrite's read and write
+CUSTOMER_FILE_LOCK = threading.RLock()
+# unlock times of limited savings accounts - run advance() before reading limit_reached
+LIMIT_SCHEDULER = limits.LimitScheduler()
+# balance journal for the current ACCOUNTS_FILE - created on first use
+_account_journal = None
+def account_journal() -> (journal.BalanceJournal):
+    """
+    Returns the balance journal of the current accounts file, creating it if needed
+
+        Returns:
+            BalanceJournal: journal that balance changes are appended to
+    """
+    global _account_journal
+    # main.py can change the file names after import so the journal follows them
+    if (_account_journal is None or _account_journal.accounts_file != ACCOUNTS_FILE
+            or _account_journal.ledger_file != TRANSACTION_FILE):
+        _account_journal = journal.BalanceJournal(f"{ACCOUNTS_FILE}.journal", ACCOUNTS_FILE, TRANSACTION_FILE)
+    return _account_journal
+# group-committing writer for the current TRANSACTION_FILE - created on first use
+_ledger_writer = None
+def ledger_writer() -> (ledger.LedgerWriter):
+    """
+    Returns the group-committing writer of the current transaction file, creating it if needed
+
+        Returns:
+            LedgerWriter: writer that transaction lines are appended through
+    """
+    global _ledger_writer
+    # main.py can change TRANSACTION_FILE after import so the writer follows it
+    if _ledger_writer is None or _ledger_writer.filename != TRANSACTION_FILE:
+        close_ledger()
+        _ledger_writer = ledger.LedgerWriter(TRANSACTION_FILE)
+    return _ledger_writer
+def flush_ledger():
+    """Makes sure every queued transaction line is in the transaction file before it is read"""
+    if _ledger_writer is not None:
+        _ledger_writer.flush()
+def close_ledger():
+    """Flushes and closes the transaction file writer"""
+    global _ledger_writer
+    if _ledger_writer is not None:
+        _ledger_writer.close()
+        _ledger_writer = None
+# id allocator next to the current TRANSACTION_FILE - created on first use
+_id_allocator = None
+def id_allocator():
+    """
+    Returns the id allocator of the current data files, creating it if needed
+
+        Returns:
+            IdAllocator: where new customer, account and transaction ids come from
+    """
+    global _id_allocator
+    # main.py can change TRANSACTION_FILE after import so the allocator follows it
+    if _id_allocator is None or _id_allocator.filename != f"{TRANSACTION_FILE}.ids":
+        _id_allocator = ids.IdAllocator(f"{TRANSACTION_FILE}.ids")
+    return _id_allocator
 def file_handler(filename : str) -> (list):
     """
     opens the file - and then returns a list of those lines, NOne if failed
@@ -104,7 +189,7 @@ def file_line_validator(object_type: type, line: str) -> (bool):
                         acc_type = int(row[1].strip())
                         if(acc_type != 0 or acc_type != 1):
                             if(acc_type == 0):
-                                datetime.datetime.strptime(row[4].strip(), '%b %d %Y %I:%M%p')
+                                timestamps.parse(row[4].strip())
                             # Valid Line :)
                             return True
                         else:
@@ -169,8 +254,8 @@ def file_line_validator(object_type: type, line: str) -> (bool):
                 int(row[1].strip())
                 float(row[3].strip())
                 int(row[2].strip())
-                # datetime.datetime.strptime('Jun 1 2005  1:33PM', '%b %d %Y %I:%M%p')
-                datetime.datetime.strptime(row[5].strip(), '%b %d %Y %I:%M%p')
+                # timestamps.parse('Jun 1 2005  1:33PM')
+                timestamps.parse(row[5].strip())
                 # can only return true if the line is numeric
                 return True
             except ValueError as e:
@@ -186,7 +271,265 @@ def file_line_validator(object_type: type, line: str) -> (bool):
         else:
             return False
 
+def parse_customer(line: str):
+    """
+    Validates and builds a Customer from a customers file line in one pass
+
+        Args:
+            line (str): the line to parse
+
+        Returns:
+            Customer: the customer on the line
+                      None if the line is blank or a comment
+
+        Raises:
+            InvalidRecord: the line is not a valid customer
+    """
+    line = line.strip("\n")
+    # comments and blank lines are not errors
+    if line == "" or line[0] == "#":
+        return None
+    row = line.split(",")
+    if row.__len__() != 5 or line.count("[") != 1 or line.count("]") != 1:
+        raise InvalidRecord("customer lines need 5 columns and one [account list]", line)
+    cust_id = row[0].strip()
+    age = row[2].strip()
+    if not (cust_id.isnumeric() and age.isnumeric()):
+        raise InvalidRecord("customer id and age must be numeric", line)
+    # removes the []s from account id list
+    account_ids = row[4].strip().lstrip("[").rstrip("]")
+    try:
+        id_list = [int(i) for i in account_ids.split("-")] if account_ids != "" else []
+    except ValueError:
+        raise InvalidRecord("account ids must be numbers separated by -s", line)
+    return Customer(int(cust_id), row[1].strip(), int(age), row[3].strip(), id_list)
+
+def parse_account(line: str):
+    """
+    Validates and builds a SavingAccount or CheckingAccount from an accounts file
+    line in one pass
+
+        Args:
+            line (str): the line to parse
+
+        Returns:
+            Account: the account on the line
+                     None if the line is blank or a comment
+
+        Raises:
+            InvalidRecord: the line is not a valid account
+    """
+    line = line.strip("\n")
+    # comments and blank lines are not errors
+    if line == "" or line[0] == "#":
+        return None
+    row = line.split(",")
+    if row.__len__() != 4 and row.__len__() != 5:
+        raise InvalidRecord("account lines need 4 or 5 columns", line)
+    try:
+        acc_id = int(row[0].strip())
+        acc_type = int(row[1].strip())
+        balance = float(row[2].strip())
+        if acc_type == 0:
+            # the timestamp is checked by the account as it is built
+            return SavingAccount(acc_id, balance, last_transfer=row[4].strip())
+        elif acc_type == 1:
+            return CheckingAccount(acc_id, balance, int(row[3].strip()))
+    except (ValueError, IndexError) as e:
+        raise InvalidRecord(f"bad account field ({e})", line)
+    raise InvalidRecord(f"unknown account type {acc_type}", line)
+
+def parse_transaction(line: str):
+    """
+    Validates and builds a Transaction from a transaction file line in one pass
+
+        Args:
+            line (str): the line to parse
+
+        Returns:
+            Transaction: the transaction on the line
+                         None if the line is blank or a comment
+
+        Raises:
+            InvalidRecord: the line is not a valid transaction
+    """
+    line = line.strip("\n")
+    # comments and blank lines are not errors
+    if line == "" or line[0] == "#":
+        return None
+    row = line.split(",")
+    if row.__len__() != 6:
+        raise InvalidRecord("transaction lines need 6 columns", line)
+    try:
+        # the timestamp is checked by the transaction as it is built
+        return Transaction(int(row[0]), int(row[1]), int(row[2]),
+                           float(row[3]), int(row[4]), row[5].strip())
+    except ValueError as e:
+        raise InvalidRecord(f"bad transaction field ({e})", line)
+
+def iter_records(filename: str, parser):
+    """
+    Streams records out of a data file one line at a time using one of the
+    parse_ functions. Invalid lines are skipped.
+
+        Args:
+            filename (str): the file to read
+            parser (function): parse_customer, parse_account or parse_transaction
+
+        Yields:
+            Customer, Account or Transaction: each valid record in file order
+    """
+    try:
+        file = open(filename, 'r')
+    except FileNotFoundError:
+        # lets file_handler create the missing file - nothing to stream
+        file_handler(filename)
+        return
+    with file:
+        for line in file:
+            try:
+                record = parser(line)
+            except InvalidRecord:
+                # skips broken lines just like the loaders always have
+                continue
+            if record is not None:
+                yield record
+
+def iter_transactions(filename: str, end: int = None):
+    """
+    Streams Transaction objects out of the transaction file - the file is memory
+    mapped and parsed in place, so no list or string per line is built
+
+        Args:
+            filename (str): the transaction file
+            end (int): offset just past the last line to read - the end of the file if None
+
+        Yields:
+            Transaction: each valid transaction in file order
+    """
+    if STORAGE is not None:
+        return STORAGE.iter_transactions()
+    flush_ledger()
+    if LOAD_WORKERS > 1:
+        return parallel_load.iter_parallel(filename, parse_transaction, LOAD_WORKERS, end)
+    return mapped_ledger.iter_transactions(filename, end)
+
+def iter_customers(filename: str):
+    """
+    Streams Customer objects out of the customers file, or the storage backend
+
+        Args:
+            filename (str): the customers file
+
+        Yields:
+            Customer: each valid customer
+    """
+    if STORAGE is not None:
+        return STORAGE.iter_customers()
+    return parallel_load.iter_parallel(filename, parse_customer, LOAD_WORKERS)
+
+def iter_accounts(filename: str):
+    """
+    Streams Account objects out of the accounts file, or the storage backend.
+    Journaled records come after the file's so the newest state of an account
+    is the last one yielded.
+
+        Args:
+            filename (str): the accounts file
+
+        Yields:
+            Account: each valid account
+    """
+    if STORAGE is not None:
+        yield from STORAGE.iter_accounts()
+        return
+    yield from parallel_load.iter_parallel(filename, parse_account, LOAD_WORKERS)
+    yield from iter_journaled_accounts()
+
+def iter_journaled_accounts():
+    """
+    Streams the accounts held in the balance journal - each is newer than its
+    accounts file line
+
+        Yields:
+            Account: each valid journaled account
+    """
+    for line in account_journal().records():
+        try:
+            account = parse_account(line)
+        except InvalidRecord:
+            # skips this
+            continue
+        if account is not None:
+            yield account
+
+def last_transaction_id(filename: str, block_size: int = 4096):
+    """
+    Reads the transaction file backwards to find the id of the last valid line,
+    so the id counter is known without loading the ledger
+
+        Args:
+            filename (str): the transaction file
+            block_size (int): bytes read per step from the end of the file
+
+        Returns:
+            int: id of the last transaction, None if there are none
+    """
+    if STORAGE is not None:
+        return STORAGE.last_transaction_id()
+    flush_ledger()
+    try:
+        with open(filename, 'rb') as file:
+            position = file.seek(0, os.SEEK_END)
+            tail = b""
+            while position > 0:
+                step = min(block_size, position)
+                position -= step
+                file.seek(position)
+                tail = file.read(step) + tail
+                lines = tail.split(b"\n")
+                # the first piece may be the end of an earlier line unless we hit the start
+                complete = lines if position == 0 else lines[1:]
+                for line in reversed(complete):
+                    line = line.decode(errors="replace")
+                    if line.strip() != "" and file_line_validator(Transaction, line):
+                        return int(line.split(",", maxsplit=1)[0].strip())
+                tail = lines[0]
+    except FileNotFoundError:
+        pass
+    return None
+
 def remove_item(object_file, deleted_id):
+    # a dirty record would be written back by the next commit
+    if UNIT_OF_WORK is not None:
+        if object_file == ACCOUNTS_FILE:
+            UNIT_OF_WORK.discard_account(deleted_id)
+        elif object_file == CUSTOMER_FILE:
+            UNIT_OF_WORK.discard_customer(deleted_id)
+    # the storage backend deletes the row
+    if STORAGE is not None:
+        if object_file == ACCOUNTS_FILE:
+            STORAGE.remove_account(deleted_id)
+        elif object_file == CUSTOMER_FILE:
+            STORAGE.remove_customer(deleted_id)
+        return
+    if object_file == ACCOUNTS_FILE:
+        # the account store blanks the record in place
+        if ACCOUNT_STORE is not None:
+            ACCOUNT_STORE.remove(deleted_id)
+            return
+        # a checkpoint between the read and the rewrite would be undone
+        with account_journal().lock:
+            # pending journal records would otherwise bring a removed account back
+            account_journal().discard(deleted_id)
+            remove_line(object_file, deleted_id)
+        return
+    lock = CUSTOMER_FILE_LOCK if object_file == CUSTOMER_FILE else contextlib.nullcontext()
+    with lock:
+        remove_line(object_file, deleted_id)
+
+def remove_line(object_file, deleted_id):
+    """Rewrites a data file without the line of an id"""
     file_to_change = file_handler(object_file)
     if file_to_change is not None:
         # loops through file
@@ -205,6 +548,216 @@ def remove_item(object_file, deleted_id):
         with open(object_file, "w") as myfile:
             myfile.write("".join(file_to_change))
     pass
+def record_line(account_id: int, acc_type: int, balance: float, credit=None, timestamp=None) -> (str):
+    """
+    Builds an accounts file line
+
+        Args:
+            account_id (int): id of the account
+            acc_type (int): 0 - savings, 1 - checking
+            balance (float): balance of the account
+            credit (int): credit limit of checking accounts
+            timestamp (str): last transfer time of savings accounts
+
+        Returns:
+            str: the newline terminated line
+    """
+    line = f"{account_id}, {acc_type}, {balance}"
+    # checks if we add the credit value
+    if credit == None:
+        return f"{line}, ,{timestamp}\n"
+    # adds credit
+    return f"{line}, {credit}\n"
+
+def transaction_line(id: int, transaction_type: int, acc_id: int, amount: float,
+                     rec_acc: int, time_stamp: str) -> (str):
+    """
+    Builds a transaction file line
+
+        Args:
+            id (int): transaction id
+            transaction_type (int): 0 - deposit, 1 - withdraw, 2 - transfer
+            acc_id (int): id of account taken from
+            amount (float): amount of money transacted
+            rec_acc (int): id of account receiving
+            time_stamp (str): time of the transaction
+
+        Returns:
+            str: the newline terminated line
+    """
+    return f"{id}, {transaction_type}, {acc_id}, {amount}, {rec_acc}, {time_stamp}\n"
+
+def ledger_text(transactions: list) -> (str):
+    """
+    Builds the transaction file lines of several transactions
+
+        Args:
+            transactions (list[Transaction]): the transactions in ledger order
+
+        Returns:
+            str: their newline terminated lines joined together
+    """
+    return "".join([transaction_line(t.id, t.transaction_type, t.acc_id, t.amount, t.rec_acc,
+                                     timestamps.format(t.timestamp)) for t in transactions])
+
+def persist_accounts(accounts: list):
+    """
+    Saves several accounts at once - one journal write, or in place updates
+    when an account store is in use
+
+        Args:
+            accounts (list[Account]): the accounts to save
+    """
+    if STORAGE is not None:
+        STORAGE.save_accounts(accounts)
+        return
+    records = {}
+    for account in accounts:
+        acc_type, credit, timestamp = account.record_fields()
+        if ACCOUNT_STORE is not None:
+            # fixed-width store - each record is overwritten in place
+            ACCOUNT_STORE.write(account.id, acc_type, account._balance, credit, timestamp)
+        else:
+            records[account.id] = record_line(account.id, acc_type, account._balance, credit, timestamp)
+    # every journaled record goes out in one write
+    if records:
+        account_journal().append_many(records)
+
+def commit_movements(accounts: list, transactions: list):
+    """
+    Saves changed accounts and the transactions that changed them as one atomic
+    unit - a journal group synced once, or one storage transaction
+
+        Args:
+            accounts (list[Account]): the accounts to save
+            transactions (list[Transaction]): their transactions in ledger order
+    """
+    if STORAGE is not None:
+        with STORAGE.transaction():
+            STORAGE.save_accounts(accounts)
+            STORAGE.append_transactions(transactions)
+        return
+    if ACCOUNT_STORE is not None:
+        # records are overwritten in place so they can't join a group - balances go first
+        persist_accounts(accounts)
+        append_transactions(transactions)
+        return
+    records = {}
+    for account in accounts:
+        acc_type, credit, timestamp = account.record_fields()
+        records[account.id] = record_line(account.id, acc_type, account._balance, credit, timestamp)
+    # the group records the transaction file size - queued lines have to land first
+    flush_ledger()
+    account_journal().commit(records, ledger_text(transactions))
+
+def add_customer(customer):
+    """
+    Saves a new customer
+
+        Args:
+            customer (Customer): the customer to add
+    """
+    if STORAGE is not None:
+        STORAGE.add_customer(customer)
+        return
+    account_ids = "-".join(map(str, customer.account_ids))
+    with CUSTOMER_FILE_LOCK, open(CUSTOMER_FILE, "a") as myfile:
+        myfile.write(f"{customer.id}, {customer.name}, {customer.age}, {customer.password}, [{account_ids}]\n")
+
+def add_account(account):
+    """
+    Saves a new account
+
+        Args:
+            account (Account): the account to add
+    """
+    if STORAGE is not None:
+        STORAGE.add_account(account)
+        return
+    acc_type, credit, timestamp = account.record_fields()
+    # the account store adds the record in its own format
+    if ACCOUNT_STORE is not None:
+        ACCOUNT_STORE.write(account.id, acc_type, account._balance, credit, timestamp)
+        return
+    # a checkpoint replacing the file would drop a line appended while it runs
+    with account_journal().lock, open(ACCOUNTS_FILE, "a") as myfile:
+        myfile.write(record_line(account.id, acc_type, account._balance, credit, timestamp))
+
+def append_transactions(transactions: list):
+    """
+    Adds transactions to the end of the ledger with one append, group committed
+    with any other appends made at the same time
+
+        Args:
+            transactions (list[Transaction]): the transactions in ledger order
+    """
+    # balances the lines describe are written first
+    if UNIT_OF_WORK is not None:
+        UNIT_OF_WORK.commit_accounts()
+    if STORAGE is not None:
+        STORAGE.append_transactions(transactions)
+        return
+    ledger_writer().append(ledger_text(transactions))
+
+def save_customers(customers: list, file: str = None):
+    """
+    Writes the current state of several customers - one row update each for the
+    storage backend, otherwise one rewrite of the customers file for all of them
+
+        Args:
+            customers (list[Customer]): the changed customers
+            file (str): the customers file - CUSTOMER_FILE if None
+    """
+    if STORAGE is not None:
+        with STORAGE.transaction():
+            for customer in customers:
+                STORAGE.save_customer(customer)
+        return
+    file = CUSTOMER_FILE if file is None else file
+    changed = {customer.id: customer for customer in customers}
+    # an append between the read and the rewrite would be lost
+    with CUSTOMER_FILE_LOCK:
+        # loads file from file handler
+        customer_file = file_handler(file)
+        # checks if file handler failed
+        if customer_file is None:
+            return
+        # loops through customer file
+        for i in range(0, customer_file.__len__()):
+            # selects the line
+            line = customer_file[i]
+            # makes sure the line isnt just a text block or comment
+            if file_line_validator(Customer, line):
+                # This gets the first value from the line and sees if it's a changed customer
+                customer = changed.get(int(line.split(",", maxsplit=1)[0].strip()))
+                if customer is not None:
+                    # converts account ids to string so it can be joined by "-"s
+                    account_ids = "-".join(map(str, customer.account_ids))
+                    # recreates the line from the file
+                    line = f"{customer.id}, {customer._name}, {customer._age}, {customer.password}, [{account_ids}]\n"
+                    # a customer that no longer makes a valid line keeps the one on file
+                    if file_line_validator(Customer, line):
+                        # updates the line
+                        customer_file[i] = line
+            else:
+                # we skip the line
+                continue
+        # opens the customer file and rewrites all of the lines
+        with open(file, "w") as myfile:
+            myfile.write("".join(customer_file))
+
+def storage_transaction():
+    """
+    Returns a context manager that commits everything saved inside it together,
+    a no-op one for the .txt files
+
+        Returns:
+            context manager: STORAGE.transaction() or contextlib.nullcontext()
+    """
+    if STORAGE is not None:
+        return STORAGE.transaction()
+    return contextlib.nullcontext()
+
 class BalanceTooLow(Exception):
     """Raised if the balance of the account goes too low"""
 
@@ -232,9 +785,10 @@ class Account():
                 Updates the account file with the current accounts
 
     """
+    # no per-instance __dict__ - accounts are kept resident by the Menu
+    __slots__ = ("id", "_balance")
     # defines our account types
     type = "Generic Account"
-    id = 0
     limit_reached = False
     def __init__(self, id: int,  balance: float):
         """Account initializer - nothing too interesting"""
@@ -318,41 +872,38 @@ class Account():
 
     def update_account_file(self, acc_type: int, credit=None, timestamp=None):
         '''
-        Updates the accounts file with class info.
+        Records the account's current state in the balance journal, or overwrites
+        its record in place when an account store is in use.
+        The journal is folded into the accounts file on checkpoint.
 
             Args:
                 acc_type (int): A decimal integer containing account types
                 credit (int): Another decimal integer containing  credit
+                timestamp (str): last transfer time of savings accounts
+        '''
+        # written with the other dirty records on the next commit
+        if UNIT_OF_WORK is not None:
+            UNIT_OF_WORK.mark_account(self)
+            return
+        # storage backend - a single row update
+        if STORAGE is not None:
+            STORAGE.save_accounts([self])
+            return
+        # fixed-width store - a single seek and write
+        if ACCOUNT_STORE is not None:
+            ACCOUNT_STORE.write(self.id, acc_type, self._balance, credit, timestamp)
+            return
+        # appends one line - cost no longer depends on the number of accounts
+        account_journal().append(self.id, record_line(self.id, acc_type, self._balance, credit, timestamp))
+
+    def record_fields(self) -> (tuple):
+        '''
+        Returns the fields update_account_file writes for this account
 
             Returns:
-                binary_sum (str): Binary string of the sum of a and b
+                tuple: (acc_type, credit, timestamp)
         '''
-        # loads the file into memory
-        account_file = file_handler(ACCOUNTS_FILE)
-        if account_file is not None:
-            # loops through file
-            for i in range(0, account_file.__len__()):
-                # loads the line from the file
-                line = account_file[i]
-                # checks if the line is validated
-                if file_line_validator(Account, line):
-                    # checks if the int of the line scanned matches this objects id
-                    if int(line.split(",", maxsplit=1)[0].strip()) == self.id:
-                        # updates the line with current info
-                        line = f"{self.id}, {acc_type}, {self._balance}"
-                        # checks if we add the credit value
-                        if credit == None:
-                            line = f"{line}, ,{timestamp}\n"
-                        # adds credit
-                        else:
-                            line = f"{line}, {credit}\n"
-                        account_file[i] = line
-                        break
-                else:
-                    pass
-            # recreates the accounts file
-            with open(ACCOUNTS_FILE, "w") as myfile:
-                myfile.write("".join(account_file))
+        return (0, None, None)
 
 class CheckingAccount(Account):
     """
@@ -380,8 +931,8 @@ class CheckingAccount(Account):
                 Updates the account file with the current accounts
 
     """
+    __slots__ = ("credit_limit",)
     type = "Checking Account"
-    credit_limit = 100
 
     def __init__(self, id: int,  balance: float, credit_lim: float = 100):
         """Initializes checking account"""
@@ -411,6 +962,10 @@ class CheckingAccount(Account):
     def update_account_file(self, acc_type=1):
         """Updates the account file with this account"""
         super().update_account_file(acc_type, self.credit_limit)
+
+    def record_fields(self) -> (tuple):
+        """Returns (acc_type, credit, timestamp) of this account's record"""
+        return (1, self.credit_limit, None)
         
     def withdraw(self, amount: float) -> (bool):
         """Withdraws money from account"""
@@ -443,21 +998,20 @@ class SavingAccount(Account):
                 Updates the account file with the current accounts 
 
     """
+    # limit_reached is stored per savings account (other accounts use Account's default)
+    # and cleared by LIMIT_SCHEDULER once _unlock_at has passed - it holds weak references
+    __slots__ = ("_last_transfer", "limit_reached", "_unlock_at", "__weakref__")
     type = "Savings Account"
-    limit_reached = False
     # days
     reset_time = 30
     def __init__(self, id: int,  balance: float, last_transfer):
         if(last_transfer is None):
-            self._last_transfer = datetime.datetime.strptime(last_transfer, '%b %d %Y %I:%M%p')
+            self._last_transfer = timestamps.parse(last_transfer)
             self.limit_reached = False
+            self._unlock_at = 0.0
         else:
-            self.last_transfer = datetime.datetime.strptime(last_transfer, '%b %d %Y %I:%M%p')
-            delta = datetime.datetime.now().date() - self._last_transfer.date()
-            if(delta.days >= self.reset_time ):
-                self.limit_reached = False
-            else:
-                self.limit_reached = True
+            # works out the unlock time once and queues it
+            self.last_transfer = timestamps.parse(last_transfer)
         super().__init__(id, balance)
 
     def __str__(self):
@@ -477,25 +1031,25 @@ class SavingAccount(Account):
         elif value < self._balance:
             self._balance = value
             self.last_transfer = datetime.datetime.now()
-        self.update_account_file(0, credit=None, timestamp=self.last_transfer.strftime('%b %d %Y %I:%M%p'))
+        self.update_account_file(0, credit=None, timestamp=timestamps.format(self.last_transfer))
     @property
     def last_transfer(self):
         return self._last_transfer
     @last_transfer.setter
     def last_transfer(self, value):
-        trans =  value
-        delta = datetime.datetime.now().date() - trans.date()
-        if(delta.days >= 30 ):
-            self.limit_reached = False
-        else:
-            self.limit_reached = True
-        self._last_transfer = trans
+        self._last_transfer = value
+        # sets limit_reached and queues the moment it runs out
+        LIMIT_SCHEDULER.schedule(self)
     def update_account_file(self, acc_type: int, credit=None, timestamp=None):
         """trans_type is transaction type
         0 = deposit
         1 = withdraw / transfer"""
         return super().update_account_file(acc_type, credit=credit, timestamp=timestamp)
+    def record_fields(self) -> (tuple):
+        """Returns (acc_type, credit, timestamp) of this account's record"""
+        return (0, None, timestamps.format(self.last_transfer))
     def withdraw(self, amount: float) -> (bool):
+        LIMIT_SCHEDULER.advance()
         if self.limit_reached is False:
             return super().withdraw(amount)
         else:
@@ -506,12 +1060,9 @@ class SavingAccount(Account):
         """
             updates to check if limit was reached and returns the number of days if not
         """
-        delta = datetime.datetime.now().date() - self._last_transfer.date()
-        if(delta.days >= self.reset_time ):
-            self.limit_reached = False
-        else:
-            self.limit_reached = True
-            return self.reset_time - delta.days
+        LIMIT_SCHEDULER.advance()
+        if self.limit_reached:
+            return (datetime.date.fromtimestamp(self._unlock_at) - datetime.date.today()).days
 
 
 class Customer():
@@ -557,14 +1108,28 @@ class Customer():
             transaction_block(acc_objs)
                 acc_objs - list of account objects
                 Returns true if noaccounts with limits were found, False otherwise
+            register_accounts()
+                records this customer as the owner of all of its accounts
+            unregister_accounts()
+                forgets this customer as the owner of its accounts
+            owner_of(account_id)
+                account_id - id of the account to look up
+                returns the customer owning the account (class method)
+
+        Class Attributes:
+            account_owners : dict[int, Customer]
+                reverse index of account id to owning customer
+            names : NameIndex
+                search index of the Menu's customers by name
 
 
     """
-    account_ids = []
-    account_objs = []
-    _name = ""
-    _age = 0
-    id = 0
+    # reverse index - account id -> Customer that owns it
+    account_owners = {}
+    # name search index - filled by the Menu, kept current by the name setter
+    names = name_index.NameIndex()
+    # no per-instance __dict__ - customers are kept resident by the Menu
+    __slots__ = ("id", "_name", "_age", "password", "account_ids", "account_objs")
     """Customer initializer"""
 
     def __init__(self, id: int, cust_name: str, age: int, password: str, ids: List[int]):
@@ -573,6 +1138,7 @@ class Customer():
         self.id = id
         self.password = password
         self.account_ids = ids
+        self.account_objs = []
 
     """"Returns, when requested, a string representing this class"""
     def __str__(self):
@@ -594,7 +1160,12 @@ class Customer():
             name (str): takes name as input.
         """
         # this basically verifies that any set name only has alphabetic and space characters
+        old_name = self._name
         self._name = ''.join([i for i in name if i.isalpha() or i.isspace()])
+        # only customers of the Menu's dict are in the index
+        Customer.names.rename(self.id, old_name, self._name)
+        if UNIT_OF_WORK is not None:
+            UNIT_OF_WORK.mark_customer(self)
     
     @property
     def age(self):
@@ -612,6 +1183,8 @@ class Customer():
             age (int): variable to set to
         """
         self._age = age
+        if UNIT_OF_WORK is not None:
+            UNIT_OF_WORK.mark_customer(self)
 
     def load_account_ids(self, accounts_list : dict):
         """Loads account objs from IDs
@@ -655,11 +1228,16 @@ class Customer():
         """
         self.account_ids.append(new_acc.id)
         self.account_objs.append(new_acc)
+        # keeps the reverse index current
+        Customer.account_owners[new_acc.id] = self
         self.update_customer_file()
 
     def remove_account(self, account_id):
         # removes account from object
         self.account_ids.remove(account_id)
+        # removes account from the reverse index
+        if Customer.account_owners.get(account_id) is self:
+            Customer.account_owners.pop(account_id)
         try:
             self.account_objs.pop(account_id)
         except IndexError:
@@ -667,49 +1245,40 @@ class Customer():
             pass 
         # regenerates customer file
         self.update_customer_file()
+    def register_accounts(self):
+        """Records this customer as the owner of each of its accounts in the reverse index"""
+        for i in self.account_ids:
+            Customer.account_owners[i] = self
+
+    def unregister_accounts(self):
+        """Removes each of this customer's accounts from the reverse index"""
+        for i in self.account_ids:
+            if Customer.account_owners.get(i) is self:
+                Customer.account_owners.pop(i)
+
+    @classmethod
+    def owner_of(cls, account_id: int):
+        """Returns the customer owning an account
+
+        Args:
+            account_id (int): id of the account
+
+        Returns:
+            Customer: owner of the account, None if nobody owns it
+        """
+        return cls.account_owners.get(account_id)
     """Updates the customer file"""
-    def update_customer_file(self, file : str = CUSTOMER_FILE):
+    def update_customer_file(self, file : str = None):
         """Updates the customer file
 
         Args:
-            file (str): The file to read and write from 
+            file (str): The file to read and write from - CUSTOMER_FILE if None
         """
-        # loads file from file handler
-        customer_file = file_handler(file)
-        # checks if file handler failed
-        if(customer_file != None):
-            # error flag
-            error_encountered = False
-            # loops through customer file
-            for i in range(0, customer_file.__len__()):
-                # selects the line
-                line = customer_file[i]
-                # makes sure the line isnt just a text block or comment
-                if file_line_validator(Customer, line):
-                    # This gets the first value from the line and sees if its the current customer id
-                    if int(line.split(",", maxsplit=1)[0].strip()) == self.id:
-                        # converts account ids to string so it can be joined by "-"s
-                        account_ids = "-".join(map(str, self.account_ids))
-                        # recreates the line from the file
-                        line = f"{self.id}, {self._name}, {self._age}, {self.password}, [{account_ids}]\n"
-                        # runs the line validator to make sure it is a valid customer
-                        if file_line_validator(Customer, line):
-                            # updates the line
-                            customer_file[i] = line
-                        else:
-                            # we encountered an error - flag it and print output
-                            error_encountered = True
-                            # TODO: REMOVE THIS WHEN SUCCESSFULLY NO LONGER GETS PRINTED
-                            print(f"Line \"{line}\" failed validation.")
-                        break
-                else:
-                    # we skip the line
-                    continue
-            # no error encountered? Re-generate file
-            if error_encountered == False:
-                # opens the customer file and rewrites all of the lines
-                with open(file, "w") as myfile:
-                    myfile.write("".join(customer_file))
+        # written with the other dirty records on the next commit
+        if UNIT_OF_WORK is not None:
+            UNIT_OF_WORK.mark_customer(self)
+            return
+        save_customers([self], file)
     def can_delete(self, acc_objs : dict):
         """
         Returns True if the account can't be deleted without clearing accounts, False otherwise
@@ -729,6 +1298,8 @@ class Customer():
         Args:
             acc_objs (dit[Accounts]): list of all account objects
         """
+        # limits that ran out are cleared first - each check is then a flag read
+        LIMIT_SCHEDULER.advance()
         can_delete = True
         for i in self.account_ids:
             if not acc_objs[i].limit_reached:
@@ -737,6 +1308,20 @@ class Customer():
                 can_delete = False
         return can_delete
 
+@lru_cache(maxsize=timestamps.CACHE_SIZE)
+def minute_time(minutes: int) -> (datetime.datetime):
+    """
+    Returns the datetime of a Transaction's minutes - neighbouring transactions
+    mostly share a minute so the same object is handed back
+
+        Args:
+            minutes (int): minutes since Transaction.EPOCH
+
+        Returns:
+            datetime: the time
+    """
+    return Transaction.EPOCH + datetime.timedelta(minutes=minutes)
+
 class Transaction():
     """
     Transaction records between accounts
@@ -754,7 +1339,34 @@ class Transaction():
                 amount of money transacted
             rec_acc : int
                 id of account receiving (same of deposit / withdrawal)
+            timestamp : datetime
+                time of the transaction (stored as whole minutes since EPOCH)
+
+        Class Attributes:
+            by_account : dict[int, dict[int, list[Transaction]]]
+                transactions grouped by acc_id and then transaction_type
+            by_receiver : dict[int, dict[int, list[Transaction]]]
+                transactions grouped by rec_acc and then transaction_type
+
+        Methods:
+            index(transaction):
+                adds a transaction to the secondary indexes
+            clear_indexes():
+                empties the secondary indexes
+            from_account(acc_id, transaction_type):
+                returns transactions of a type taken from an account
+            to_account(rec_acc, transaction_type):
+                returns transactions of a type received by an account
+            from_minutes(id, transaction_type, acc_id, amount, rec_acc, minutes):
+                builds a transaction without parsing a timestamp
     """
+    # secondary indexes - account id -> transaction type -> transactions
+    by_account = {}
+    by_receiver = {}
+    # the ledger can hold millions of these - no per-instance __dict__
+    __slots__ = ("id", "transaction_type", "acc_id", "amount", "rec_acc", "_minutes")
+    # timestamps are minute resolution so a small int is enough to hold one
+    EPOCH = datetime.datetime(1970, 1, 1)
     id: int
     transaction_type: int
     acc_id: int
@@ -767,7 +1379,33 @@ class Transaction():
         self.acc_id = acc_id
         self.amount = amount
         self.rec_acc = rec_acc
-        self.timestamp = datetime.datetime.strptime(time_stamp, '%b %d %Y %I:%M%p')
+        self.timestamp = timestamps.parse(time_stamp)
+
+    @property
+    def timestamp(self) -> (datetime.datetime):
+        """Returns the time of the transaction"""
+        return minute_time(self._minutes)
+
+    @timestamp.setter
+    def timestamp(self, value: datetime.datetime):
+        """Sets the time of the transaction - seconds are dropped like in the file format"""
+        self._minutes = (value - Transaction.EPOCH) // datetime.timedelta(minutes=1)
+
+    @classmethod
+    def from_minutes(cls, id: int, transaction_type: int, acc_id: int, amount: float, rec_acc: int, minutes: int):
+        """Builds a transaction whose time is already minutes since EPOCH - skips parsing the timestamp
+
+        Returns:
+            Transaction: the transaction
+        """
+        transaction = cls.__new__(cls)
+        transaction.id = id
+        transaction.transaction_type = transaction_type
+        transaction.acc_id = acc_id
+        transaction.amount = amount
+        transaction.rec_acc = rec_acc
+        transaction._minutes = minutes
+        return transaction
 
     def __str__(self):
         # checks if deposit
@@ -780,3 +1418,46 @@ class Transaction():
         elif self.transaction_type == 2:
             return f"{self.id}\tTransfer\t{self.acc_id}\t{self.amount}\t{self.rec_acc}\t{self.timestamp}"
 
+    @classmethod
+    def index(cls, transaction):
+        """Adds a transaction to the secondary indexes
+
+        Args:
+            transaction (Transaction): the transaction to index
+        """
+        cls.by_account.setdefault(transaction.acc_id, {}).setdefault(
+            transaction.transaction_type, []).append(transaction)
+        cls.by_receiver.setdefault(transaction.rec_acc, {}).setdefault(
+            transaction.transaction_type, []).append(transaction)
+
+    @classmethod
+    def clear_indexes(cls):
+        """Empties the secondary indexes"""
+        cls.by_account.clear()
+        cls.by_receiver.clear()
+
+    @classmethod
+    def from_account(cls, acc_id: int, transaction_type: int) -> (list):
+        """Returns transactions of one type taken from an account
+
+        Args:
+            acc_id (int): id of the account
+            transaction_type (int): 0 - deposit, 1 - withdraw, 2 - transfer
+
+        Returns:
+            list[Transaction]: matching transactions in the order they were written
+        """
+        return cls.by_account.get(acc_id, {}).get(transaction_type, [])
+
+    @classmethod
+    def to_account(cls, rec_acc: int, transaction_type: int) -> (list):
+        """Returns transactions of one type received by an account
+
+        Args:
+            rec_acc (int): id of the receiving account
+            transaction_type (int): 0 - deposit, 1 - withdraw, 2 - transfer
+
+        Returns:
+            list[Transaction]: matching transactions in the order they were written
+        """
+        return cls.by_receiver.get(rec_acc, {}).get(transaction_type, [])
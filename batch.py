@@ -0,0 +1,169 @@
+"""
+    Batch posting of deposits, withdrawals and transfers. A batch is validated as a
+    whole against the in-memory balances, then the changed accounts and every
+    transaction line are committed as one atomic unit (see bank.commit_movements).
+
+    Used for payroll and standing-order runs where thousands of movements are
+    posted at once, and by Menu.transfer as a batch of one.
+"""
+from datetime import datetime
+
+import bank as b
+import timestamps
+
+DEPOSIT = 0
+WITHDRAW = 1
+TRANSFER = 2
+
+
+class BatchRejected(Exception):
+    """Raised if any operation of a batch can not be posted - nothing is applied"""
+    def __init__(self, failures: list):
+        super().__init__(f"{failures.__len__()} operation/s rejected: {failures[:5]}")
+        # list of (operation index, reason)
+        self.failures = failures
+
+
+class Operation():
+    """
+    One money movement of a batch.
+
+        Attributes:
+            transaction_type : int
+                0 - deposit, 1 - withdraw, 2 - transfer
+            acc_id : int
+                id of account taken from (or deposited into)
+            amount : float
+                amount of money moved
+            rec_acc : int
+                id of account receiving (same as acc_id for deposit / withdrawal)
+    """
+
+    def __init__(self, transaction_type: int, acc_id: int, amount: float, rec_acc: int = None):
+        self.transaction_type = transaction_type
+        self.acc_id = acc_id
+        self.amount = amount
+        self.rec_acc = acc_id if rec_acc is None else rec_acc
+
+    def __repr__(self):
+        return f"Operation({self.transaction_type}, {self.acc_id}, {self.amount}, {self.rec_acc})"
+
+
+def can_withdraw(account: b.Account, balance: float, amount: float, limited: bool) -> (bool):
+    """
+    Checks a withdrawal against the same rules the account classes enforce
+
+        Args:
+            account (Account): the account being withdrawn from
+            balance (float): the account's balance so far in the batch
+            amount (float): amount being withdrawn
+            limited (bool): whether the savings limit has been reached so far in the batch
+
+        Returns:
+            bool: whether the withdrawal is allowed
+    """
+    if isinstance(account, b.SavingAccount):
+        return not limited and balance - amount >= 0
+    elif isinstance(account, b.CheckingAccount):
+        return balance - amount >= -(account.credit_limit)
+    return balance - amount >= 0
+
+
+def validate(accounts: dict, operations: list) -> (tuple):
+    """
+    Runs the batch against copies of the balances without changing any account
+
+        Args:
+            accounts (dict[int, Account]): all accounts (Menu._accounts)
+            operations (list[Operation]): the batch
+
+        Returns:
+            tuple: (balances, withdrawn, failures)
+                balances - dict of account id -> balance after the batch
+                withdrawn - set of savings account ids that had money taken out
+                failures - list of (operation index, reason)
+    """
+    balances = {}
+    withdrawn = set()
+    failures = []
+    # limits that ran out are cleared up front - every check below is a flag read
+    b.LIMIT_SCHEDULER.advance()
+    for i in range(0, operations.__len__()):
+        operation = operations[i]
+        if operation.acc_id not in accounts or operation.rec_acc not in accounts:
+            failures.append((i, "account does not exist"))
+            continue
+        if not operation.amount > 0:
+            failures.append((i, "amount must be greater than 0"))
+            continue
+        account = accounts[operation.acc_id]
+        balance = balances.get(account.id, account.balance)
+        if operation.transaction_type == DEPOSIT:
+            balances[account.id] = balance + operation.amount
+        elif operation.transaction_type in (WITHDRAW, TRANSFER):
+            limited = account.limit_reached or account.id in withdrawn
+            if not can_withdraw(account, balance, operation.amount, limited):
+                failures.append((i, "insufficient funds or transaction limit reached"))
+                continue
+            balances[account.id] = balance - operation.amount
+            # a savings withdrawal starts its 30 day limit
+            if isinstance(account, b.SavingAccount):
+                withdrawn.add(account.id)
+            if operation.transaction_type == TRANSFER:
+                receiver = accounts[operation.rec_acc]
+                balances[receiver.id] = balances.get(receiver.id, receiver.balance) + operation.amount
+        else:
+            failures.append((i, f"unknown transaction type {operation.transaction_type}"))
+    return balances, withdrawn, failures
+
+
+def post_batch(menu, operations: list) -> (list):
+    """
+    Validates and posts a batch of operations all or nothing
+
+        Args:
+            menu (Menu): the menu holding the accounts and transactions
+            operations (list[Operation]): the batch
+
+        Returns:
+            list[Transaction]: the transactions written, in batch order
+
+        Raises:
+            BatchRejected: at least one operation failed validation
+    """
+    balances, withdrawn, failures = validate(menu._accounts, operations)
+    if failures:
+        raise BatchRejected(failures)
+    now = datetime.now()
+    format_time = timestamps.format(now)
+    transactions = []
+    # small batches (a single transfer) come from the reserved block - no id file write
+    # ids of a rejected commit are skipped, not reused
+    trans_ids = b.id_allocator().allocate_many("transactions", operations.__len__())
+    for trans_id, operation in zip(trans_ids, operations):
+        transactions.append(b.Transaction(trans_id, operation.transaction_type,
+                                          operation.acc_id, operation.amount, operation.rec_acc,
+                                          format_time))
+    accounts = [menu._accounts[acc_id] for acc_id in balances]
+    # kept so the objects can be put back if the commit fails
+    before = [(account, account._balance, getattr(account, "_last_transfer", None)) for account in accounts]
+    # applies the new balances straight to the objects - persisting happens once below
+    for acc_id in balances:
+        menu._accounts[acc_id]._balance = balances[acc_id]
+    for acc_id in withdrawn:
+        menu._accounts[acc_id].last_transfer = now
+    try:
+        # balances and transactions are committed as one unit
+        b.commit_movements(accounts, transactions)
+    except Exception:
+        for account, balance, last_transfer in before:
+            account._balance = balance
+            if last_transfer is not None:
+                account.last_transfer = last_transfer
+        raise
+    # an unloaded ledger picks these lines up from the file when paged in
+    if menu._transactions_loaded:
+        for transaction in transactions:
+            menu._transactions[transaction.id] = transaction
+            b.Transaction.index(transaction)
+    return transactions
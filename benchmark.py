@@ -0,0 +1,899 @@
+"""
+    Benchmarks for the bank's loading and storage paths. Every benchmark builds its
+    own synthetic data in a temporary folder so the real data files are never touched.
+
+    Usage:
+        python benchmark.py                      lists the benchmarks
+        python benchmark.py <name> [args...]     runs one benchmark
+"""
+import datetime
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+import bank as b
+import timestamps
+
+# name -> (function, description) of every benchmark
+BENCHMARKS = {}
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+          "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def benchmark(name: str, description: str):
+    """Registers a benchmark function under a command line name"""
+    def register(function):
+        BENCHMARKS[name] = (function, description)
+        return function
+    return register
+
+
+def random_timestamp(rand: random.Random) -> (str):
+    """Returns a random timestamp in the data files' '%b %d %Y %I:%M%p' format"""
+    return (f"{rand.choice(MONTHS)} {rand.randint(1, 28):02d} {rand.randint(2000, 2021)} "
+            f"{rand.randint(1, 12):02d}:{rand.randint(0, 59):02d}{rand.choice(['AM', 'PM'])}")
+
+
+def write_synthetic_customers(filename: str, count: int, seed: int = 0):
+    """Writes count customers with two accounts each"""
+    rand = random.Random(seed)
+    with open(filename, "w") as myfile:
+        for i in range(0, count):
+            myfile.write(f"{i}, Customer {rand.randint(0, 10 ** 6)}, {rand.randint(14, 99)}, "
+                         f"password{i}, [{2 * i}-{2 * i + 1}]\n")
+
+
+def write_synthetic_accounts(filename: str, count: int, seed: int = 0):
+    """Writes count accounts alternating between savings and checking"""
+    rand = random.Random(seed)
+    with open(filename, "w") as myfile:
+        for i in range(0, count):
+            if i % 2 == 0:
+                myfile.write(f"{i}, 0, {rand.randint(0, 10 ** 5)}.0, ,{random_timestamp(rand)}\n")
+            else:
+                myfile.write(f"{i}, 1, {rand.randint(-100, 10 ** 5)}.0, 100\n")
+
+
+def write_synthetic_transactions(filename: str, count: int, accounts: int = 1000, seed: int = 0):
+    """Writes count transactions between accounts 0 to accounts - 1"""
+    rand = random.Random(seed)
+    with open(filename, "w") as myfile:
+        for i in range(0, count):
+            acc_id = rand.randrange(accounts)
+            trans_type = rand.randint(0, 2)
+            rec_acc = rand.randrange(accounts) if trans_type == 2 else acc_id
+            myfile.write(f"{i}, {trans_type}, {acc_id}, {rand.randint(1, 10 ** 4)}.0, "
+                         f"{rec_acc}, {random_timestamp(rand)}\n")
+
+
+def legacy_parse(object_type: type, line: str):
+    """The validate-then-resplit path the Menu loaders used before the parse_ functions"""
+    if not b.file_line_validator(object_type, line):
+        return None
+    row = line.rstrip("\n").split(",")
+    if object_type is b.Transaction:
+        return b.Transaction(int(row[0].strip()), int(row[1].strip()), int(row[2].strip()),
+                             float(row[3].strip()), int(row[4].strip()), str(row[5].strip()))
+    elif object_type is b.Account:
+        if int(row[1].strip()) == 0:
+            return b.SavingAccount(int(row[0].strip()), float(row[2].strip()),
+                                   last_transfer=str(row[4].strip()))
+        return b.CheckingAccount(int(row[0].strip()), float(row[2].strip()), int(row[3].strip()))
+    else:
+        ids = row[4].strip().lstrip("[").rstrip("]")
+        return b.Customer(int(row[0].strip()), row[1].strip(), int(row[2].strip()),
+                          row[3].strip(), list(map(int, ids.split("-"))) if ids else [])
+
+
+def lines_per_second(filename: str, parse) -> (float):
+    """Times parse over every line of a file and returns the throughput"""
+    count = 0
+    start = time.perf_counter()
+    with open(filename, "r") as file:
+        for line in file:
+            if parse(line) is not None:
+                count += 1
+    return count / (time.perf_counter() - start)
+
+
+@benchmark("load", "cold-load throughput of the line parsers [sizes...]")
+def bench_load(*sizes):
+    """Compares the legacy loader path with the single-pass parse_ functions"""
+    sizes = [int(float(size)) for size in sizes] or [10 ** 5]
+    kinds = [("customers", write_synthetic_customers, b.Customer, b.parse_customer),
+             ("accounts", write_synthetic_accounts, b.Account, b.parse_account),
+             ("transactions", write_synthetic_transactions, b.Transaction, b.parse_transaction)]
+    print("records\t\tlines\t\tlegacy lines/s\tsingle-pass lines/s\tspeedup")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            for name, writer, object_type, parser in kinds:
+                filename = os.path.join(folder, f"{name}.txt")
+                writer(filename, size)
+                legacy = lines_per_second(filename, lambda line: legacy_parse(object_type, line))
+                single = lines_per_second(filename, parser)
+                print(f"{name:<12}\t{size:<12}\t{legacy:<14.0f}\t{single:<19.0f}\t{single / legacy:.2f}x")
+                os.remove(filename)
+
+
+@benchmark("timestamps", "timestamps.parse/format against strptime/strftime [count]")
+def bench_timestamps(count="200000"):
+    """Compares the timestamp codec with the stdlib on ledger-like timestamps"""
+    count = int(float(count))
+    rand = random.Random(0)
+    # ledgers cluster in time - draw from a limited pool of minutes like a real file would
+    pool = [random_timestamp(rand) for _ in range(0, 2000)]
+    texts = [rand.choice(pool) for _ in range(0, count)]
+    times = [datetime.datetime.strptime(text, timestamps.TIME_FORMAT) for text in pool]
+    times = [rand.choice(times) for _ in range(0, count)]
+    timestamps.parse.cache_clear()
+    rows = [("strptime", lambda: [datetime.datetime.strptime(t, timestamps.TIME_FORMAT) for t in texts]),
+            ("parse (cold)", lambda: [timestamps.parse.__wrapped__(t) for t in texts]),
+            ("parse (memo)", lambda: [timestamps.parse(t) for t in texts]),
+            ("strftime", lambda: [t.strftime(timestamps.TIME_FORMAT) for t in times]),
+            ("format", lambda: [timestamps.format(t) for t in times])]
+    print("call\t\tcalls/s")
+    for name, run in rows:
+        start = time.perf_counter()
+        run()
+        print(f"{name:<12}\t{count / (time.perf_counter() - start):.0f}")
+
+
+def load_menu(folder: str):
+    """
+    Imports main and builds a Menu over the data files in folder. main reads
+    sys.argv on import so the benchmark's own arguments are hidden from it.
+    """
+    os.chdir(folder)
+    arguments = sys.argv
+    sys.argv = [arguments[0]]
+    try:
+        import main
+    finally:
+        sys.argv = arguments
+    # Menu keeps its dictionaries on the class - start from empty ones
+    main.Menu._customers.clear()
+    main.Menu._accounts.clear()
+    main.Menu._transactions.clear()
+    return main.Menu()
+
+
+@benchmark("batch", "per-operation posting against batch.post_batch [operations] [accounts]")
+def bench_batch(operations="2000", accounts="10000"):
+    """Posts the same deposits one at a time and as one batch"""
+    import batch
+    operations = int(float(operations))
+    accounts = int(float(accounts))
+    rand = random.Random(0)
+    # checking accounts only so no savings limits get in the way
+    ids = [i for i in range(1, accounts, 2)]
+    chosen = [rand.choice(ids) for _ in range(0, operations)]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        try:
+            write_synthetic_customers(os.path.join(folder, "customers.txt"), accounts // 2)
+            write_synthetic_accounts(os.path.join(folder, "accounts.txt"), accounts)
+            write_synthetic_transactions(os.path.join(folder, "accountsTransactions.txt"), 1000, accounts)
+            menu = load_menu(folder)
+            start = time.perf_counter()
+            for acc_id in chosen:
+                menu._accounts[acc_id].deposit(1.0)
+                menu.write_transaction(0, acc_id, 1.0, acc_id)
+            single = time.perf_counter() - start
+            start = time.perf_counter()
+            batch.post_batch(menu, [batch.Operation(0, acc_id, 1.0) for acc_id in chosen])
+            batched = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+    print("path		operations	seconds		operations/s")
+    print(f"one at a time	{operations}		{single:.4f}		{operations / single:.0f}")
+    print(f"post_batch	{operations}		{batched:.4f}		{operations / batched:.0f}")
+
+
+class LegacyTransaction():
+    """Transaction as it was before __slots__ - per-instance __dict__ and a datetime"""
+    def __init__(self, id, transaction_type, acc_id, amount, rec_acc, time_stamp):
+        self.id = id
+        self.transaction_type = transaction_type
+        self.acc_id = acc_id
+        self.amount = amount
+        self.rec_acc = rec_acc
+        # the same cached parse the slotted class uses - only the storage differs
+        self.timestamp = timestamps.parse(time_stamp)
+
+
+class LegacyCustomer():
+    """Customer as it was before __slots__ - per-instance __dict__"""
+    def __init__(self, id, cust_name, age, password, ids):
+        self._name = cust_name
+        self._age = age
+        self.id = id
+        self.password = password
+        self.account_ids = ids
+
+
+@benchmark("memory-worker", "(used by memory) builds objects and reports their size <kind> <count>")
+def bench_memory_worker(kind, count):
+    """Builds count objects in this process and prints bytes per object and peak RSS"""
+    import resource
+    import tracemalloc
+    count = int(float(count))
+    rand = random.Random(0)
+    pool = [random_timestamp(rand) for _ in range(0, 5000)]
+    transaction_class = LegacyTransaction if kind == "legacy" else b.Transaction
+    customer_class = LegacyCustomer if kind == "legacy" else b.Customer
+    # resident size with the whole ledger built - no tracing overhead
+    ledger = {}
+    for i in range(0, count):
+        ledger[i] = transaction_class(i, i % 3, rand.randrange(10 ** 5), float(rand.randint(1, 10 ** 4)),
+                                      rand.randrange(10 ** 5), rand.choice(pool))
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ledger.clear()
+    # bytes per object on a sample, traced
+    sample = count // 10 or 1
+    tracemalloc.start()
+    transactions = [transaction_class(i, i % 3, rand.randrange(10 ** 5), float(rand.randint(1, 10 ** 4)),
+                                      rand.randrange(10 ** 5), rand.choice(pool)) for i in range(0, sample)]
+    transaction_bytes = tracemalloc.get_traced_memory()[0] / sample
+    tracemalloc.stop()
+    tracemalloc.start()
+    customers = [customer_class(i, f"Customer {i}", 30, "password", [2 * i, 2 * i + 1])
+                 for i in range(0, sample)]
+    customer_bytes = tracemalloc.get_traced_memory()[0] / sample
+    tracemalloc.stop()
+    # ru_maxrss is in kilobytes on linux
+    print(f"{transaction_bytes:.0f} {customer_bytes:.0f} {peak_rss}")
+
+
+@benchmark("memory", "bytes per object and RSS before/after __slots__ [transactions]")
+def bench_memory(count="1000000"):
+    """Runs the memory worker for the legacy and slotted classes in fresh processes"""
+    import subprocess
+    print("classes		transactions	bytes/transaction	bytes/customer	peak RSS (MB)")
+    for kind in ("legacy", "slots"):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "memory-worker", kind, count],
+                                capture_output=True, text=True, check=True).stdout.split()
+        print(f"{kind:<8}	{count:<12}	{output[0]:<17}	{output[1]:<14}	{int(output[2]) / 1024:.1f}")
+
+
+@benchmark("columnar", "monthly statements from Transaction objects against ColumnarLedger [rows]")
+def bench_columnar(rows="1000000"):
+    """Builds every account's statement for one month both ways"""
+    import columnar
+    rows = int(float(rows))
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, "accountsTransactions.txt")
+        write_synthetic_transactions(filename, rows)
+        transactions = list(b.iter_transactions(filename))
+        ledger = columnar.ColumnarLedger.from_file(filename)
+    start = time.perf_counter()
+    # what a report over Menu._transactions has to do - walk every object
+    statements = {}
+    for transaction in transactions:
+        stamp = transaction.timestamp
+        if stamp.year == 2010 and stamp.month == 6:
+            name = ("deposits", "withdrawals", "transfers out")[transaction.transaction_type]
+            statement = statements.setdefault(transaction.acc_id, {})
+            statement[name] = statement.get(name, 0.0) + transaction.amount
+            if transaction.transaction_type == 2:
+                statement = statements.setdefault(transaction.rec_acc, {})
+                statement["transfers in"] = statement.get("transfers in", 0.0) + transaction.amount
+    objects = time.perf_counter() - start
+    start = time.perf_counter()
+    ledger.monthly_statements(2010, 6)
+    columns = time.perf_counter() - start
+    print(f"numpy: {'yes' if columnar.np is not None else 'no (array module)'}")
+    print("ledger		rows		seconds")
+    print(f"objects		{rows}		{objects:.4f}")
+    print(f"columnar	{rows}		{columns:.4f}")
+
+
+def latencies(operation, count: int) -> (list):
+    """Runs operation(i) count times and returns each call's latency in seconds, sorted"""
+    times = []
+    for i in range(0, count):
+        start = time.perf_counter()
+        operation(i)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times
+
+
+@benchmark("storage", "mutation latency of the .txt files against SqliteStorage [operations] [accounts]")
+def bench_storage(operations="1000", accounts="10000"):
+    """Times the same deposits, customer updates, new customers and ledger appends on each backend"""
+    import storage
+    operations = int(float(operations))
+    accounts = int(float(accounts))
+    rand = random.Random(0)
+    chosen = [rand.randrange(1, accounts, 2) for _ in range(0, operations)]
+    cwd = os.getcwd()
+    results = []
+    for backend in ("text", "sqlite"):
+        with tempfile.TemporaryDirectory() as folder:
+            try:
+                write_synthetic_customers(os.path.join(folder, "customers.txt"), accounts // 2)
+                write_synthetic_accounts(os.path.join(folder, "accounts.txt"), accounts)
+                write_synthetic_transactions(os.path.join(folder, "accountsTransactions.txt"), 1000, accounts)
+                if backend == "sqlite":
+                    database = os.path.join(folder, "bank.db")
+                    storage.migrate(database, os.path.join(folder, "customers.txt"),
+                                    os.path.join(folder, "accounts.txt"),
+                                    os.path.join(folder, "accountsTransactions.txt"))
+                    b.STORAGE = storage.SqliteStorage(database)
+                menu = load_menu(folder)
+                customers = list(menu._customers.values())
+                operations_run = [
+                    ("deposit", lambda i: menu._accounts[chosen[i]].deposit(1.0)),
+                    ("update customer", lambda i: customers[chosen[i] // 2].update_customer_file()),
+                    ("new customer", lambda i: menu.write_customer("Benchmark Customer", 30, "password1")),
+                    ("transaction", lambda i: menu.write_transaction(0, chosen[i], 1.0, chosen[i]))]
+                for name, operation in operations_run:
+                    times = latencies(operation, operations)
+                    results.append((backend, name, sum(times) / operations, times[operations * 99 // 100]))
+            finally:
+                if b.STORAGE is not None:
+                    b.STORAGE.close()
+                    b.STORAGE = None
+                os.chdir(cwd)
+    print("backend	operation		mean (us)	p99 (us)")
+    for backend, name, mean, p99 in results:
+        print(f"{backend:<8}{name:<16}	{mean * 10 ** 6:<10.1f}	{p99 * 10 ** 6:.1f}")
+
+
+def write_syscalls() -> (int):
+    """Returns how many write syscalls this process has made (linux /proc/self/io)"""
+    with open("/proc/self/io", "r") as file:
+        for line in file:
+            if line.startswith("syscw:"):
+                return int(line.split(":")[1])
+    return 0
+
+
+@benchmark("transfer", "send_money + write_transaction against the atomic Menu.transfer [transfers] [accounts]")
+def bench_transfer(transfers="1000", accounts="10000"):
+    """Makes the same transfers between checking accounts both ways"""
+    transfers = int(float(transfers))
+    accounts = int(float(accounts))
+    rand = random.Random(0)
+    pairs = [(rand.randrange(1, accounts, 2), rand.randrange(1, accounts, 2)) for _ in range(0, transfers)]
+    fsyncs = [0]
+    real_fsync = os.fsync
+
+    def counted_fsync(fd):
+        fsyncs[0] += 1
+        real_fsync(fd)
+    cwd = os.getcwd()
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        try:
+            write_synthetic_customers(os.path.join(folder, "customers.txt"), accounts // 2)
+            write_synthetic_accounts(os.path.join(folder, "accounts.txt"), accounts)
+            write_synthetic_transactions(os.path.join(folder, "accountsTransactions.txt"), 1000, accounts)
+            menu = load_menu(folder)
+            customer = next(iter(menu._customers.values()))
+            # a journal bigger than the run so no checkpoint lands inside the timing
+            b.account_journal().checkpoint_threshold = 10 * transfers
+            os.fsync = counted_fsync
+            paths = [("send_money", lambda giver, receiver: (
+                         customer.send_money(1.0, giver, receiver),
+                         menu.write_transaction(2, giver.id, 1.0, receiver.id))),
+                     ("Menu.transfer", lambda giver, receiver: menu.transfer(1.0, giver, receiver))]
+            for name, path in paths:
+                fsyncs[0] = 0
+                writes = write_syscalls()
+                start = time.perf_counter()
+                for acc_id, rec_acc in pairs:
+                    path(menu._accounts[acc_id], menu._accounts[rec_acc])
+                seconds = time.perf_counter() - start
+                results.append((name, seconds, write_syscalls() - writes, fsyncs[0]))
+        finally:
+            os.fsync = real_fsync
+            os.chdir(cwd)
+    print("path		transfers/s	writes/transfer	fsyncs/transfer	atomic")
+    for name, seconds, writes, synced in results:
+        print(f"{name:<14}	{transfers / seconds:<10.0f}	{writes / transfers:<15.2f}	"
+              f"{synced / transfers:<15.2f}	{'yes' if name == 'Menu.transfer' else 'no'}")
+
+
+@benchmark("ledger", "sustained transaction appends/s at different durability settings [appends] [threads]")
+def bench_ledger(appends="4000", threads="8"):
+    """Appends the same lines from several threads per line and through LedgerWriter"""
+    import threading
+    import ledger
+    appends = int(float(appends))
+    threads = int(float(threads))
+    rand = random.Random(0)
+    lines = [b.transaction_line(i, 0, rand.randrange(1000), 1.0, 0, random_timestamp(rand))
+             for i in range(0, appends)]
+    lock = threading.Lock()
+
+    def open_per_line(filename, synced):
+        def append(line):
+            # what write_transaction used to do - serialised like the menu was
+            with lock:
+                with open(filename, "a") as myfile:
+                    myfile.write(line)
+                    if synced:
+                        myfile.flush()
+                        os.fsync(myfile.fileno())
+        return append, None
+    settings = [("open per line", "no", lambda f: open_per_line(f, False)),
+                ("open per line", "every line", lambda f: open_per_line(f, True)),
+                ("LedgerWriter", "no", lambda f: ledger.LedgerWriter(f, fsync=False)),
+                ("LedgerWriter", "group, 0ms", lambda f: ledger.LedgerWriter(f, window=0)),
+                ("LedgerWriter", "group, 2ms", lambda f: ledger.LedgerWriter(f, window=0.002)),
+                ("LedgerWriter", "group, 10ms", lambda f: ledger.LedgerWriter(f, window=0.01))]
+    print(f"{threads} thread/s")
+    print("writer		fsync		appends/s	mean batch	p99 commit (ms)")
+    with tempfile.TemporaryDirectory() as folder:
+        for name, durability, make in settings:
+            filename = os.path.join(folder, "accountsTransactions.txt")
+            made = make(filename)
+            if isinstance(made, ledger.LedgerWriter):
+                writer, append = made, made.append
+            else:
+                writer, append = None, made[0]
+            chunks = [lines[i::threads] for i in range(0, threads)]
+            workers = [threading.Thread(target=lambda chunk=chunk: [append(line) for line in chunk])
+                       for chunk in chunks]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            seconds = time.perf_counter() - start
+            if writer is not None:
+                stats = writer.stats()
+                writer.close()
+                batch, p99 = f"{stats['mean batch']:.1f}", f"{stats['p99 latency'] * 1000:.2f}"
+            else:
+                batch, p99 = "1.0", "-"
+            print(f"{name:<14}	{durability:<12}	{appends / seconds:<10.0f}	{batch:<10}	{p99}")
+            os.remove(filename)
+
+
+@benchmark("engine", "stress test of AccountEngine with balance invariant checks [threads] [operations] [accounts]")
+def bench_engine(threads="8", operations="20000", accounts="200"):
+    """Posts random deposits, withdrawals and transfers from many threads over few accounts"""
+    import threading
+    import engine
+    threads = int(float(threads))
+    operations = int(float(operations))
+    accounts = int(float(accounts))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        try:
+            write_synthetic_customers(os.path.join(folder, "customers.txt"), accounts // 2)
+            write_synthetic_accounts(os.path.join(folder, "accounts.txt"), accounts)
+            write_synthetic_transactions(os.path.join(folder, "accountsTransactions.txt"), 0, accounts)
+            menu = load_menu(folder)
+            ids = list(menu._accounts)
+            opening = {acc_id: menu._accounts[acc_id].balance for acc_id in ids}
+            account_engine = engine.AccountEngine(menu)
+            posted = [[] for _ in range(0, threads)]
+
+            def worker(n):
+                rand = random.Random(n)
+                for _ in range(0, operations // threads):
+                    kind = rand.randint(0, 2)
+                    amount = float(rand.randint(1, 500))
+                    if kind == 0:
+                        transaction = account_engine.deposit(rand.choice(ids), amount)
+                    elif kind == 1:
+                        transaction = account_engine.withdraw(rand.choice(ids), amount)
+                    else:
+                        transaction = account_engine.transfer(rand.choice(ids), rand.choice(ids), amount)
+                    if transaction is not None:
+                        posted[n].append(transaction)
+            workers = [threading.Thread(target=worker, args=(n,)) for n in range(0, threads)]
+            start = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            account_engine.close()
+            seconds = time.perf_counter() - start
+            b.close_ledger()
+            transactions = [transaction for chunk in posted for transaction in chunk]
+            # every balance must equal its opening balance plus its own movements
+            expected = dict(opening)
+            for transaction in transactions:
+                if transaction.transaction_type == 0:
+                    expected[transaction.acc_id] += transaction.amount
+                else:
+                    expected[transaction.acc_id] -= transaction.amount
+                    if transaction.transaction_type == 2:
+                        expected[transaction.rec_acc] += transaction.amount
+            checks = []
+            checks.append(("balances match their transactions",
+                           all(abs(menu._accounts[i].balance - expected[i]) < 1e-6 for i in ids)))
+            checks.append(("no account past its limit",
+                           all(menu._accounts[i].balance >= -getattr(menu._accounts[i], "credit_limit", 0)
+                               for i in ids)))
+            checks.append(("transaction ids unique",
+                           len({transaction.id for transaction in transactions}) == len(transactions)))
+            # what made it to disk must agree with memory
+            on_disk = {account.id: account.balance for account in b.iter_accounts(b.ACCOUNTS_FILE)}
+            checks.append(("persisted balances match",
+                           all(abs(on_disk[i] - menu._accounts[i].balance) < 1e-6 for i in ids)))
+            checks.append(("every transaction persisted",
+                           sum(1 for _ in b.iter_records(b.TRANSACTION_FILE, b.parse_transaction))
+                           == len(transactions)))
+        finally:
+            os.chdir(cwd)
+    print(f"{threads} threads, {operations} operations over {accounts} accounts")
+    print(f"posted {len(transactions)} ({operations - len(transactions)} rejected) "
+          f"in {seconds:.3f}s - {operations / seconds:.0f} operations/s")
+    for name, passed in checks:
+        print(f"{name:<36}{'ok' if passed else 'FAILED'}")
+
+
+@benchmark("server", "load generator for server.py - requests/s and latency [clients] [requests per client]")
+def bench_server(clients="2000", requests="10"):
+    """Runs server.py on a unix socket and drives it with many concurrent JSON lines clients"""
+    import asyncio
+    import json
+    import subprocess
+    clients = int(float(clients))
+    requests = int(float(requests))
+    customers = 5000
+    latencies = []
+    failures = [0]
+
+    async def client(n, path):
+        rand = random.Random(n)
+        cust_id = n % customers
+        own = [2 * cust_id, 2 * cust_id + 1]
+        reader, writer = await asyncio.open_unix_connection(path, limit=2 ** 20)
+
+        async def call(request):
+            start = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            if not response["ok"] and response.get("error") != "insufficient funds or transaction limit reached":
+                failures[0] += 1
+        await call({"id": 0, "op": "login", "customer": cust_id, "password": f"password{cust_id}"})
+        for i in range(1, requests + 1):
+            pick = rand.random()
+            if pick < 0.3:
+                await call({"id": i, "op": "accounts"})
+            elif pick < 0.6:
+                await call({"id": i, "op": "deposit", "account": own[1], "amount": 5})
+            elif pick < 0.8:
+                await call({"id": i, "op": "transfer", "account": own[1],
+                            "to": rand.randrange(2 * customers), "amount": 1})
+            else:
+                await call({"id": i, "op": "history", "account": own[1], "limit": 10})
+        writer.close()
+
+    async def drive(path):
+        await asyncio.gather(*[client(n, path) for n in range(0, clients)])
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_synthetic_customers(os.path.join(folder, "customers.txt"), customers)
+        write_synthetic_accounts(os.path.join(folder, "accounts.txt"), 2 * customers)
+        write_synthetic_transactions(os.path.join(folder, "accountsTransactions.txt"), 10 ** 5, 2 * customers)
+        path = os.path.join(folder, "bank.sock")
+        server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                "server.py"), "--unix", path],
+                                  cwd=folder, stdout=subprocess.PIPE, text=True)
+        try:
+            # waits for the "Serving on" line
+            server.stdout.readline()
+            start = time.perf_counter()
+            asyncio.run(drive(path))
+            seconds = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+    latencies.sort()
+    print(f"{clients} clients x {requests + 1} requests, {failures[0]} unexpected errors")
+    print("requests/s	p50 (ms)	p99 (ms)	max (ms)")
+    print(f"{latencies.__len__() / seconds:<10.0f}	{latencies[latencies.__len__() // 2] * 1000:<8.2f}	"
+          f"{latencies[latencies.__len__() * 99 // 100] * 1000:<8.2f}	{latencies[-1] * 1000:.2f}")
+
+
+@benchmark("parallel", "serial against process-pool loading of a transaction file [rows] [workers...]")
+def bench_parallel(rows="1000000", *workers):
+    """Loads the same ledger serially and with parallel_load at several pool sizes"""
+    import parallel_load
+    rows = int(float(rows))
+    workers = [int(n) for n in workers] or sorted({2, os.cpu_count() or 1})
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, "accountsTransactions.txt")
+        write_synthetic_transactions(filename, rows)
+        print(f"{os.cpu_count()} core/s, {os.path.getsize(filename) / 2 ** 20:.0f} MB")
+        print("workers		seconds		rows/s		same order")
+        start = time.perf_counter()
+        serial = [transaction.id for transaction in b.iter_records(filename, b.parse_transaction)]
+        seconds = time.perf_counter() - start
+        print(f"serial		{seconds:<8.2f}	{rows / seconds:<10.0f}	-")
+        for count in workers:
+            start = time.perf_counter()
+            loaded = [transaction.id for transaction in
+                      parallel_load.iter_parallel(filename, b.parse_transaction, count)]
+            seconds = time.perf_counter() - start
+            print(f"{count:<8}	{seconds:<8.2f}	{rows / seconds:<10.0f}	{'yes' if loaded == serial else 'NO'}")
+
+
+@benchmark("rss-worker", "(used by rss) loads a transaction file one way and reports peak RSS <reader> <file>")
+def bench_rss_worker(reader, filename):
+    """Loads a ledger into a dict like Menu.load_transactions and prints seconds and RSS in KB"""
+    import resource
+    import mapped_ledger
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if reader == "list":
+        # the original path - every line is read into a list before parsing
+        transactions = (b.parse_transaction(line) for line in b.file_handler(filename))
+    elif reader == "stream":
+        transactions = b.iter_records(filename, b.parse_transaction)
+    elif reader == "mmap":
+        transactions = mapped_ledger.iter_transactions(filename)
+    else:
+        # reporting path - mapped rows straight into typed columns, no objects
+        import columnar
+        start = time.perf_counter()
+        ledger = columnar.ColumnarLedger.from_file(filename)
+        print(f"{time.perf_counter() - start} {baseline} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}")
+        return
+    start = time.perf_counter()
+    ledger = {}
+    for transaction in transactions:
+        if transaction is not None:
+            ledger[transaction.id] = transaction
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on linux
+    print(f"{seconds} {baseline} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}")
+
+
+@benchmark("rss", "peak RSS and time of loading the ledger through file_handler, streaming and mmap [rows]")
+def bench_rss(rows="1000000"):
+    """Runs the rss worker for each reader in a fresh process on the same file"""
+    import subprocess
+    rows = int(float(rows))
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, "accountsTransactions.txt")
+        write_synthetic_transactions(filename, rows)
+        print(f"{rows} rows, {os.path.getsize(filename) / 2 ** 20:.0f} MB")
+        print("reader		seconds		peak RSS (MB)	loading (MB)")
+        for reader in ("list", "stream", "mmap", "columns"):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "rss-worker", reader, filename],
+                                    capture_output=True, text=True, check=True).stdout.split()
+            seconds, baseline, peak = float(output[0]), int(output[1]), int(output[2])
+            print(f"{reader:<8}	{seconds:<8.2f}	{peak / 1024:<13.1f}	{(peak - baseline) / 1024:.1f}")
+
+@benchmark("follow", "picking up another process's appends - Follower.poll against a full reload [rows] [appended]")
+def bench_follow(rows="1000000", appended="100"):
+    """Appends lines to a loaded ledger behind the menu's back and catches up both ways"""
+    import follow
+    rows = int(float(rows))
+    appended = int(float(appended))
+    with tempfile.TemporaryDirectory() as folder:
+        write_synthetic_customers(os.path.join(folder, "customers.txt"), 500)
+        write_synthetic_accounts(os.path.join(folder, "accounts.txt"), 1000)
+        write_synthetic_transactions(os.path.join(folder, "accountsTransactions.txt"), rows)
+        menu = load_menu(folder)
+        menu.ensure_transactions()
+        follower = follow.Follower(menu)
+        rand = random.Random(1)
+        print("catch up		new rows	seconds")
+        for way in ("poll", "reload"):
+            # another teller's lines
+            with open(b.TRANSACTION_FILE, "a") as myfile:
+                for i in range(0, appended):
+                    myfile.write(b.transaction_line(rows + i, 0, rand.randrange(1000), 1.0,
+                                                    0, random_timestamp(rand)))
+            rows += appended
+            start = time.perf_counter()
+            if way == "poll":
+                follower.poll()
+            else:
+                menu.load_transactions(b.TRANSACTION_FILE)
+            seconds = time.perf_counter() - start
+            print(f"{way:<8}	{appended:<8}	{seconds:.4f}	({menu._transactions.__len__()} held)")
+
+@benchmark("snapshot", "Menu startup from the text files against a binary snapshot plus delta [rows] [customers]")
+def bench_snapshot(rows="1000000", customers="50000"):
+    """Starts a Menu (ledger paged in) from the text, from a fresh snapshot and from a snapshot with appends"""
+    import snapshot
+    rows = int(float(rows))
+    customers = int(float(customers))
+    with tempfile.TemporaryDirectory() as folder:
+        write_synthetic_customers(os.path.join(folder, "customers.txt"), customers)
+        write_synthetic_accounts(os.path.join(folder, "accounts.txt"), customers * 2)
+        write_synthetic_transactions(os.path.join(folder, "accountsTransactions.txt"), rows, customers * 2)
+        load_menu(folder)
+        # imported by load_menu with the arguments hidden
+        import main
+        start = time.perf_counter()
+        snapshot.save("snapshot.bin", b.CUSTOMER_FILE, b.ACCOUNTS_FILE, b.TRANSACTION_FILE)
+        print(f"{rows} rows, {customers} customers - snapshot of "
+              f"{os.path.getsize('snapshot.bin') / 2 ** 20:.0f} MB saved in {time.perf_counter() - start:.2f}s")
+        print("start from		menu (s)	with ledger (s)")
+        rand = random.Random(1)
+        for source in ("text", "snapshot", "snapshot+delta"):
+            if source == "snapshot+delta":
+                # another session's transactions since the snapshot
+                with open(b.TRANSACTION_FILE, "a") as myfile:
+                    for i in range(0, 1000):
+                        myfile.write(b.transaction_line(rows + i, 0, rand.randrange(customers * 2), 1.0,
+                                                        0, random_timestamp(rand)))
+            main.SNAPSHOT_FILE = None if source == "text" else "snapshot.bin"
+            start = time.perf_counter()
+            menu = load_menu(folder)
+            menu_seconds = time.perf_counter() - start
+            menu.ensure_transactions()
+            seconds = time.perf_counter() - start
+            print(f"{source:<16}	{menu_seconds:<8.2f}	{seconds:.2f}")
+        main.SNAPSHOT_FILE = None
+
+def bytes_written() -> (int):
+    """Returns how many bytes this process has written (linux /proc/self/io)"""
+    with open("/proc/self/io", "r") as file:
+        for line in file:
+            if line.startswith("wchar:"):
+                return int(line.split(":")[1])
+    return 0
+
+
+@benchmark("uow", "an interactive session writing straight away against the unit of work [customers] [sessions]")
+def bench_uow(customers="50000", sessions="20"):
+    """Each session opens three accounts, renames the customer, deposits and logs out"""
+    import unit_of_work
+    customers = int(float(customers))
+    sessions = int(float(sessions))
+    print("writes		sessions	seconds		bytes written	write calls")
+    for mode in ("direct", "unit of work"):
+        with tempfile.TemporaryDirectory() as folder:
+            write_synthetic_customers(os.path.join(folder, "customers.txt"), customers)
+            write_synthetic_accounts(os.path.join(folder, "accounts.txt"), customers * 2)
+            write_synthetic_transactions(os.path.join(folder, "accountsTransactions.txt"), 1000, customers * 2)
+            menu = load_menu(folder)
+            b.UNIT_OF_WORK = unit_of_work.UnitOfWork() if mode == "unit of work" else None
+            written = bytes_written()
+            calls = write_syscalls()
+            start = time.perf_counter()
+            for session in range(0, sessions):
+                customer = menu._customers[session]
+                menu._current_user = customer
+                for i in range(0, 3):
+                    account = b.CheckingAccount(b.id_allocator().allocate("accounts"), 0, 100)
+                    b.add_account(account)
+                    menu._accounts[account.id] = account
+                    customer.add_account(account)
+                customer.name = f"Renamed {session}"
+                account.deposit(10.0)
+                menu.write_transaction(0, account.id, 10.0, account.id)
+                menu.logout_account()
+            b.flush_ledger()
+            seconds = time.perf_counter() - start
+            print(f"{mode:<12}	{sessions:<8}	{seconds:<8.3f}	{bytes_written() - written:<14}	"
+                  f"{write_syscalls() - calls}")
+            b.close_ledger()
+            b.UNIT_OF_WORK = None
+
+def legacy_limit_reached(account: b.SavingAccount) -> (bool):
+    """The date arithmetic next_transfer and the last_transfer setter ran on every check"""
+    delta = datetime.datetime.now().date() - account.last_transfer.date()
+    return delta.days < account.reset_time
+
+
+@benchmark("limits", "savings limit checks by date math against the limit scheduler [accounts] [passes]")
+def bench_limits(accounts="200000", passes="5"):
+    """Checks every account's limit a few times, then lets a month pass and clears the limits in bulk"""
+    accounts = int(float(accounts))
+    passes = int(float(passes))
+    now = datetime.datetime.now()
+    rand = random.Random(0)
+    start = time.perf_counter()
+    # last transfers over the past 60 days - about half are still limited
+    savings = []
+    for i in range(0, accounts):
+        last_transfer = now - datetime.timedelta(minutes=rand.randrange(60 * 24 * 60))
+        savings.append(b.SavingAccount(i, 100.0, timestamps.format(last_transfer)))
+    print(f"{accounts} savings accounts created in {time.perf_counter() - start:.2f}s, "
+          f"{b.LIMIT_SCHEDULER.pending()} unlocks queued")
+    print("checks by	seconds		limited")
+    start = time.perf_counter()
+    for i in range(0, passes):
+        limited = sum(1 for account in savings if legacy_limit_reached(account))
+    print(f"date math	{time.perf_counter() - start:<8.3f}	{limited}")
+    start = time.perf_counter()
+    for i in range(0, passes):
+        b.LIMIT_SCHEDULER.advance()
+        limited = sum(1 for account in savings if account.limit_reached)
+    print(f"scheduler	{time.perf_counter() - start:<8.3f}	{limited}")
+    start = time.perf_counter()
+    flipped = b.LIMIT_SCHEDULER.advance(time.time() + 31 * 24 * 3600)
+    print(f"a month later {flipped} limits cleared in {time.perf_counter() - start:.3f}s")
+
+@benchmark("selection", "one customer selection prompt - whole list against a page [customers]")
+def bench_selection(customers="100000"):
+    """Renders a selection prompt and picks a customer by id, output thrown away"""
+    import builtins
+    import contextlib
+    import user_interaction as ui
+    customers = int(float(customers))
+    objects = {}
+    for i in range(0, customers):
+        objects[i] = b.Customer(i, f"Customer {i}", 30, f"password{i}", [])
+    print("render		seconds		bytes printed")
+    real_input = builtins.input
+    builtins.input = lambda prompt: str(customers - 1)
+    try:
+        for mode in ("whole list", "page"):
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                if mode == "whole list":
+                    # what every prompt did before paging
+                    available = list(objects)
+                    options = ""
+                    for i in available:
+                        options += f"{str(objects[i])}\n"
+                    print(f"id\tname\t\n{options}")
+                    printed = options.__len__()
+                    input("")
+                else:
+                    selection = ui.SelectionInteraction("", ui.CANCEL_FLAG, option_headers=["id", "name"],
+                                                        list_objs=objects)
+                    selection.prompt_user()
+                    printed = sum(str(objects[i]).__len__() + 1 for i in range(0, ui.PAGE_SIZE))
+                seconds = time.perf_counter() - start
+            print(f"{mode:<12}	{seconds:<8.4f}	{printed}")
+    finally:
+        builtins.input = real_input
+
+@benchmark("names", "customer name search - scanning every name against the name index [customers] [searches]")
+def bench_names(customers="1000000", searches="1000"):
+    """Finds customers by a name part and by the start of their name"""
+    import name_index
+    import user_interaction as ui
+    customers = int(float(customers))
+    searches = int(float(searches))
+    rand = random.Random(0)
+    first = ["Sean", "Aaron", "Greg", "Shane", "Peter", "Mary", "Aoife", "Niamh", "Ciara", "Liam"]
+    objects = {}
+    for i in range(0, customers):
+        objects[i] = b.Customer(i, f"{rand.choice(first)} Surname{rand.randrange(customers)}", 30, "password", [])
+    index = name_index.NameIndex()
+    index.attach(objects)
+    start = time.perf_counter()
+    next(index.search("sean"))
+    print(f"{customers} customers - index sorted on first search in {time.perf_counter() - start:.2f}s")
+    queries = [f"surname{rand.randrange(customers)}" for i in range(0, searches)]
+    print("search by	per search (us)	matches (first page)")
+    # the scan is only timed on a few queries - it reads every name each time
+    start = time.perf_counter()
+    found = 0
+    for query in queries[:10]:
+        found += [customer.id for customer in objects.values() if query in customer.name.lower()][:ui.PAGE_SIZE].__len__()
+    print(f"scan    	{(time.perf_counter() - start) / 10 * 10 ** 6:<14.1f}	{found}")
+    for mode in ("name part", "two words", "full name"):
+        start = time.perf_counter()
+        found = 0
+        for query in queries:
+            if mode == "two words":
+                query = f"ni {query}"
+            elif mode == "full name":
+                query = f"mary {query}"
+            found += list(itertools.islice(index.search(query), ui.PAGE_SIZE)).__len__()
+        print(f"{mode:<12}	{(time.perf_counter() - start) / searches * 10 ** 6:<14.1f}	{found}")
+    start = time.perf_counter()
+    for i in range(0, searches):
+        index.add(customers + i, f"New Customer{i}")
+    print(f"add     	{(time.perf_counter() - start) / searches * 10 ** 6:<14.1f}")
+
+
+if __name__ == "__main__":
+    if sys.argv.__len__() < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Usage: python benchmark.py <name> [args...]")
+        for name in BENCHMARKS:
+            print(f"    {name:<12} {BENCHMARKS[name][1]}")
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]][0](*sys.argv[2:])
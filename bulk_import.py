@@ -0,0 +1,325 @@
+"""
+    Non-interactive bulk loader for customers, accounts and transactions.
+
+    Reads CSV (with a header row) or JSONL exports, gives every new record an id
+    from the id allocator, links accounts to their customers and writes each data
+    file once.
+
+    With an account store or a storage backend set in bank, the records are
+    written through it like any other new record instead of appended as text.
+
+    Usage:
+        python bulk_import.py [--customers FILE] [--accounts FILE] [--transactions FILE]
+                              [--customer-file customers.txt] [--accounts-file accounts.txt]
+                              [--transaction-file accountsTransactions.txt]
+                              [--account-store accounts.dat | --database bank.db]
+
+    Customer columns
+        ref (optional key used by the other files), name, age, password
+    Account columns
+        ref (optional), customer (ref of an imported customer) or customer_id (existing id),
+        type (0/savings or 1/checking), balance, credit_limit, last_transfer
+    Transaction columns
+        type (0 - deposit, 1 - withdraw, 2 - transfer), account (ref) or account_id,
+        amount, receiver (ref) or receiver_id, timestamp
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+
+import account_store
+import bank as b
+import ids
+import storage
+import timestamps
+
+DEFAULT_LAST_TRANSFER = "Jan 01 2000 01:00AM"
+# ids reserved at a time - a large import takes its ids in a handful of id file updates
+IMPORT_BLOCK_SIZE = 10000
+
+
+class ImportFailed(Exception):
+    """Raised if any row of the import is invalid - nothing is written"""
+    def __init__(self, errors: list):
+        super().__init__(f"{errors.__len__()} invalid row/s")
+        self.errors = errors
+
+
+def read_rows(filename: str):
+    """
+    Streams rows out of a CSV or JSONL export as dictionaries
+
+        Args:
+            filename (str): .csv or .jsonl file
+
+        Yields:
+            dict: one row of the export
+    """
+    with open(filename, "r", newline="") as file:
+        if filename.endswith(".jsonl") or filename.endswith(".json"):
+            for line in file:
+                if line.strip() != "":
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(file):
+                yield row
+
+
+def field(row: dict, name: str, default=None):
+    """Returns a stripped field of a row, or default if it is missing or blank"""
+    value = row.get(name)
+    if value is None or str(value).strip() == "":
+        return default
+    return str(value).strip()
+
+
+def current_ids(customer_file: str, accounts_file: str, transaction_file: str,
+                allocator: ids.IdAllocator) -> (dict):
+    """
+    Reads the customers and account ids on file and makes sure the allocator hands
+    out none of the ids already on file
+
+        Returns:
+            tuple: (dict[int, Customer] of the customers on file, set[int] of the account ids on file)
+    """
+    customers = {}
+    # the storage backend's rows when there is one
+    for customer in b.iter_customers(customer_file):
+        customers[customer.id] = customer
+    allocator.observe("customers", max(customers, default=None))
+    account_ids = set()
+    # journaled accounts too - they may not be in the accounts file yet
+    for account in b.iter_accounts(accounts_file):
+        account_ids.add(account.id)
+    allocator.observe("accounts", max(account_ids, default=None))
+    if "transactions" in allocator.marks() or b.STORAGE is not None:
+        allocator.observe("transactions", b.last_transaction_id(transaction_file))
+    else:
+        allocator.observe("transactions", ids.max_transaction_id(transaction_file))
+    return customers, account_ids
+
+
+def build_import(customers: dict, account_ids: set, allocator: ids.IdAllocator,
+                 customer_rows, account_rows, transaction_rows) -> (tuple):
+    """
+    Validates every row and assigns ids - ids of a failed import are skipped, never reused
+
+        Args:
+            customers (dict[int, Customer]): customers already on file
+            account_ids (set[int]): accounts already on file - transactions may only name these or imported ones
+            allocator (IdAllocator): where the new ids come from
+            customer_rows, account_rows, transaction_rows (iterable[dict]): export rows
+
+        Returns:
+            tuple: (new customers, new account lines, new transaction lines, changed existing customers)
+
+        Raises:
+            ImportFailed: at least one row was invalid
+    """
+    errors = []
+    new_customers = {}
+    customer_refs = {}
+    for i, row in enumerate(customer_rows):
+        name = field(row, "name", "")
+        age = field(row, "age", "")
+        password = field(row, "password", "")
+        # same rules as the interactive create_user flow
+        if not name.replace(" ", "").isalpha() or name.__len__() <= 5:
+            errors.append(("customers", i, "name must be alphabetic and longer than 5 characters"))
+        elif not age.isnumeric() or int(age) <= 0:
+            errors.append(("customers", i, "age must be a number greater than 0"))
+        elif password.__len__() <= 6 or any(c in password for c in ",'\""):
+            errors.append(("customers", i, "password must be longer than 6 characters without ,s or quotes"))
+        else:
+            cust_id = allocator.allocate("customers")
+            new_customers[cust_id] = b.Customer(cust_id, name, int(age), password, [])
+            customer_refs[field(row, "ref", str(i))] = new_customers[cust_id]
+    account_lines = []
+    account_refs = {}
+    changed_customers = {}
+    for i, row in enumerate(account_rows):
+        # finds the owner in this import first, then on file
+        owner = customer_refs.get(field(row, "customer"))
+        if owner is None and field(row, "customer_id", "").isnumeric():
+            owner = customers.get(int(field(row, "customer_id")))
+            if owner is not None:
+                changed_customers[owner.id] = owner
+        acc_type = {"0": 0, "savings": 0, "1": 1, "checking": 1}.get(str(field(row, "type", "")).lower())
+        try:
+            balance = float(field(row, "balance", "0"))
+            credit = int(float(field(row, "credit_limit", "100")))
+            last_transfer = timestamps.format(timestamps.parse(field(row, "last_transfer", DEFAULT_LAST_TRANSFER)))
+        except ValueError as e:
+            errors.append(("accounts", i, str(e)))
+            continue
+        if owner is None:
+            errors.append(("accounts", i, "customer not found"))
+        elif acc_type is None:
+            errors.append(("accounts", i, "type must be 0/savings or 1/checking"))
+        # same age rules as the interactive create_account flow
+        elif owner.age < 14 or (acc_type == 1 and owner.age < 18):
+            errors.append(("accounts", i, "customer is too young for this account type"))
+        else:
+            acc_id = allocator.allocate("accounts")
+            if acc_type == 0:
+                account_lines.append(b.record_line(acc_id, 0, balance, timestamp=last_transfer))
+            else:
+                account_lines.append(b.record_line(acc_id, 1, balance, credit=credit))
+            owner.account_ids.append(acc_id)
+            account_refs[field(row, "ref", str(i))] = acc_id
+            account_ids.add(acc_id)
+    transaction_lines = []
+    now = timestamps.format(datetime.now())
+    for i, row in enumerate(transaction_rows):
+        account = account_refs.get(field(row, "account"))
+        if account is None and field(row, "account_id", "").isnumeric():
+            account = int(field(row, "account_id"))
+        receiver = account_refs.get(field(row, "receiver"))
+        if receiver is None and field(row, "receiver_id", "").isnumeric():
+            receiver = int(field(row, "receiver_id"))
+        if receiver is None:
+            receiver = account
+        try:
+            trans_type = int(field(row, "type", ""))
+            amount = float(field(row, "amount", ""))
+            time_stamp = timestamps.format(timestamps.parse(field(row, "timestamp", now)))
+        except ValueError as e:
+            errors.append(("transactions", i, str(e)))
+            continue
+        if account is None or trans_type not in (0, 1, 2) or not amount > 0:
+            errors.append(("transactions", i, "needs an account, a type of 0-2 and an amount above 0"))
+        elif account not in account_ids or receiver not in account_ids:
+            errors.append(("transactions", i, "account or receiver not found"))
+        else:
+            trans_id = allocator.allocate("transactions")
+            transaction_lines.append(b.transaction_line(trans_id, trans_type, account, amount, receiver, time_stamp))
+    if errors:
+        raise ImportFailed(errors)
+    return new_customers, account_lines, transaction_lines, changed_customers
+
+
+def customer_line(customer: b.Customer) -> (str):
+    """Builds a customers file line"""
+    account_ids = "-".join(map(str, customer.account_ids))
+    return f"{customer.id}, {customer.name}, {customer.age}, {customer.password}, [{account_ids}]\n"
+
+
+def write_through_bank(new_customers: dict, account_lines: list, transaction_lines: list,
+                       changed_customers: dict):
+    """Saves the import through bank's persistence - the account store or the storage backend"""
+    accounts = [b.parse_account(line) for line in account_lines]
+    transactions = [b.parse_transaction(line) for line in transaction_lines]
+    # one database transaction for the whole import
+    with b.storage_transaction():
+        for account in accounts:
+            b.add_account(account)
+        for customer in new_customers.values():
+            b.add_customer(customer)
+        if changed_customers:
+            b.save_customers(list(changed_customers.values()))
+        if transactions:
+            b.append_transactions(transactions)
+    b.flush_ledger()
+
+
+def write_import(customer_file: str, accounts_file: str, transaction_file: str,
+                 new_customers: dict, account_lines: list, transaction_lines: list,
+                 changed_customers: dict):
+    """Writes each data file once"""
+    if b.STORAGE is not None or b.ACCOUNT_STORE is not None:
+        # comma separated lines would corrupt a fixed-width store and never reach a database
+        write_through_bank(new_customers, account_lines, transaction_lines, changed_customers)
+        return
+    # accounts first - a customer line never points at an account that isn't written
+    if account_lines:
+        # the journal's checkpoint replaces the accounts file under this lock
+        with b.account_journal().lock, open(accounts_file, "a") as myfile:
+            myfile.write("".join(account_lines))
+    # the customers file has one set of writers in this process
+    with b.CUSTOMER_FILE_LOCK:
+        if changed_customers:
+            # existing customers gained accounts - rewrite the file in one pass
+            customer_lines = b.file_handler(customer_file) or []
+            for i in range(0, customer_lines.__len__()):
+                try:
+                    customer = b.parse_customer(customer_lines[i])
+                except b.InvalidRecord:
+                    continue
+                if customer is not None and customer.id in changed_customers:
+                    customer_lines[i] = customer_line(changed_customers[customer.id])
+            customer_lines += [customer_line(customer) for customer in new_customers.values()]
+            tmp_file = f"{customer_file}.tmp"
+            with open(tmp_file, "w") as myfile:
+                myfile.write("".join(customer_lines))
+            os.replace(tmp_file, customer_file)
+        elif new_customers:
+            with open(customer_file, "a") as myfile:
+                myfile.write("".join(customer_line(customer) for customer in new_customers.values()))
+    if transaction_lines:
+        with open(transaction_file, "a") as myfile:
+            myfile.write("".join(transaction_lines))
+
+
+def bulk_import(customer_file: str, accounts_file: str, transaction_file: str,
+                customers_export: str = None, accounts_export: str = None,
+                transactions_export: str = None) -> (tuple):
+    """
+    Imports exports into the data files
+
+        Returns:
+            tuple: number of (customers, accounts, transactions) imported
+
+        Raises:
+            ImportFailed: at least one row was invalid - nothing is written
+    """
+    b.CUSTOMER_FILE = customer_file
+    b.ACCOUNTS_FILE = accounts_file
+    b.TRANSACTION_FILE = transaction_file
+    allocator = ids.IdAllocator(f"{transaction_file}.ids", IMPORT_BLOCK_SIZE)
+    customers, account_ids = current_ids(customer_file, accounts_file, transaction_file, allocator)
+    new_customers, account_lines, transaction_lines, changed_customers = build_import(
+        customers, account_ids, allocator,
+        read_rows(customers_export) if customers_export else [],
+        read_rows(accounts_export) if accounts_export else [],
+        read_rows(transactions_export) if transactions_export else [])
+    write_import(customer_file, accounts_file, transaction_file,
+                 new_customers, account_lines, transaction_lines, changed_customers)
+    return new_customers.__len__(), account_lines.__len__(), transaction_lines.__len__()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk imports customers, accounts and transactions.")
+    parser.add_argument("--customers", help="CSV/JSONL export of customers")
+    parser.add_argument("--accounts", help="CSV/JSONL export of accounts")
+    parser.add_argument("--transactions", help="CSV/JSONL export of transactions")
+    parser.add_argument("--customer-file", default=b.CUSTOMER_FILE)
+    parser.add_argument("--accounts-file", default=b.ACCOUNTS_FILE)
+    parser.add_argument("--transaction-file", default=b.TRANSACTION_FILE)
+    backend = parser.add_mutually_exclusive_group()
+    backend.add_argument("--account-store", help="fixed-width account store used instead of --accounts-file")
+    backend.add_argument("--database", help="SQLite database used instead of the text files")
+    args = parser.parse_args()
+    if args.account_store is not None:
+        if not os.path.isfile(args.account_store):
+            print(f"{args.account_store} is not an account store - create it with account_store.py first.")
+            sys.exit(1)
+        args.accounts_file = args.account_store
+        b.ACCOUNT_STORE = account_store.AccountStore(args.account_store)
+    elif args.database is not None:
+        b.STORAGE = storage.SqliteStorage(args.database)
+    try:
+        counts = bulk_import(args.customer_file, args.accounts_file, args.transaction_file,
+                             args.customers, args.accounts, args.transactions)
+    except ImportFailed as e:
+        for file_kind, row, reason in e.errors[:50]:
+            print(f"{file_kind} row {row}: {reason}")
+        print(f"Import failed with {e.errors.__len__()} invalid row/s. Nothing was written.")
+        sys.exit(1)
+    finally:
+        for backend in (b.STORAGE, b.ACCOUNT_STORE):
+            if backend is not None:
+                backend.close()
+    print(f"Imported {counts[0]} customers, {counts[1]} accounts and {counts[2]} transactions.")
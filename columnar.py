@@ -0,0 +1,257 @@
+"""
+    Columnar transaction ledger for analytics. Ids, types, account ids, receiving
+    account ids, amounts and timestamps are kept in parallel typed arrays instead
+    of one Transaction object per row, so filters and totals run over flat columns.
+
+    NumPy is used for the column scans when it is installed. Without it the same
+    queries run over the array module columns in pure python.
+"""
+import os
+from array import array
+from datetime import datetime, timedelta
+
+import bank as b
+import mapped_ledger
+
+# values the types column holds - it is a signed byte wide
+TRANSACTION_TYPES = (0, 1, 2)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ColumnarLedger():
+    """
+    Transaction ledger stored as parallel typed columns.
+
+        Attributes:
+            ids : array('q')
+                transaction ids
+            types : array('b')
+                transaction types (0 - deposit, 1 - withdraw, 2 - transfer)
+            acc_ids : array('q')
+                ids of accounts taken from
+            rec_accs : array('q')
+                ids of accounts receiving
+            amounts : array('d')
+                amounts transacted
+            minutes : array('q')
+                transaction times as minutes since Transaction.EPOCH
+
+        Methods:
+            append(id, transaction_type, acc_id, amount, rec_acc, minute):
+                adds a row
+            from_file(filename):
+                builds a ledger from a transaction file (class method)
+            select(acc_id, rec_acc, transaction_type, start, end):
+                returns row numbers matching every given filter
+            total(rows):
+                sums the amounts of the given rows
+            sum_by(column, rows):
+                sums amounts grouped by a column
+            monthly_statement(acc_id, year, month):
+                totals of one account's deposits, withdrawals and transfers in a month
+            monthly_statements(year, month):
+                statements of every account active in a month
+    """
+
+    def __init__(self):
+        self.ids = array('q')
+        self.types = array('b')
+        self.acc_ids = array('q')
+        self.rec_accs = array('q')
+        self.amounts = array('d')
+        self.minutes = array('q')
+
+    def __len__(self):
+        return self.ids.__len__()
+
+    def append(self, id: int, transaction_type: int, acc_id: int, amount: float, rec_acc: int, minute: int):
+        """
+        Adds a row to the ledger
+
+            Args:
+                id (int): transaction id
+                transaction_type (int): 0 - deposit, 1 - withdraw, 2 - transfer
+                acc_id (int): id of account taken from
+                amount (float): amount of money transacted
+                rec_acc (int): id of account receiving
+                minute (int): time as minutes since Transaction.EPOCH
+
+            Raises:
+                InvalidRecord: the type is not 0-2 - checked before any column changes
+        """
+        if transaction_type not in TRANSACTION_TYPES:
+            raise b.InvalidRecord(f"transaction type must be 0-2, not {transaction_type}")
+        self.ids.append(id)
+        self.types.append(transaction_type)
+        self.acc_ids.append(acc_id)
+        self.rec_accs.append(rec_acc)
+        self.amounts.append(amount)
+        self.minutes.append(minute)
+
+    def append_transaction(self, transaction: b.Transaction):
+        """Adds a Transaction object as a row"""
+        self.append(transaction.id, transaction.transaction_type, transaction.acc_id,
+                    transaction.amount, transaction.rec_acc, transaction._minutes)
+
+    @classmethod
+    def from_file(cls, filename: str):
+        """
+        Builds a ledger from a transaction file, parsing it in place through
+        mapped_ledger without building a Transaction (or a string) per row
+
+            Args:
+                filename (str): the transaction file
+
+            Returns:
+                ColumnarLedger: the ledger
+        """
+        ledger = cls()
+        if not os.path.exists(filename):
+            return ledger
+        for row in mapped_ledger.rows(filename):
+            # a line of an unknown type is skipped like any other broken line
+            if row[1] in TRANSACTION_TYPES:
+                ledger.append(*row)
+        return ledger
+
+    def select(self, acc_id: int = None, rec_acc: int = None, transaction_type: int = None,
+               start: datetime = None, end: datetime = None):
+        """
+        Returns the rows matching every filter given
+
+            Args:
+                acc_id (int): account taken from
+                rec_acc (int): account receiving
+                transaction_type (int): 0 - deposit, 1 - withdraw, 2 - transfer
+                start (datetime): earliest time (inclusive)
+                end (datetime): latest time (exclusive)
+
+            Returns:
+                numpy index array or list[int]: matching row numbers
+        """
+        start = None if start is None else minute_of(start)
+        end = None if end is None else minute_of(end)
+        if np is not None:
+            # vectorised - one boolean mask per filter
+            mask = np.ones(self.__len__(), dtype=bool)
+            if acc_id is not None:
+                mask &= np.frombuffer(self.acc_ids, dtype=np.int64) == acc_id
+            if rec_acc is not None:
+                mask &= np.frombuffer(self.rec_accs, dtype=np.int64) == rec_acc
+            if transaction_type is not None:
+                mask &= np.frombuffer(self.types, dtype=np.int8) == transaction_type
+            if start is not None:
+                mask &= np.frombuffer(self.minutes, dtype=np.int64) >= start
+            if end is not None:
+                mask &= np.frombuffer(self.minutes, dtype=np.int64) < end
+            return np.flatnonzero(mask)
+        # pure python - narrows down one column at a time
+        rows = range(0, self.__len__())
+        if acc_id is not None:
+            rows = [i for i in rows if self.acc_ids[i] == acc_id]
+        if rec_acc is not None:
+            rows = [i for i in rows if self.rec_accs[i] == rec_acc]
+        if transaction_type is not None:
+            rows = [i for i in rows if self.types[i] == transaction_type]
+        if start is not None:
+            rows = [i for i in rows if self.minutes[i] >= start]
+        if end is not None:
+            rows = [i for i in rows if self.minutes[i] < end]
+        return list(rows)
+
+    def total(self, rows=None) -> (float):
+        """
+        Sums the amounts of the given rows
+
+            Args:
+                rows: row numbers from select, every row if None
+
+            Returns:
+                float: total amount
+        """
+        if np is not None:
+            amounts = np.frombuffer(self.amounts, dtype=np.float64)
+            return float(amounts.sum() if rows is None else amounts[rows].sum())
+        if rows is None:
+            return sum(self.amounts, 0.0)
+        return sum((self.amounts[i] for i in rows), 0.0)
+
+    def sum_by(self, column: str, rows=None) -> (dict):
+        """
+        Sums amounts grouped by a column
+
+            Args:
+                column (str): "types", "acc_ids" or "rec_accs"
+                rows: row numbers from select, every row if None
+
+            Returns:
+                dict: column value -> total amount
+        """
+        keys = getattr(self, column)
+        if np is not None:
+            codes = np.frombuffer(keys, dtype=np.int8 if column == "types" else np.int64)
+            amounts = np.frombuffer(self.amounts, dtype=np.float64)
+            if rows is not None:
+                codes = codes[rows]
+                amounts = amounts[rows]
+            unique, inverse = np.unique(codes, return_inverse=True)
+            totals = np.bincount(inverse, weights=amounts, minlength=unique.__len__())
+            return {int(key): float(total) for key, total in zip(unique, totals)}
+        totals = {}
+        for i in (range(0, self.__len__()) if rows is None else rows):
+            totals[keys[i]] = totals.get(keys[i], 0.0) + self.amounts[i]
+        return totals
+
+    def monthly_statement(self, acc_id: int, year: int, month: int) -> (dict):
+        """
+        Totals of one account's money movements in a month
+
+            Args:
+                acc_id (int): the account
+                year (int): statement year
+                month (int): statement month (1-12)
+
+            Returns:
+                dict: "deposits", "withdrawals", "transfers out" and "transfers in" totals
+        """
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+        out_totals = self.sum_by("types", self.select(acc_id=acc_id, start=start, end=end))
+        received = self.select(rec_acc=acc_id, transaction_type=2, start=start, end=end)
+        return {"deposits": out_totals.get(0, 0.0),
+                "withdrawals": out_totals.get(1, 0.0),
+                "transfers out": out_totals.get(2, 0.0),
+                "transfers in": self.total(received)}
+
+    def monthly_statements(self, year: int, month: int) -> (dict):
+        """
+        Statements of every account with activity in a month, from one scan per type
+
+            Args:
+                year (int): statement year
+                month (int): statement month (1-12)
+
+            Returns:
+                dict: account id -> monthly_statement style dict
+        """
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+        statements = {}
+        columns = [("deposits", 0, "acc_ids"), ("withdrawals", 1, "acc_ids"),
+                   ("transfers out", 2, "acc_ids"), ("transfers in", 2, "rec_accs")]
+        for name, transaction_type, column in columns:
+            rows = self.select(transaction_type=transaction_type, start=start, end=end)
+            for acc_id, total in self.sum_by(column, rows).items():
+                statement = statements.setdefault(acc_id, {"deposits": 0.0, "withdrawals": 0.0,
+                                                           "transfers out": 0.0, "transfers in": 0.0})
+                statement[name] = total
+        return statements
+
+
+def minute_of(time: datetime) -> (int):
+    """Returns a time as minutes since Transaction.EPOCH, like the minutes column"""
+    return (time - b.Transaction.EPOCH) // timedelta(minutes=1)
@@ -0,0 +1,214 @@
+"""
+    Thread-safe account engine. Deposits, withdrawals and transfers can be posted
+    from many threads at once - each one locks only the accounts it touches (in id
+    order, so two transfers can never deadlock) and hands the changed records to a
+    single persistence thread, which commits whatever has queued up as one group.
+
+    If a commit fails the engine stops: nothing else queued is written, and every
+    later call raises EngineFailed. The menu's balances may then be ahead of the
+    files, so it has to be loaded again before anything else posts.
+"""
+import copy
+import queue
+import threading
+from datetime import datetime
+
+import bank as b
+import batch
+import timestamps
+
+
+class EngineFailed(Exception):
+    """Raised once a commit has failed - the engine takes no more operations"""
+
+
+class AccountEngine():
+    """
+    Concurrency-safe front of a Menu's accounts and ledger.
+
+        Attributes:
+            menu : Menu
+                the menu holding the accounts and transactions
+            _locks : dict[int, Lock]
+                one lock per account, created on first use
+            _counter_lock : Lock
+                hands out transaction ids and tickets in the same order
+            _ledger_lock : Lock
+                guards menu._transactions and the Transaction indexes
+            _queue : Queue
+                (account snapshots, transactions) waiting for the persistence thread
+            _posted / _persisted : int
+                operations queued / committed so far - queue order is ticket order
+            _error : Exception
+                why a commit failed - None while the engine is working
+
+        Methods:
+            deposit(acc_id, amount):
+                deposits into an account
+            withdraw(acc_id, amount):
+                withdraws from an account
+            transfer(acc_id, rec_acc, amount):
+                moves money between two accounts
+            post(operation):
+                posts a batch.Operation
+            post_durable(operation):
+                posts a batch.Operation and waits until it is persisted
+            flush():
+                returns once everything posted so far is persisted
+            close():
+                flushes and stops the persistence thread
+    """
+
+    def __init__(self, menu):
+        self.menu = menu
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._ledger_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._posted = 0
+        self._persisted = 0
+        self._persisted_cond = threading.Condition()
+        self._error = None
+        self._writer = threading.Thread(target=self._persist, name="engine-writer", daemon=True)
+        self._writer.start()
+
+    def _lock(self, acc_id: int) -> (threading.Lock):
+        """Returns the lock of an account"""
+        lock = self._locks.get(acc_id)
+        if lock is None:
+            with self._locks_lock:
+                lock = self._locks.setdefault(acc_id, threading.Lock())
+        return lock
+
+    def deposit(self, acc_id: int, amount: float):
+        """Deposits into an account - returns the Transaction, None if rejected"""
+        return self.post(batch.Operation(batch.DEPOSIT, acc_id, amount))
+
+    def withdraw(self, acc_id: int, amount: float):
+        """Withdraws from an account - returns the Transaction, None if rejected"""
+        return self.post(batch.Operation(batch.WITHDRAW, acc_id, amount))
+
+    def transfer(self, acc_id: int, rec_acc: int, amount: float):
+        """Moves money between accounts - returns the Transaction, None if rejected"""
+        return self.post(batch.Operation(batch.TRANSFER, acc_id, amount, rec_acc))
+
+    def post(self, operation: batch.Operation):
+        """
+        Applies an operation under the locks of the accounts it touches
+
+            Args:
+                operation (Operation): the deposit, withdrawal or transfer
+
+            Returns:
+                Transaction: the transaction posted, None if the operation was rejected
+        """
+        return self._post(operation)[0]
+
+    def post_durable(self, operation: batch.Operation):
+        """
+        Applies an operation and blocks until the persistence thread has committed it
+
+            Args:
+                operation (Operation): the deposit, withdrawal or transfer
+
+            Returns:
+                Transaction: the transaction posted, None if the operation was rejected
+        """
+        transaction, ticket = self._post(operation)
+        if transaction is not None:
+            with self._persisted_cond:
+                while self._persisted < ticket and self._error is None:
+                    self._persisted_cond.wait()
+            self._check()
+        return transaction
+
+    def _check(self):
+        """Raises EngineFailed if a commit has failed"""
+        if self._error is not None:
+            raise EngineFailed(f"a commit failed: {self._error!r}") from self._error
+
+    def _post(self, operation: batch.Operation) -> (tuple):
+        """Posts an operation - returns (Transaction or None, persistence ticket)"""
+        # balances can't move on once the files have stopped following them
+        self._check()
+        # always taken lowest id first - no two operations can wait on each other
+        locks = [self._lock(acc_id) for acc_id in sorted({operation.acc_id, operation.rec_acc})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            accounts = self.menu._accounts
+            # same rules as a batch - checked against the locked accounts only
+            balances, withdrawn, failures = batch.validate(accounts, [operation])
+            if failures:
+                return None, 0
+            for acc_id in balances:
+                accounts[acc_id]._balance = balances[acc_id]
+            time_stamp = timestamps.format(datetime.now())
+            for acc_id in withdrawn:
+                accounts[acc_id].last_transfer = timestamps.parse(time_stamp)
+            # copies are queued so the writer never sees a later, half-applied state
+            snapshots = [copy.copy(accounts[acc_id]) for acc_id in balances]
+            # ids and tickets are handed out in queue order
+            with self._counter_lock:
+                trans_id = b.id_allocator().allocate("transactions")
+                transaction = b.Transaction(trans_id, operation.transaction_type,
+                                            operation.acc_id, operation.amount, operation.rec_acc,
+                                            time_stamp)
+                self._posted += 1
+                ticket = self._posted
+                self._queue.put((snapshots, transaction))
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        if self.menu._transactions_loaded:
+            with self._ledger_lock:
+                self.menu._transactions[transaction.id] = transaction
+                b.Transaction.index(transaction)
+        return transaction, ticket
+
+    def _persist(self):
+        """Persistence thread - commits everything queued since its last commit as one group"""
+        while True:
+            jobs = [self._queue.get()]
+            # drains whatever else has queued up meanwhile
+            while True:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in jobs
+            accounts = {}
+            transactions = []
+            for job in jobs:
+                if job is None:
+                    continue
+                # the latest snapshot of each account wins - jobs are queued in lock order
+                for account in job[0]:
+                    accounts[account.id] = account
+                transactions.append(job[1])
+            try:
+                # after a failure later snapshots include changes that never reached disk
+                if transactions and self._error is None:
+                    b.commit_movements(list(accounts.values()), transactions)
+            except Exception as e:
+                self._error = e
+            with self._persisted_cond:
+                self._persisted += transactions.__len__()
+                self._persisted_cond.notify_all()
+            for job in jobs:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """Returns once everything posted so far is persisted"""
+        self._queue.join()
+        self._check()
+
+    def close(self):
+        """Flushes and stops the persistence thread"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._check()
@@ -0,0 +1,239 @@
+"""
+    Keeps a Menu in step with data files other processes write to, so several
+    teller processes can share one set of files without restarting to see each
+    other's work.
+
+    New transaction lines are read from the byte offset the ledger was last read up
+    to - nothing before it is parsed again. The customers and accounts files (with
+    the balance journal) are only reloaded when their generation - inode, size and
+    modification time - has changed, and reloaded records are merged into the
+    objects already held so references to them stay valid. Changes the unit of
+    work is still holding are committed before a reload, and a record changed
+    again while the files are read keeps its in-memory state.
+
+    Following covers the text files - with a storage backend poll() does nothing.
+"""
+import os
+import threading
+import time
+
+import bank as b
+import mapped_ledger
+
+# seconds between polls
+INTERVAL = 1.0
+# newest transactions of an account checked for a line this process wrote itself
+ECHO_WINDOW = 64
+
+
+def generation(filename: str) -> (tuple):
+    """
+    Returns what changes whenever a file is written or replaced
+
+        Args:
+            filename (str): the file
+
+        Returns:
+            tuple: (inode, size, modification time in ns), None if there is no file
+    """
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def is_dirty(kind: str, id: int) -> (bool):
+    """Whether the unit of work holds changes to a "customer" or "account" that aren't written yet"""
+    if b.UNIT_OF_WORK is None:
+        return False
+    if kind == "customer":
+        return b.UNIT_OF_WORK.customer_dirty(id)
+    return b.UNIT_OF_WORK.account_dirty(id)
+
+
+def slots_of(cls: type) -> (list):
+    """Returns every __slots__ attribute of a class and its bases that holds record state"""
+    return [name for klass in cls.__mro__ for name in getattr(klass, "__slots__", ()) if name != "__weakref__"]
+
+
+class Follower():
+    """
+    Pulls changes other processes made to the data files into a Menu.
+
+        Attributes:
+            menu : Menu
+                the menu kept up to date
+            interval : float
+                seconds between polls
+            lock : Lock
+                held while a poll changes the menu
+            _generations : dict[str, tuple]
+                generations of the customers and accounts files at the last load
+
+        Methods:
+            poll():
+                reads new transactions and reloads changed files
+            maybe_poll():
+                polls if interval seconds have passed since the last poll
+            start() / stop():
+                polls on a background thread every interval
+    """
+
+    def __init__(self, menu, interval: float = INTERVAL):
+        self.menu = menu
+        self.interval = interval
+        self.lock = threading.Lock()
+        # the menu has just loaded - what's on disk now is what it holds
+        self._generations = self.generations()
+        self._last_poll = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def generations(self) -> (dict):
+        """Returns the current generation of the customers and accounts files"""
+        return {"customers": (generation(b.CUSTOMER_FILE),),
+                "accounts": (generation(b.ACCOUNTS_FILE), generation(b.account_journal().journal_file))}
+
+    def poll(self) -> (dict):
+        """
+        Reads transactions appended since the last read and reloads the customers
+        and accounts if their files changed
+
+            Returns:
+                dict: number of new "transactions", and whether "customers" and "accounts" were reloaded
+        """
+        changes = {"transactions": 0, "customers": False, "accounts": False}
+        if b.STORAGE is not None:
+            return changes
+        with self.lock:
+            self._last_poll = time.monotonic()
+            # generations are taken before reading so a write during the read shows next time
+            generations = self.generations()
+            if generations != self._generations and b.UNIT_OF_WORK is not None:
+                # a reload would overwrite changes that were never written - they go first
+                b.UNIT_OF_WORK.commit()
+                generations = self.generations()
+            if generations["customers"] != self._generations["customers"]:
+                self.reload_customers()
+                changes["customers"] = True
+            if generations["accounts"] != self._generations["accounts"]:
+                self.reload_accounts()
+                changes["accounts"] = True
+            self._generations = generations
+            changes["transactions"] = self.read_transactions()
+        return changes
+
+    def maybe_poll(self):
+        """Polls if interval seconds have passed since the last poll"""
+        if time.monotonic() - self._last_poll >= self.interval:
+            self.poll()
+
+    def read_transactions(self) -> (int):
+        """Adds the transactions appended since the last read - returns how many"""
+        menu = self.menu
+        # our own queued lines have to reach the file before the offset moves past them
+        b.flush_ledger()
+        if not menu._transactions_loaded:
+            # the whole ledger is read when it's paged in - only the newest id matters
+            b.id_allocator().observe("transactions", b.last_transaction_id(b.TRANSACTION_FILE))
+            return 0
+        end = mapped_ledger.line_end(b.TRANSACTION_FILE)
+        if end < menu._transaction_offset:
+            # the file was replaced or truncated - offsets mean nothing any more
+            menu.load_transactions(b.TRANSACTION_FILE)
+            return menu._transactions.__len__()
+        added = 0
+        for row in mapped_ledger.rows(b.TRANSACTION_FILE, menu._transaction_offset, end):
+            transaction = b.Transaction.from_minutes(*row)
+            if self.is_own(transaction):
+                continue
+            menu._transactions[transaction.id] = transaction
+            b.Transaction.index(transaction)
+            # writers sharing the id file never collide - this covers those that don't
+            b.id_allocator().observe("transactions", transaction.id)
+            added += 1
+        menu._transaction_offset = end
+        return added
+
+    def is_own(self, transaction: b.Transaction) -> (bool):
+        """Whether a line read back is one this process wrote and already holds"""
+        recent = b.Transaction.from_account(transaction.acc_id, transaction.transaction_type)[-ECHO_WINDOW:]
+        for known in recent:
+            if (known.id == transaction.id and known.amount == transaction.amount and
+                    known.rec_acc == transaction.rec_acc and known._minutes == transaction._minutes):
+                return True
+        return False
+
+    def reload_customers(self):
+        """Merges the customers file into the menu - customers no longer in it are dropped"""
+        customers = self.menu._customers
+        seen = set()
+        for customer in b.iter_customers(b.CUSTOMER_FILE):
+            seen.add(customer.id)
+            known = customers.get(customer.id)
+            if known is not None and is_dirty("customer", customer.id):
+                # changed since the commit - the next commit writes it over the file's copy
+                continue
+            if known is None:
+                customers[customer.id] = customer
+            else:
+                # updated in place so a logged in user keeps their object
+                known.unregister_accounts()
+                known._name = customer._name
+                known._age = customer._age
+                known.password = customer.password
+                known.account_ids = customer.account_ids
+                customer = known
+            customer.register_accounts()
+        for cust_id in [cust_id for cust_id in customers if cust_id not in seen and not is_dirty("customer", cust_id)]:
+            customers.pop(cust_id).unregister_accounts()
+        # names were changed in place - the index is sorted again on its next use
+        b.Customer.names.attach(customers)
+        b.id_allocator().observe("customers", max(seen, default=None))
+
+    def reload_accounts(self):
+        """Merges the accounts file and journal into the menu - accounts no longer in them are dropped"""
+        accounts = self.menu._accounts
+        seen = set()
+        # the journal serves its records from memory - other processes' commits have to be read in
+        b.account_journal().refresh()
+        # journaled records come last so the newest state of an account wins
+        for account in b.iter_accounts(b.ACCOUNTS_FILE):
+            seen.add(account.id)
+            known = accounts.get(account.id)
+            if known is not None and is_dirty("account", account.id):
+                continue
+            if known is not None and type(known) is type(account):
+                for name in slots_of(type(account)):
+                    setattr(known, name, getattr(account, name))
+                if isinstance(known, b.SavingAccount):
+                    # the unlock was queued for the reloaded copy - the held object needs its own
+                    b.LIMIT_SCHEDULER.schedule(known)
+            else:
+                accounts[account.id] = account
+        for acc_id in [acc_id for acc_id in accounts if acc_id not in seen and not is_dirty("account", acc_id)]:
+            del accounts[acc_id]
+        b.id_allocator().observe("accounts", max(seen, default=None))
+
+    def start(self):
+        """Polls on a background thread every interval seconds"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="follower", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except OSError:
+                # a file mid-replace - the next poll tries again
+                continue
+
+    def stop(self):
+        """Stops the background thread"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,290 @@
+"""
+    Persistent id allocator for customers, accounts and transactions. The id file
+    holds a high-water mark per entity - the lowest id nobody has been given yet -
+    so ids only ever go up and are never handed out twice, whatever order the
+    data files are in and however many processes share them.
+
+    A process reserves a block of ids at a time - one locked read and replace of
+    the id file - and hands them out from memory, so a single write rarely touches
+    the id file. Batches up to a block in size are served from it too; bulk
+    writers reserve exactly the range they need. Ids left in a
+    block when a process exits are skipped, never reused.
+
+        customers 12
+        accounts 40
+        transactions 2100
+
+    renumber_duplicates() repairs a legacy transaction file whose lines share ids.
+It runs once on its own when a Menu first creates the id file, and can be run
+by hand as a one-time migration, with no teller processes open:
+
+        python ids.py renumber [accountsTransactions.txt]
+"""
+import contextlib
+import os
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # no cross-process lock - ids are still unique within one process
+    fcntl = None
+
+# bank imports this module - it is only touched once the functions below run
+import bank as b
+import mapped_ledger
+
+ENTITIES = ("customers", "accounts", "transactions")
+# ids reserved at a time by allocate()
+BLOCK_SIZE = 100
+
+
+class IdAllocator():
+    """
+    Monotonic id source backed by an id file.
+
+        Attributes:
+            filename : str
+                the id file
+            block_size : int
+                ids reserved at a time by allocate()
+            reservations : int
+                times the id file was updated by this allocator
+            _blocks : dict[str, list]
+                [next id, end of block] of the ids reserved but not handed out yet
+            _floors : dict[str, int]
+                lowest id allowed per entity - raised by observe()
+
+        Methods:
+            allocate(entity):
+                hands out the next id
+            allocate_many(entity, count):
+                hands out count ids, from the block unless more than a block is wanted
+            reserve(entity, count):
+                reserves a range of count consecutive ids
+            observe(entity, id):
+                makes sure id is never handed out - for ids written without the allocator
+            marks():
+                reads the high-water marks from the id file
+    """
+
+    def __init__(self, filename: str, block_size: int = BLOCK_SIZE):
+        self.filename = filename
+        self.block_size = block_size
+        self.reservations = 0
+        self._blocks = {}
+        self._floors = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Holds the cross-process lock of the id file"""
+        with open(f"{self.filename}.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            # closing the file releases the lock
+            yield
+
+    def marks(self) -> (dict):
+        """
+        Reads the high-water marks from the id file
+
+            Returns:
+                dict[str, int]: next free id of each entity in the file - missing entities have none yet
+        """
+        marks = {}
+        try:
+            with open(self.filename, "r") as myfile:
+                for line in myfile:
+                    fields = line.split()
+                    if fields.__len__() == 2 and fields[0] in ENTITIES and fields[1].isnumeric():
+                        marks[fields[0]] = int(fields[1])
+        except FileNotFoundError:
+            pass
+        return marks
+
+    def _write(self, marks: dict):
+        tmp_file = f"{self.filename}.tmp"
+        with open(tmp_file, "w") as myfile:
+            myfile.write("".join(f"{entity} {marks[entity]}\n" for entity in ENTITIES if entity in marks))
+            myfile.flush()
+            os.fsync(myfile.fileno())
+        # a crash leaves the old marks or the new ones, never half a file
+        os.replace(tmp_file, self.filename)
+
+    def _reserve(self, entity: str, count: int) -> (range):
+        with self._locked():
+            return self._reserve_locked(entity, count)
+
+    def _reserve_locked(self, entity: str, count: int) -> (range):
+        """Moves the mark on - the caller holds the id file lock"""
+        marks = self.marks()
+        start = max(marks.get(entity, 0), self._floors.get(entity, 0))
+        marks[entity] = start + count
+        # the mark is on disk before any id of the range is used
+        self._write(marks)
+        self.reservations += 1
+        return range(start, start + count)
+
+    def reserve(self, entity: str, count: int) -> (range):
+        """
+        Reserves consecutive ids straight from the id file
+
+            Args:
+                entity (str): "customers", "accounts" or "transactions"
+                count (int): number of ids wanted
+
+            Returns:
+                range: the reserved ids - nobody else will be given any of them
+        """
+        with self._lock:
+            return self._reserve(entity, count)
+
+    def allocate(self, entity: str) -> (int):
+        """
+        Hands out the next id, reserving a new block when the current one runs out
+
+            Args:
+                entity (str): "customers", "accounts" or "transactions"
+
+            Returns:
+                int: an id never handed out before
+        """
+        with self._lock:
+            block = self._blocks.get(entity)
+            if block is None or block[0] >= block[1]:
+                ids = self._reserve(entity, self.block_size)
+                block = self._blocks[entity] = [ids.start, ids.stop]
+            block[0] += 1
+            return block[0] - 1
+
+    def allocate_many(self, entity: str, count: int) -> (list):
+        """
+        Hands out count ids - from the reserved block like allocate(), or as one
+        range straight from the id file when more are wanted than a block holds
+
+            Args:
+                entity (str): "customers", "accounts" or "transactions"
+                count (int): number of ids wanted
+
+            Returns:
+                list[int]: ids never handed out before, in increasing order
+        """
+        if count > self.block_size:
+            return list(self.reserve(entity, count))
+        with self._lock:
+            ids = []
+            while ids.__len__() < count:
+                block = self._blocks.get(entity)
+                if block is None or block[0] >= block[1]:
+                    reserved = self._reserve(entity, self.block_size)
+                    block = self._blocks[entity] = [reserved.start, reserved.stop]
+                # the rest of the block first, then a new one
+                taken = min(count - ids.__len__(), block[1] - block[0])
+                ids.extend(range(block[0], block[0] + taken))
+                block[0] += taken
+            return ids
+
+    def observe(self, entity: str, id: int):
+        """
+        Makes sure an id found on file is never handed out - covers data written
+        by older versions, by hand or by anything not using the allocator
+
+            Args:
+                entity (str): "customers", "accounts" or "transactions"
+                id (int): the id seen - None is ignored
+        """
+        if id is None:
+            return
+        with self._lock:
+            self._floors[entity] = max(self._floors.get(entity, 0), id + 1)
+            block = self._blocks.get(entity)
+            if block is not None:
+                # skips the part of the block at or below the id
+                block[0] = min(max(block[0], id + 1), block[1])
+
+
+def max_transaction_id(filename: str):
+    """Returns the highest transaction id in the file (not the last one), None if there are none"""
+    highest = None
+    for row in mapped_ledger.rows(filename):
+        if highest is None or row[0] > highest:
+            highest = row[0]
+    return highest
+
+
+def scan_transaction_ids(filename: str) -> (tuple):
+    """
+    Reads every transaction id in the file once
+
+        Returns:
+            tuple: (highest id - None if there are none, number of lines whose id an earlier line already has)
+    """
+    highest = None
+    seen = set()
+    duplicates = 0
+    for row in mapped_ledger.rows(filename):
+        if row[0] in seen:
+            duplicates += 1
+        seen.add(row[0])
+        if highest is None or row[0] > highest:
+            highest = row[0]
+    return highest, duplicates
+
+
+def renumber_duplicates(filename: str, allocator: IdAllocator) -> (int):
+    """
+    Gives every transaction line whose id an earlier line already has a fresh id.
+    The file is rewritten once - other lines are kept byte for byte. The id file
+    lock is held throughout, so no other allocator hands out ids meanwhile.
+
+        Args:
+            filename (str): the transaction file
+            allocator (IdAllocator): where the fresh ids come from
+
+        Returns:
+            int: number of lines renumbered
+    """
+    b.flush_ledger()
+    with allocator._lock, allocator._locked():
+        with open(filename, "r") as myfile:
+            lines = myfile.readlines()
+        seen = set()
+        duplicates = []
+        for i in range(0, lines.__len__()):
+            try:
+                transaction = b.parse_transaction(lines[i])
+            except b.InvalidRecord:
+                continue
+            if transaction is None:
+                continue
+            if transaction.id in seen:
+                duplicates.append(i)
+            seen.add(transaction.id)
+        if not duplicates:
+            return 0
+        # fresh ids start above every id in the file
+        allocator._floors["transactions"] = max(allocator._floors.get("transactions", 0), max(seen) + 1)
+        # the lock is already held - a second flock of the file would wait on this one
+        ids = allocator._reserve_locked("transactions", duplicates.__len__())
+        for i, new_id in zip(duplicates, ids):
+            lines[i] = f"{new_id}," + lines[i].split(",", maxsplit=1)[1]
+        # the writer's handle would still point at the replaced file
+        b.close_ledger()
+        tmp_file = f"{filename}.tmp"
+        with open(tmp_file, "w") as myfile:
+            myfile.write("".join(lines))
+            myfile.flush()
+            os.fsync(myfile.fileno())
+        os.replace(tmp_file, filename)
+    return duplicates.__len__()
+
+
+if __name__ == "__main__":
+    if sys.argv.__len__() < 2 or sys.argv[1] != "renumber":
+        print("Usage: python ids.py renumber [accountsTransactions.txt]")
+        sys.exit(1)
+    transaction_file = sys.argv[2] if sys.argv.__len__() > 2 else b.TRANSACTION_FILE
+    renumbered = renumber_duplicates(transaction_file, IdAllocator(f"{transaction_file}.ids"))
+    print(f"Renumbered {renumbered} transaction/s in {transaction_file}.")
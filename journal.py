@@ -0,0 +1,402 @@
+"""
+    Append-only balance journal for the accounts file. Every balance change is
+    written here as a single account record line and folded back into the
+    accounts file on checkpoint, so one deposit no longer rewrites every account.
+
+    Transfers are written as a group - both account records and the transaction
+    lines between a BEGIN and a COMMIT marker, synced with one fsync. A group
+    without its COMMIT is ignored on replay, and a committed group whose lines
+    never reached the transaction file has them appended again. The transaction
+    file itself is synced when the journal is checkpointed, before the journal
+    (the only synced copy of those lines until then) is removed.
+
+        @BEGIN <transaction file size before the group>
+        <account record line>...
+        @LEDGER <transaction line>...
+        @COMMIT
+"""
+import os
+import threading
+
+# number of journaled records before the journal folds itself into the accounts file
+CHECKPOINT_THRESHOLD = 500
+# markers of a committed group
+BEGIN = "@BEGIN"
+LEDGER = "@LEDGER "
+COMMIT = "@COMMIT"
+
+
+class BalanceJournal():
+    """
+    Journal of account record lines waiting to be compacted into the accounts file.
+
+        Attributes:
+            journal_file : str
+                file the records are appended to
+            accounts_file : str
+                file the records are compacted into
+            ledger_file : str
+                transaction file that committed groups append to
+            checkpoint_threshold : int
+                number of appended records that triggers a checkpoint
+            lock : RLock
+                held by checkpoint() - anything else writing the accounts file holds it too
+            _pending : dict[int, str]
+                latest record line of every account changed since the last checkpoint
+
+        Methods:
+            append(account_id, line):
+                appends an account record to the journal
+            append_many(records):
+                appends several account records with one write
+            commit(records, ledger_lines):
+                durably journals account records and their transaction lines as one unit
+            records():
+                returns the latest pending record lines
+            refresh():
+                re-reads records other processes have journaled
+            checkpoint():
+                folds pending records into the accounts file and clears the journal
+            start_checkpointer(interval):
+                checkpoints in a background thread every interval seconds
+            stop_checkpointer():
+                stops the background checkpoint thread
+    """
+
+    def __init__(self, journal_file: str, accounts_file: str, ledger_file: str = None,
+                 checkpoint_threshold: int = CHECKPOINT_THRESHOLD):
+        self.journal_file = journal_file
+        self.accounts_file = accounts_file
+        self.ledger_file = ledger_file
+        self.checkpoint_threshold = checkpoint_threshold
+        self._pending = {}
+        self._appended = 0
+        self._lock = threading.RLock()
+        self._timer = None
+        # journal file handle - kept open between appends
+        self._file = None
+        # picks up records left behind by a session that never checkpointed
+        self.replay()
+
+    @property
+    def lock(self) -> (threading.RLock):
+        """Returns the lock the accounts file is rewritten under"""
+        return self._lock
+
+    def replay(self):
+        """
+        Reads any existing journal file back into the pending records. Groups
+        without a COMMIT are dropped, and the transaction lines of the last
+        committed group are re-appended if the transaction file stops short of them.
+        """
+        try:
+            with open(self.journal_file, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            # nothing journaled yet
+            return
+        pending, appended, valid, last_group = self._parse(data)
+        self._pending.update(pending)
+        self._appended += appended
+        # cuts an uncommitted group off so later appends don't join it
+        if valid < data.__len__():
+            with open(self.journal_file, "r+b") as file:
+                file.truncate(valid)
+        if last_group is not None and last_group[2] and self.ledger_file is not None:
+            self.redo_ledger(last_group[0], "".join(last_group[2]))
+
+    def refresh(self):
+        """
+        Re-reads the journal file so records other processes committed are seen.
+        Unlike replay nothing is truncated or redone - another process may be part
+        way through writing a group.
+        """
+        with self._lock:
+            try:
+                with open(self.journal_file, "rb") as file:
+                    data = file.read()
+                    inode = os.fstat(file.fileno()).st_ino
+            except FileNotFoundError:
+                data = b""
+                inode = None
+            self._pending, self._appended = self._parse(data)[:2]
+            # another process checkpointed the journal away - appends go to the new file
+            if self._file is not None and os.fstat(self._file.fileno()).st_ino != inode:
+                self._file.close()
+                self._file = None
+
+    def _parse(self, data: bytes) -> (tuple):
+        """
+        Reads the committed records out of journal file contents
+
+            Args:
+                data (bytes): the journal file
+
+            Returns:
+                tuple: (account id -> latest record, records counted, bytes that are complete,
+                        (offset, records, ledger lines) of the last committed group or None)
+        """
+        pending = {}
+        appended = 0
+        # bytes of the journal that are complete
+        valid = 0
+        position = 0
+        group = None
+        last_group = None
+        for raw in data.splitlines(keepends=True):
+            position += raw.__len__()
+            line = raw.decode(errors="replace")
+            # a torn last line (eg. a crash mid append)
+            if not line.endswith("\n"):
+                break
+            if line.startswith(BEGIN):
+                # a BEGIN inside a group means the earlier group never committed
+                group = (int(line[BEGIN.__len__():].strip() or 0), {}, [])
+            elif group is not None and line.startswith(LEDGER):
+                group[2].append(line[LEDGER.__len__():])
+            elif group is not None and line.startswith(COMMIT):
+                pending.update(group[1])
+                appended += group[1].__len__()
+                last_group = group
+                group = None
+                valid = position
+            else:
+                account_id = record_id(line)
+                if account_id is None:
+                    continue
+                if group is not None:
+                    group[1][account_id] = line
+                else:
+                    pending[account_id] = line
+                    appended += 1
+                    valid = position
+        return pending, appended, valid, last_group
+
+    def redo_ledger(self, offset: int, ledger_lines: str):
+        """
+        Makes sure the transaction lines of a committed group are in the transaction
+        file. The file from offset on is read and only the group's lines missing
+        from it are appended - other processes may have written after the offset,
+        so nothing already there is ever cut off.
+
+            Args:
+                offset (int): size of the transaction file before the group's lines
+                ledger_lines (str): the group's transaction lines
+        """
+        try:
+            with open(self.ledger_file, "rb") as myfile:
+                myfile.seek(offset)
+                tail = myfile.read()
+        except FileNotFoundError:
+            tail = b""
+        # whole lines written since the group began - a torn last line doesn't count
+        written = set(tail.split(b"\n")[:-1])
+        missing = [line for line in ledger_lines.encode().split(b"\n")[:-1] if line not in written]
+        if not missing:
+            # the lines made it to disk
+            return
+        # the crash came between the journal sync and the transaction file write
+        with open(self.ledger_file, "ab") as myfile:
+            # a torn line is closed off so the redone lines start on their own
+            if tail != b"" and not tail.endswith(b"\n"):
+                myfile.write(b"\n")
+            myfile.write(b"".join(line + b"\n" for line in missing))
+            myfile.flush()
+            os.fsync(myfile.fileno())
+
+    def _handle(self):
+        """Returns the open journal file, opening it on first use"""
+        if self._file is None:
+            self._file = open(self.journal_file, "a")
+        return self._file
+
+    def append(self, account_id: int, line: str):
+        """
+        Appends an account record to the journal
+
+            Args:
+                account_id (int): id of the account the record belongs to
+                line (str): the full account record line (newline terminated)
+        """
+        self.append_many({account_id: line})
+
+    def append_many(self, records: dict):
+        """
+        Appends several account records to the journal with a single write
+
+            Args:
+                records (dict[int, str]): account id -> full account record line
+        """
+        with self._lock:
+            myfile = self._handle()
+            myfile.write("".join(records.values()))
+            myfile.flush()
+            self._pending.update(records)
+            self._appended += records.__len__()
+            # keeps the journal from growing without bound
+            if self._appended >= self.checkpoint_threshold:
+                self.checkpoint()
+
+    def commit(self, records: dict, ledger_lines: str):
+        """
+        Journals account records and the transaction lines they belong to as one
+        atomic unit - a single write and fsync - then appends the lines to the
+        transaction file
+
+            Args:
+                records (dict[int, str]): account id -> full account record line
+                ledger_lines (str): newline terminated transaction lines
+        """
+        with self._lock:
+            try:
+                offset = os.path.getsize(self.ledger_file)
+            except FileNotFoundError:
+                offset = 0
+            group = [f"{BEGIN} {offset}\n"]
+            group += records.values()
+            group += [f"{LEDGER}{line}\n" for line in ledger_lines.splitlines()]
+            group.append(f"{COMMIT}\n")
+            myfile = self._handle()
+            myfile.write("".join(group))
+            myfile.flush()
+            # the commit point - everything after can be redone from the journal
+            os.fsync(myfile.fileno())
+            with open(self.ledger_file, "a") as ledger:
+                ledger.write(ledger_lines)
+            self._pending.update(records)
+            self._appended += records.__len__()
+            if self._appended >= self.checkpoint_threshold:
+                self.checkpoint()
+
+    def records(self) -> (list):
+        """
+        Returns the latest journaled record lines
+
+            Returns:
+                list[str]: one record line per changed account
+        """
+        with self._lock:
+            return list(self._pending.values())
+
+    def discard(self, account_id: int):
+        """
+        Drops an account from the journal - used before the account is removed
+
+            Args:
+                account_id (int): id of the account to drop
+        """
+        with self._lock:
+            if account_id in self._pending:
+                # folds everything else in first so the journal can't resurrect it
+                self._pending.pop(account_id)
+                self.checkpoint(force=True)
+
+    def checkpoint(self, force: bool = False):
+        """
+        Compacts pending records into the accounts file and clears the journal
+
+            Args:
+                force (bool): rewrites the accounts file even with nothing pending
+        """
+        with self._lock:
+            if not self._pending and not force:
+                return
+            try:
+                with open(self.accounts_file, "r") as file:
+                    account_lines = file.readlines()
+            except FileNotFoundError:
+                account_lines = []
+            remaining = dict(self._pending)
+            # swaps changed records in place - keeps comments and ordering intact
+            for i in range(0, account_lines.__len__()):
+                account_id = record_id(account_lines[i])
+                if account_id in remaining:
+                    account_lines[i] = remaining.pop(account_id)
+            # records with no line in the accounts file yet go on the end
+            for line in remaining.values():
+                account_lines.append(line)
+            # the journal is the only synced copy of committed transaction lines - they
+            # have to be on disk before it goes
+            sync_file(self.ledger_file)
+            # writes to a temporary file first so a crash never leaves half a file
+            tmp_file = f"{self.accounts_file}.tmp"
+            with open(tmp_file, "w") as myfile:
+                myfile.write("".join(account_lines))
+                myfile.flush()
+                os.fsync(myfile.fileno())
+            os.replace(tmp_file, self.accounts_file)
+            # the rename itself is only durable once the directory is synced
+            sync_directory(self.accounts_file)
+            # journal has been folded in - clear it
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+            self._pending.clear()
+            self._appended = 0
+
+    def start_checkpointer(self, interval: float = 30.0):
+        """
+        Checkpoints in a background thread every interval seconds
+
+            Args:
+                interval (float): seconds between checkpoints
+        """
+        def run():
+            self.checkpoint()
+            self.start_checkpointer(interval)
+        self.stop_checkpointer()
+        self._timer = threading.Timer(interval, run)
+        # background checkpoints should never keep the program alive
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop_checkpointer(self):
+        """Stops the background checkpoint thread"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+def sync_file(filename: str):
+    """fsyncs a file that may have been written through other handles - nothing happens if there is no file"""
+    if filename is None:
+        return
+    try:
+        fd = os.open(filename, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sync_directory(filename: str):
+    """fsyncs the directory holding a file, so a rename or removal in it survives a crash"""
+    # windows can't open directories - its renames are not synced this way
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def record_id(line: str):
+    """
+    Returns the leading id of an account record line
+
+        Args:
+            line (str): record line
+
+        Returns:
+            int: id of the record
+                 None if the line is a comment, blank or malformed
+    """
+    head = line.split(",", maxsplit=1)[0].strip()
+    if head.isnumeric():
+        return int(head)
+    return None
@@ -0,0 +1,197 @@
+"""
+    Buffered, group-committing writer for the transaction file. The file is kept
+    open and appends from every caller are gathered into groups that are written
+    together and fsynced once - so concurrent appends share the cost of one sync.
+
+    A caller waiting on its append becomes the group's leader if nobody is writing:
+    it waits up to the window for others to join (or until max_batch are queued),
+    writes the whole group and wakes everyone whose append it carried. Appends that
+    don't wait are committed by a background thread on the same window.
+"""
+import collections
+import os
+import threading
+import time
+
+# fsync every group - without it a group is only handed to the OS
+FSYNC = True
+# seconds a leader waits for more appends before writing its group
+WINDOW = 0.0
+# queued appends that end the window early
+MAX_BATCH = 512
+# commit latencies kept for stats()
+LATENCY_SAMPLES = 10000
+
+
+class LedgerWriter():
+    """
+    Group-committing appender for the transaction file.
+
+        Attributes:
+            filename : str
+                the transaction file
+            fsync : bool
+                whether each group is fsynced
+            window : float
+                seconds a group waits for more appends after its leader arrives
+            max_batch : int
+                queued appends that write the group without waiting out the window
+            commits : int
+                groups written so far
+            appended : int
+                appends written so far
+
+        Methods:
+            append(text, wait):
+                queues text for the file, waiting for it to be committed by default
+            flush():
+                writes anything queued and returns once it is committed
+            stats():
+                commit counts and latencies achieved so far
+            close():
+                flushes and stops the background thread
+    """
+
+    def __init__(self, filename: str, fsync: bool = FSYNC, window: float = WINDOW,
+                 max_batch: int = MAX_BATCH):
+        self.filename = filename
+        self.fsync = fsync
+        self.window = window
+        self.max_batch = max_batch
+        self.commits = 0
+        self.appended = 0
+        self._file = open(filename, "a")
+        self._cond = threading.Condition()
+        # (text, time queued) of every append waiting for the next group
+        self._pending = []
+        # tickets - every append gets the next number, groups commit up to one
+        self._submitted = 0
+        self._committed = 0
+        # whether a leader is gathering or writing a group
+        self._leading = False
+        self._closed = False
+        self._error = None
+        self._latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._thread = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, text: str, wait: bool = True) -> (int):
+        """
+        Queues text for the transaction file
+
+            Args:
+                text (str): newline terminated transaction line/s
+                wait (bool): returns only once the text is committed
+
+            Returns:
+                int: ticket of the append - committed once flush() returns
+        """
+        with self._cond:
+            if self._closed:
+                raise ValueError("ledger writer is closed")
+            self._pending.append((text, time.perf_counter()))
+            self._submitted += 1
+            ticket = self._submitted
+            # wakes a leader waiting out its window, or the background thread for
+            # an append nobody waits on - a waiting caller with no leader leads itself
+            if self._leading or not wait:
+                self._cond.notify_all()
+            if wait:
+                self._wait_for(ticket, self.window)
+        return ticket
+
+    def flush(self):
+        """Writes anything queued straight away and returns once it is committed"""
+        with self._cond:
+            self._wait_for(self._submitted, 0)
+
+    def _wait_for(self, ticket: int, window: float):
+        """Blocks until a ticket is committed, leading groups while nobody else is - holds self._cond"""
+        while self._committed < ticket and self._error is None:
+            if self._leading:
+                self._cond.wait()
+            else:
+                self._lead(window)
+        if self._error is not None:
+            raise self._error
+
+    def _lead(self, window: float):
+        """Gathers and writes one group - called holding self._cond with no other leader"""
+        self._leading = True
+        if window > 0 and self._pending:
+            # lets other callers join the group until the window closes or it fills
+            deadline = self._pending[0][1] + window
+            while self._pending.__len__() < self.max_batch and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        group = self._pending
+        self._pending = []
+        ticket = self._submitted
+        error = None
+        # written outside the lock so callers keep queueing the next group
+        self._cond.release()
+        try:
+            if group:
+                self._file.write("".join([text for text, queued in group]))
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+        except OSError as e:
+            error = e
+        finally:
+            self._cond.acquire()
+        now = time.perf_counter()
+        self._leading = False
+        if error is not None:
+            self._error = error
+        else:
+            self._committed = ticket
+            if group:
+                self.commits += 1
+                self.appended += group.__len__()
+                self._latencies.extend([now - queued for text, queued in group])
+        self._cond.notify_all()
+
+    def _run(self):
+        """Background thread - commits appends nobody is waiting on"""
+        with self._cond:
+            while self._error is None:
+                if self._pending and not self._leading:
+                    self._lead(self.window)
+                elif self._closed and not self._pending:
+                    return
+                else:
+                    self._cond.wait()
+
+    def stats(self) -> (dict):
+        """
+        Returns the group commit figures achieved so far
+
+            Returns:
+                dict: appends, commits, mean batch, and mean / p99 commit latency in seconds
+                      (latencies cover the last LATENCY_SAMPLES appends)
+        """
+        with self._cond:
+            latencies = sorted(self._latencies)
+            commits = self.commits
+            appended = self.appended
+        if not latencies:
+            return {"appends": appended, "commits": commits, "mean batch": 0.0,
+                    "mean latency": 0.0, "p99 latency": 0.0}
+        return {"appends": appended,
+                "commits": commits,
+                "mean batch": appended / commits,
+                "mean latency": sum(latencies) / latencies.__len__(),
+                "p99 latency": latencies[latencies.__len__() * 99 // 100]}
+
+    def close(self):
+        """Flushes anything queued, stops the background thread and closes the file"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._file.close()
@@ -0,0 +1,150 @@
+"""
+    Savings withdrawal limits kept as state instead of recomputed date math.
+
+    A savings account is limited from a withdrawal until midnight reset_time days
+    after it. That unlock time is worked out once, when the last transfer is set,
+    and the account goes on a min-heap ordered by it. advance() pops every account
+    whose unlock time has passed and clears its limit_reached in one go - until the
+    next unlock is due it is a single comparison, so callers run it before reading
+    limits and every read is just the limit_reached attribute.
+
+    The heap holds weak references, so a throwaway copy of an account (a reload,
+    an import, a snapshot) doesn't outlive its parse. An account that withdraws
+    again gets a new entry and the old one is ignored when it comes up; entries
+    made stale either way are counted and the heap is rebuilt without them once
+    they outnumber the live ones, so repeated reloads don't grow it.
+"""
+import datetime
+import heapq
+import itertools
+import math
+import threading
+import time
+import weakref
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
+def unlock_time(day: datetime.date, reset_days: int) -> (float):
+    """
+    Returns when a limit started on a day runs out
+
+        Args:
+            day (date): day of the last transfer
+            reset_days (int): days the limit lasts
+
+        Returns:
+            float: local midnight reset_days after the day, as a time.time() value
+    """
+    return datetime.datetime.combine(day + datetime.timedelta(days=reset_days), datetime.time.min).timestamp()
+
+
+class LimitScheduler():
+    """
+    Min-heap of savings accounts waiting for their limit to run out.
+
+        Attributes:
+            next_unlock : float
+                time.time() of the earliest pending unlock - inf if there is none
+            flipped : int
+                limits cleared by advance() so far
+            _heap : list[tuple]
+                (unlock time, sequence, weak reference to the account) - the sequence keeps references from being compared
+            _stale : int
+                heap entries whose account was collected or rescheduled since they were pushed
+
+        Methods:
+            schedule(account):
+                sets an account's limit from its last transfer and queues its unlock
+            advance(now):
+                clears the limit of every account whose unlock time has passed
+            pending():
+                number of accounts waiting for an unlock
+    """
+
+    def __init__(self):
+        self.next_unlock = math.inf
+        self.flipped = 0
+        self._heap = []
+        self._stale = 0
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _collected(self, ref):
+        # runs wherever the account is freed, possibly with the lock held - no locking here
+        self._stale += 1
+
+    def _compact(self):
+        """Rebuilds the heap without stale entries - called with the lock held"""
+        self._stale = 0
+        live = []
+        for unlock, sequence, ref in self._heap:
+            account = ref()
+            if account is not None and account._unlock_at == unlock:
+                live.append((unlock, sequence, ref))
+        heapq.heapify(live)
+        self._heap = live
+
+    def schedule(self, account):
+        """
+        Sets an account's limit_reached from its last transfer and queues its unlock
+
+            Args:
+                account (SavingAccount): the account - its _last_transfer is already set
+        """
+        unlock = unlock_time(account._last_transfer.date(), account.reset_time)
+        now = time.time()
+        with self._lock:
+            queued = getattr(account, "_unlock_at", 0.0)
+            if queued == unlock and unlock > now:
+                # the entry already queued stays right
+                account.limit_reached = True
+                return
+            # an unlock still in the future is still queued - that entry is stale now
+            if queued > now:
+                self._stale += 1
+            account._unlock_at = unlock
+            if unlock <= now:
+                account.limit_reached = False
+                return
+            account.limit_reached = True
+            heapq.heappush(self._heap, (unlock, next(self._sequence), weakref.ref(account, self._collected)))
+            if self._stale > self._heap.__len__() // 2:
+                self._compact()
+            self.next_unlock = self._heap[0][0]
+
+    def advance(self, now: float = None) -> (int):
+        """
+        Clears the limit of every account whose unlock time has passed
+
+            Args:
+                now (float): time.time() to advance to - the current time if None
+
+            Returns:
+                int: number of limits cleared
+        """
+        now = time.time() if now is None else now
+        # nothing due - the common case costs one comparison
+        if now < self.next_unlock:
+            return 0
+        flipped = 0
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                unlock, sequence, ref = heapq.heappop(heap)
+                account = ref()
+                # a later withdrawal moved the unlock - that entry is still queued
+                if account is not None and account._unlock_at == unlock:
+                    account.limit_reached = False
+                    flipped += 1
+                else:
+                    self._stale = max(self._stale - 1, 0)
+            self.next_unlock = heap[0][0] if heap else math.inf
+            self.flipped += flipped
+        return flipped
+
+    def pending(self) -> (int):
+        """Returns the number of accounts waiting for an unlock"""
+        with self._lock:
+            self._compact()
+            return self._heap.__len__()
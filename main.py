@@ -2,12 +2,22 @@
 Main bank module. Creates menus, and imports all classes.
 """
 from datetime import datetime
-import copy
+import heapq
+import itertools
 import sys
 import os
 import re
 
+import account_store
 import bank as b
+import batch
+import follow
+import ids
+import mapped_ledger
+import snapshot
+import storage
+import timestamps
+import unit_of_work
 import user_interaction as ui
 
 
@@ -17,6 +27,12 @@ CUSTOMER_FILE = "customers.txt"
 ACCOUNTS_FILE = "accounts.txt"
 TRANSACTION_FILE = "accountsTransactions.txt"
 NON_DESTRUCT = False
+ACCOUNT_STORE_FILE = None
+STORAGE_FILE = None
+LOAD_WORKERS = 1
+FOLLOW = None
+SNAPSHOT_FILE = None
+UNIT_OF_WORK_INTERVAL = None
 # allows for non-destructive debugging and alternative file names
 if sys.argv.__len__() > 1:
     # loops through arguments attached
@@ -77,6 +93,42 @@ if sys.argv.__len__() > 1:
                     else:
                         print("File name safe to create.")
                         TRANSACTION_FILE = FILE_INFO[1]
+            # fixed-width account store - replaces ACCOUNTS_FILE
+            elif FILE_INFO[0] == "ACCOUNT_STORE":
+                if os.path.isfile(FILE_INFO[1]) or pattern.match(FILE_INFO[1]):
+                    ACCOUNT_STORE_FILE = FILE_INFO[1]
+                else:
+                    print("File name not safe to create. Ignoring account store.")
+            # parses large data files in this many processes
+            elif FILE_INFO[0] == "LOAD_WORKERS":
+                if FILE_INFO[1].isnumeric() and int(FILE_INFO[1]) > 0:
+                    LOAD_WORKERS = int(FILE_INFO[1])
+                else:
+                    print("LOAD_WORKERS must be a whole number above 0. Loading serially.")
+            # customer and account changes are written together - on logout and every this many seconds
+            elif FILE_INFO[0] == "UNIT_OF_WORK":
+                try:
+                    UNIT_OF_WORK_INTERVAL = float(FILE_INFO[1])
+                except ValueError:
+                    print("UNIT_OF_WORK must be a number of seconds. Writing changes straight away.")
+            # binary snapshot loaded on start and saved on exit
+            elif FILE_INFO[0] == "SNAPSHOT":
+                if os.path.isfile(FILE_INFO[1]) or pattern.match(FILE_INFO[1]):
+                    SNAPSHOT_FILE = FILE_INFO[1]
+                else:
+                    print("File name not safe to create. Not using a snapshot.")
+            # picks up other processes' changes every this many seconds
+            elif FILE_INFO[0] == "FOLLOW":
+                try:
+                    FOLLOW = float(FILE_INFO[1])
+                except ValueError:
+                    print("FOLLOW must be a number of seconds. Not following other processes.")
+            # SQLite storage backend - replaces all three files
+            elif FILE_INFO[0] == "STORAGE":
+                if os.path.isfile(FILE_INFO[1]) or pattern.match(FILE_INFO[1]):
+                    STORAGE_FILE = FILE_INFO[1]
+                else:
+                    print("File name not safe to create. Ignoring storage.")
             else:
                 # entered argument was not found
                 print(f"{FILE_INFO[0]} argument not recognized..")
@@ -88,11 +140,29 @@ if sys.argv.__len__() > 1:
             ACCOUNTS_FILE = "accounts_tmp.txt"
         if TRANSACTION_FILE == "accountsTransactions.txt":
             TRANSACTION_FILE = "accountsTransactions_tmp.txt"
+    if ACCOUNT_STORE_FILE is not None:
+        # first run with a store - converts the current accounts file into it
+        if not os.path.isfile(ACCOUNT_STORE_FILE):
+            print(f"Converting {ACCOUNTS_FILE} into account store {ACCOUNT_STORE_FILE}.")
+            account_store.convert(ACCOUNTS_FILE, ACCOUNT_STORE_FILE)
+        # store records keep the accounts file layout so they load the same way
+        ACCOUNTS_FILE = ACCOUNT_STORE_FILE
+    if STORAGE_FILE is not None and not os.path.isfile(STORAGE_FILE):
+        # first run with a database - migrates the current text files into it
+        print(f"Migrating data files into {STORAGE_FILE}.")
+        storage.migrate(STORAGE_FILE, CUSTOMER_FILE, ACCOUNTS_FILE, TRANSACTION_FILE)
 # updates bank modules constants
 b.CUSTOMER_FILE = CUSTOMER_FILE
 b.ACCOUNTS_FILE = ACCOUNTS_FILE
 b.TRANSACTION_FILE = TRANSACTION_FILE
 b.NON_DESTRUCT = NON_DESTRUCT
+b.LOAD_WORKERS = LOAD_WORKERS
+if ACCOUNT_STORE_FILE is not None:
+    b.ACCOUNT_STORE = account_store.AccountStore(ACCOUNTS_FILE)
+if STORAGE_FILE is not None:
+    b.STORAGE = storage.SqliteStorage(STORAGE_FILE)
+if UNIT_OF_WORK_INTERVAL is not None:
+    b.UNIT_OF_WORK = unit_of_work.UnitOfWork()
 
 
 class Menu():
@@ -105,12 +175,16 @@ class Menu():
                 contains a dictionary of Accounts
             _transactions : dict[Transaction]
                 contains a dictionary of Transactions
-            current_cust_id : int
-                current highest customer id
-            current_acc_id : int
-                current highest account id
-            current_trans_id : int
-                current highest transaction id
+            _transactions_loaded : bool
+                whether the ledger has been paged in yet
+            _transaction_offset : int
+                byte offset the transaction file has been read up to
+            _history : tuple
+                (customer id, account ids, offset read up to, transactions) of the last history read from disk
+            _snapshot : Snapshot
+                binary snapshot the data files are loaded from when unchanged - None if not used
+            follower : Follower
+                picks up other processes' changes - None unless FOLLOW is set
             _current_user : Customer
                 used to record currently logged in Customer
             _current_account : Account
@@ -131,40 +205,49 @@ class Menu():
     _accounts: dict[b.Account] = {}
     _transactions: dict[b.Transaction] = {}
 
-    #
-    current_cust_id: int
-    current_acc_id: int
-    current_trans_id: int
-
     _current_user: b.Customer
     _current_account: b.Account
 
     def __init__(self):
         # sets user to none
         self._current_user = None
+        # unchanged parts of the data files are loaded from here instead of the text
+        self._snapshot = None
+        if SNAPSHOT_FILE is not None and b.STORAGE is None:
+            self._snapshot = snapshot.load(SNAPSHOT_FILE)
         # loads customers and accounts from file into object
         self.load_customers()
         self.load_accounts()
-        self.load_transactions()
-        # sets the current id to the highest id on the list
-        try:
-            self.current_cust_id = int(
-                self._customers[list(self._customers)[-1]].id)
-        # if some errors occur - set to zero
-        except:
-            self.current_cust_id = 0
-        try:
-            self.current_acc_id = int(
-                self._accounts[list(self._accounts)[-1]].id)
-        # if some errors occur - set to zero
-        except:
-            self.current_acc_id = 0
-        try:
-            self.current_trans_id = int(
-                self._transactions[list(self._transactions)[-1]].id)
-        # if some errors occur - set to zero
-        except:
-            self.current_trans_id = 0
+        # the ledger is only paged in when a history view needs it
+        self._transactions_loaded = False
+        # byte offset of the transaction file read so far
+        self._transaction_offset = 0
+        # the current user's transactions, read straight from the ledger
+        self._history = None
+        # keeps this menu in step with other processes when FOLLOW is set
+        self.follower = None
+        # new ids come from the allocator - it has to know what's already on file
+        self.seed_ids()
+
+    def seed_ids(self):
+        """Makes sure the id allocator never hands out an id the data files already hold"""
+        allocator = b.id_allocator()
+        # the highest id, not the last one - the files are in no particular order
+        allocator.observe("customers", max(self._customers, default=None))
+        allocator.observe("accounts", max(self._accounts, default=None))
+        if "transactions" in allocator.marks() or b.STORAGE is not None:
+            # anything written past the mark without the allocator was appended at the end
+            allocator.observe("transactions", b.last_transaction_id(TRANSACTION_FILE))
+        else:
+            # first run with the allocator - the ledger is scanned once for its highest id
+            highest, duplicates = ids.scan_transaction_ids(TRANSACTION_FILE)
+            allocator.observe("transactions", highest)
+            if duplicates:
+                # older files reused ids - the later lines get fresh ones, under the id file lock
+                renumbered = ids.renumber_duplicates(TRANSACTION_FILE, allocator)
+                print(f"Gave {renumbered} transaction/s that shared an id a new id.")
+            # writes the mark so this only ever happens once
+            allocator.reserve("transactions", 0)
 
     def load_customers(self, customer_file: str = b.CUSTOMER_FILE):
         """
@@ -176,50 +259,21 @@ class Menu():
         Customer File Structure
             [0]Customer Id, [1]Customer Name, [2]Customer Age, [3]Customer Password, [4]Account IDs
         """
-        # loads customers file from file handler
-        customers_file_list = b.file_handler(customer_file)
-        # checks if handler succeeded
-        if customers_file_list != None:
-            # loops lines of customer file
-            for customer in customers_file_list:
-                # makes sure line being read is valid before loading
-                if b.file_line_validator(b.Customer, customer):
-                    # strips \n from file
-                    customer = customer.rstrip("\n")
-                    # splits file by commass
-                    row = customer.split(",")
-                    # list of account ids owned by customer
-                    id_list = []
-                    # removes whitespace
-                    row[4] = row[4].strip()
-                    # removes the []s from account id list
-                    row[4] = row[4].lstrip("[")
-                    row[4] = row[4].rstrip("]")
-                    # checks if no accounts found
-                    if row[4] == "":
-                        # leave list empty
-                        pass
-                    else:
-                        # split by - s of file
-                        id_list = row[4].split("-")
-                        # casts all ids in final list to int - then converts to a list
-                        # as maps when iterated seem to empty themselves
-                        id_list = list(map(int, id_list))
-                    # adds customer to customer dict of file
-                    try:
-                        self._customers[int(row[0].strip())] = b.Customer(int(row[0].strip()),
-                                                                          row[1].strip(
-                        ),
-                            int(row[2].strip(
-                            )),
-                            row[3].strip(
-                        ),
-                            id_list)
-                    except Exception as e:
-                        # Problem when found from loading in file
-                        e
-                else:
-                    continue
+        if self._snapshot is not None and self._snapshot.unchanged("customers", customer_file):
+            customers = self._snapshot.customers
+        else:
+            # parses each line straight into a Customer - invalid lines are skipped
+            customers = b.iter_customers(customer_file)
+        for customer in customers:
+            # a reloaded customer replaces its old entries in the reverse index
+            if customer.id in self._customers:
+                self._customers[customer.id].unregister_accounts()
+            # adds customer to customer dict of file
+            self._customers[customer.id] = customer
+            # indexes which customer owns each account
+            customer.register_accounts()
+        # the name search is sorted on its first use
+        b.Customer.names.attach(self._customers)
 
     def load_accounts(self, account_file=ACCOUNTS_FILE, level=0):
         """Loads customers from files
@@ -236,7 +290,6 @@ class Menu():
         [1] = 0 - savings account
         [1] = 1 - checking account
         """
-        accounts_file_list = b.file_handler(account_file)
         # checks if the customers list is empty
         if not bool(self._customers) and level < 2:
             # indicate we have no customers
@@ -250,36 +303,16 @@ class Menu():
             # no customers found - no point loading accounts - exits recursive part
             pass
         else:
-            # accounts file list file handler
-            if accounts_file_list != None:
-                # loops through account
-                for account in accounts_file_list:
-                    # checks if the line looks valid
-                    if b.file_line_validator(b.Account, account):
-                        # removes newline tag from line
-                        account = account.rstrip("\n")
-
-                        # splits variables by ,s
-                        row = account.split(",")
-
-                        # removes whitespace characters
-                        acc_id = int(row[0].strip())
-                        acc_type = int(row[1].strip())
-                        acc_balance = float(row[2].strip())
-                        if acc_type == 0:
-                            # creates a savings account object and puts it
-                            # into our account dictionary
-                            self._accounts[acc_id] = b.SavingAccount(
-                                acc_id, acc_balance, last_transfer=str(row[4].strip()))
-                        elif acc_type == 1:
-                            # creates a checking account objet and puts it
-                            # into our account dictionary
-                            self._accounts[acc_id] = b.CheckingAccount(acc_id,
-                                                                       acc_balance,
-                                                                       int(row[3].strip()))
-                    else:
-                        # skips this
-                        continue
+            if self._snapshot is not None and self._snapshot.unchanged("accounts", account_file):
+                # the journal is newer than any snapshot
+                accounts = itertools.chain(self._snapshot.accounts, b.iter_journaled_accounts())
+            else:
+                # parses each line straight into an account - invalid lines are skipped
+                # journaled records come last so they override stale file lines
+                accounts = b.iter_accounts(account_file)
+            for account in accounts:
+                # creates the account object and puts it into our account dictionary
+                self._accounts[account.id] = account
 
     def load_transactions(self, transaction_file=TRANSACTION_FILE):
         """Loads transactions from files
@@ -289,33 +322,97 @@ class Menu():
         Transaction File Structure
         [0]Transaction ID, [1]Transaction Type, [2]Account ID, [3]Amount, [4]Receiving Account
         """
-        # loads transaction file
-        transaction_file_list = b.file_handler(transaction_file)
-        # checks if transaction file exists
-        if transaction_file_list != None:
-            # loops through transaction
-            for transaction in transaction_file_list:
-                # makes sure line is valid Transaction line
-                if b.file_line_validator(b.Transaction, transaction):
-                    # removes \n from line
-                    transaction = transaction.rstrip("\n")
-                    # splits transaction into items
-                    row = transaction.split(",")
-                    # removes whitespace and casts to int
-                    trans_id = int(row[0].strip())
-                    trans_type = int(row[1].strip())
-                    trans_acc = int(row[2].strip())
-                    time_stamp = str(row[5].strip())
-                    # casts amount to float
-                    trans_amount = float(row[3].strip())
-                    trans_rec_acc = int(row[4].strip())
-                    # adds new transaction to list
-                    self._transactions[trans_id] = b.Transaction(trans_id,
-                                                                 trans_type,
-                                                                 trans_acc,
-                                                                 trans_amount,
-                                                                 trans_rec_acc,
-                                                                 time_stamp)
+        # indexes are rebuilt from scratch alongside the transactions
+        b.Transaction.clear_indexes()
+        self._transactions.clear()
+        # only whole lines are read - a follower picks up from this offset
+        b.flush_ledger()
+        self._transaction_offset = mapped_ledger.line_end(transaction_file)
+        if self._snapshot is not None and self._snapshot.ledger_usable(transaction_file):
+            # only the lines written after the snapshot are parsed
+            transactions = self._snapshot.iter_transactions(transaction_file, self._transaction_offset)
+        else:
+            # streams the file rather than reading every line into a list first
+            transactions = b.iter_transactions(transaction_file, self._transaction_offset)
+        duplicates = 0
+        for transaction in transactions:
+            if transaction.id in self._transactions:
+                duplicates += 1
+            # adds new transaction to list
+            self._transactions[transaction.id] = transaction
+            # indexes it by account and receiving account
+            b.Transaction.index(transaction)
+        self._transactions_loaded = True
+        if duplicates:
+            # only the last line of each shared id is kept - the migration gives the others their own
+            print(f"WARNING: {duplicates} transaction/s in {transaction_file} share an id with an earlier one "
+                  f"and are hidden. Run \"python ids.py renumber {transaction_file}\" with no other tellers open.")
+
+    def ensure_transactions(self):
+        """Pages the ledger in the first time something needs it"""
+        if not self._transactions_loaded:
+            self.load_transactions()
+
+    def user_history(self) -> (list):
+        """ reads the current user's transactions out of the ledger without loading the rest of it
+
+        Returns:
+            list[Transaction] : every transaction from or to one of the user's accounts, in file order
+        """
+        account_ids = tuple(self._current_user.account_ids)
+        key = (self._current_user.id, account_ids)
+        wanted = set(account_ids)
+        # lines still queued by the writer have to be on disk to be read
+        b.flush_ledger()
+        end = mapped_ledger.line_end(TRANSACTION_FILE)
+        if self._history is not None and self._history[0] == key and self._history[1] <= end:
+            # only the lines added since the last read are scanned
+            start, found = self._history[1], self._history[2]
+        else:
+            start, found = 0, []
+        for row in mapped_ledger.rows(TRANSACTION_FILE, start, end):
+            # [2] account id, [4] receiving account
+            if row[2] in wanted or row[4] in wanted:
+                found.append(b.Transaction.from_minutes(*row))
+        self._history = (key, end, found)
+        return found
+
+    def iter_history(self, transaction_type: int, received: bool = False):
+        """ streams the current user's transactions of one type in time order
+
+        Args:
+            transaction_type (int) : 0 - deposit, 1 - withdraw, 2 - transfer
+            received (bool) : transfers into the user's accounts from other customers
+
+        Yields:
+            Transaction : each matching transaction, oldest first
+        """
+        if self._transactions_loaded or b.STORAGE is not None:
+            transactions = self.indexed_history(transaction_type, received)
+        else:
+            # a ledger nobody has paged in stays on disk - only this user's lines are kept
+            account_ids = set(self._current_user.account_ids)
+            transactions = sorted((transaction for transaction in self.user_history()
+                                   if transaction.transaction_type == transaction_type and
+                                   (transaction.rec_acc if received else transaction.acc_id) in account_ids),
+                                  key=lambda transaction: transaction._minutes)
+        for transaction in transactions:
+            # received money only counts if it came from someone else
+            if received and self.get_user_from_account(transaction.acc_id) == self._current_user:
+                continue
+            yield transaction
+
+    def indexed_history(self, transaction_type: int, received: bool = False):
+        """ streams the current user's transactions of one type in time order from the loaded ledger's indexes """
+        self.ensure_transactions()
+        per_account = []
+        for acc_id in self._current_user.account_ids:
+            if received:
+                per_account.append(b.Transaction.to_account(acc_id, transaction_type))
+            else:
+                per_account.append(b.Transaction.from_account(acc_id, transaction_type))
+        # each index list is already in file order - merge them lazily
+        return heapq.merge(*per_account, key=lambda transaction: transaction.timestamp)
 
     def get_user_from_account(self, account_id: int) -> (b.Customer):
         """ gets a user from their account id
@@ -328,17 +425,9 @@ class Menu():
                       None if not found
         """
         # checks if account actually exists
-        if account_id in list(self._accounts):
-            # loops through customers
-            for i in self._customers:
-                # loops through customers account ids
-                for j in self._customers[i].account_ids:
-                    # checks if the accounts match
-                    if account_id == j:
-                        # returns the customer
-                        return self._customers[i]
-            # no customer found
-            return None
+        if account_id in self._accounts:
+            # reverse index lookup - None if no customer found
+            return b.Customer.owner_of(account_id)
 
     def write_transaction(self, transaction_type: int, acc_id: int, amount: float,
                           rec_acc: int) -> (b.Transaction):
@@ -358,25 +447,29 @@ class Menu():
         """
         try:
             curr_time = datetime.now()
-            format_time = curr_time.strftime('%b %d %Y %I:%M%p')
+            format_time = timestamps.format(curr_time)
+            # a fresh id - never one the ledger already holds
+            trans_id = b.id_allocator().allocate("transactions")
             # creates transaction line
-            line = f"{self.current_trans_id}, {transaction_type}, {acc_id}, {amount}, {rec_acc}, {format_time}\n"
+            line = b.transaction_line(trans_id, transaction_type,
+                                      acc_id, amount, rec_acc, format_time)
             # checks if line is valid
             if b.file_line_validator(b.Transaction, line):
-                # appends line to file
-                with open(TRANSACTION_FILE, "a") as myfile:
-                    myfile.write(line)
                 # creates a new transaction
-                new_transaction = b.Transaction(self.current_trans_id,
+                new_transaction = b.Transaction(trans_id,
                                                 transaction_type,
                                                 acc_id,
                                                 amount,
                                                 rec_acc,
                                                 format_time)
-                # increments transaction
-                self.current_trans_id += 1
-                # adds new transaction to list
-                self._transactions[self.current_trans_id] = new_transaction
+                # appends it to the ledger
+                b.append_transactions([new_transaction])
+                # an unloaded ledger picks this line up from the file when paged in
+                if self._transactions_loaded:
+                    # adds new transaction to list
+                    self._transactions[trans_id] = new_transaction
+                    # keeps the account indexes current
+                    b.Transaction.index(new_transaction)
                 # returns transaction
                 return new_transaction
             else:
@@ -386,6 +479,25 @@ class Menu():
             # returns nothing
             return None
 
+    def transfer(self, amount: float, from_account: b.Account, to_account: b.Account) -> (bool):
+        """ moves money between accounts and records the transfer as one atomic commit
+
+        Args:
+            amount (float) : amount of money to send
+            from_account (Account) : account money taken from
+            to_account (Account) : account money going to
+
+        Returns:
+            bool : whether the transfer went through
+        """
+        try:
+            # both balances and the transaction line are committed together
+            batch.post_batch(self, [batch.Operation(
+                batch.TRANSFER, from_account.id, amount, to_account.id)])
+            return True
+        except batch.BatchRejected:
+            return False
+
     def write_customer(self, user_name: str, user_age: int, user_password: str) -> (b.Customer):
         """ writes a customer to file and adds object
 
@@ -398,18 +510,17 @@ class Menu():
             Customer : if customer creation was succful
         """
         try:
-            # increments customer id
-            self.current_cust_id += 1
-            # opens file and appends new customer
-            with open(CUSTOMER_FILE, "a") as myfile:
-                myfile.write(
-                    f"{self.current_cust_id}, {user_name}, {user_age}, {user_password}, []\n")
-                myfile.close()
+            # takes the next customer id
+            cust_id = b.id_allocator().allocate("customers")
             # makes a new Customer
             new_customer = b.Customer(
-                self.current_cust_id, user_name, user_age, user_password, [])
+                cust_id, user_name, user_age, user_password, [])
+            # appends new customer to file
+            b.add_customer(new_customer)
             # adds customer to file
-            self._customers[self.current_cust_id] = new_customer
+            self._customers[cust_id] = new_customer
+            # findable by name straight away
+            b.Customer.names.add(cust_id, new_customer.name)
             # returns new Customer
             return new_customer
         except:
@@ -589,30 +700,30 @@ class Menu():
                 print("User creation cancelled, returning to menu")
                 return None
 
-        self.current_acc_id += 1
-        # appends new account to file
-        with open(ACCOUNTS_FILE, "a") as myfile:
-            if account_type == 0:
-                new_account = b.SavingAccount(
-                    self.current_acc_id, 0, "Jan 1 2000 01:00AM")
-                myfile.write(
-                    f"{self.current_acc_id}, {account_type}, {0}, , Jan 1 2000 01:00AM\n")
-            elif account_type == 1:
-                new_account = b.CheckingAccount(self.current_acc_id, 0, 100)
-                myfile.write(
-                    f"{self.current_acc_id}, {account_type}, {0}, 100\n")
-            myfile.close()
-        self._accounts[self.current_acc_id] = new_account
+        acc_id = b.id_allocator().allocate("accounts")
+        if account_type == 0:
+            new_account = b.SavingAccount(
+                acc_id, 0, "Jan 1 2000 01:00AM")
+        elif account_type == 1:
+            new_account = b.CheckingAccount(acc_id, 0, 100)
+        # appends new account to file (or the account store / storage backend)
+        b.add_account(new_account)
+        self._accounts[acc_id] = new_account
+        # attaches the account and records the owner in the reverse index
         self._current_user.add_account(new_account)
         return new_account
 
     def remove_account(self, deleted_account: b.Account):
         b.remove_item(ACCOUNTS_FILE, deleted_account.id)
         self._accounts.pop(deleted_account.id)
+        # detaches the account and drops it from the reverse index
         self._current_user.remove_account(deleted_account.id)
 
     def remove_user(self, deleted_customer: b.Customer):
         b.remove_item(CUSTOMER_FILE, deleted_customer.id)
+        # any accounts left on the customer no longer have an owner
+        deleted_customer.unregister_accounts()
+        b.Customer.names.remove(deleted_customer.id, deleted_customer.name)
         self._customers.pop(deleted_customer.id)
         self._current_user = None
 
@@ -646,6 +757,9 @@ class Menu():
             if self._current_user is not None:
                 self._customers[self._current_user.id] = self._current_user
             self._current_user = None
+            # everything the session changed is written now
+            if b.UNIT_OF_WORK is not None:
+                b.UNIT_OF_WORK.commit()
 
     def display_accounts(self):
         for account in self._accounts:
@@ -701,13 +815,11 @@ class Menu():
                                                            type_selection=b.Customer,
                                                            option_headers=[
                                                                "id", "Name"],
-                                                           available_options=list(
-                                                               self._customers),
-                                                           list_objs=self._customers)
+                                                           list_objs=self._customers,
+                                                           search=b.Customer.names.search)
                     input_state = 0
                     while self.is_logged_in() == False and input_state != id_selection.cancelled:
-                        # display available users to login
-                        # TODO: Add pagination here
+                        # display available users to login a page at a time
                         # self.display_users()
                         input_state = id_selection.prompt_user()
                         # user_input = input("Select id from users ('x' to exit):")
@@ -830,19 +942,15 @@ class Menu():
                         confirm_state = confirm.prompt_user()
                         if(confirm_state == confirm.succeed):
                             print("Please select another user to transfer to.")
-                            # removes the current user from the list of options to prevent user sending to themselves
-                            user_list_wout_current = copy.deepcopy(
-                                self._customers)
-                            user_list_wout_current.pop(self._current_user.id)
-                            # creates user interaction
+                            # creates user interaction - the current user is left out to prevent user sending to themselves
                             user_recipient_hd = ui.SelectionInteraction(
                                 "",
                                 ui.CANCEL_FLAG,
                                 "Select id from users",
                                 option_headers=["id", "name"],
-                                available_options=list(
-                                    user_list_wout_current),
-                                list_objs=user_list_wout_current)
+                                list_objs=self._customers,
+                                exclude={self._current_user.id},
+                                search=b.Customer.names.search)
                             # prompts user
                             user_recipient_state = user_recipient_hd.prompt_user()
                             if user_recipient_state == user_recipient_hd.succeed:
@@ -870,15 +978,12 @@ class Menu():
                                             print(
                                                 f"Account id {i} is not empty.")
                                             balance_before = self._accounts[i].balance
-                                            if self._current_user.send_money(
+                                            if self.transfer(
                                                     self._accounts[i].balance,
                                                     self._accounts[i],
                                                     self._accounts[recipient_account.id]):
                                                 print(
                                                     f"€{balance_before} transferred from your account.")
-                                                # prints transaction
-                                                self.write_transaction(
-                                                    2, self._accounts[i].id, balance_before, recipient_account.id)
                                                 # DELETE ACCOUNT
                                                 accounts_to_remove.append(
                                                     self._accounts[i].id)
@@ -936,12 +1041,18 @@ class Menu():
         exit_program = False
         while exit_program != True:
 
+            if self.follower is not None:
+                self.follower.maybe_poll()
             if self.display_login() == 1:
                 main_input_hd = ui.MenuInteraction(
                     "", input_prompt="Enter a choice and press enter",
                     cancel_flag=ui.CANCEL_FLAG, options=[1, 2, 3, 4, 5, 6, 7, 8])
                 # while user has not quit menu
                 while self.is_logged_in():
+                    if self.follower is not None:
+                        self.follower.maybe_poll()
+                    # savings limits that ran out while waiting for input are cleared
+                    b.LIMIT_SCHEDULER.advance()
                     self.print_menu()
                     # get user input
                     input_state = main_input_hd.prompt_user()
@@ -970,9 +1081,8 @@ class Menu():
                                         ui.CANCEL_FLAG,
                                         "Select id from users",
                                         option_headers=["id", "name"],
-                                        available_options=list(
-                                            self._customers),
-                                        list_objs=self._customers)
+                                        list_objs=self._customers,
+                                        search=b.Customer.names.search)
                                     input_state = user_input_hd.prompt_user()
                                     # checks if the MenuInteraction class succeeded
                                     if input_state == user_input_hd.succeed:
@@ -994,15 +1104,12 @@ class Menu():
                                             amount_state = amount_input_hd.prompt_user()
                                             if amount_state == amount_input_hd.succeed:
                                                 if amount_input_hd.output() > 0:
-                                                    if self._current_user.send_money(
+                                                    if self.transfer(
                                                             amount_input_hd.output(),
                                                             self._current_account,
                                                             recipient_account):
                                                         print(
                                                             f"€{amount_input_hd.output()} transferred from your account.")
-                                                        # prints transaction
-                                                        self.write_transaction(
-                                                            2, self._current_account.id, amount_input_hd.output(), recipient_account.id)
                                                     else:
                                                         print(
                                                             "Transfer Failed.")
@@ -1073,53 +1180,26 @@ class Menu():
                             pass
                         # MENU OPTION 6 -- DISPLAY TRANSACTIONS
                         elif main_input_hd.output() == 6:
-                            # generates transactions from our list of Transaction objects
-                            deposit_list = []
-                            withdraw_list = []
-                            transfer_list = []
-                            received_lsit = []
-                            # loops through transactions
-                            for transaction in self._transactions:
-                                # checks if the account of a current transaction belongs to the current user
-                                if self.get_user_from_account(self._transactions[transaction].acc_id) == self._current_user:
-                                    # checks if the transaction was a deposit
-                                    if self._transactions[transaction].transaction_type == 0:
-                                        # appends to the list of deposits
-                                        deposit_list.append(
-                                            self._transactions[transaction])
-                                    # checks if the transaction was a withdrawal
-                                    elif self._transactions[transaction].transaction_type == 1:
-                                        # appends to the list of withdrawals
-                                        withdraw_list.append(
-                                            self._transactions[transaction])
-                                    # checks if the transaction was a transfer
-                                    elif self._transactions[transaction].transaction_type == 2:
-                                        # appends to the list of transfers
-                                        transfer_list.append(
-                                            self._transactions[transaction])
-                                elif self.get_user_from_account(self._transactions[transaction].rec_acc) == self._current_user and self._transactions[transaction].transaction_type == 2:
-                                    received_lsit.append(
-                                        self._transactions[transaction])
                             # generates the headers
                             print("\nAccount Deposits")
                             print("id\tType\tAccount\tAmount\tTransaction Time")
                             # prints the list of deposits
-                            for i in deposit_list:
+                            for i in self.iter_history(0):
                                 print(i)
                             print("\nAccount Withdrawals")
                             print("id\tType\t\tAccount\tAmount\tTransaction Time")
                             # prints list of withdrawals
-                            for i in withdraw_list:
+                            for i in self.iter_history(1):
                                 print(i)
                             print("\nAccount Transfers")
                             print(
                                 "id\tType\t\tAccount\tAmount\tReceiver\tTransaction Time")
                             # prints the list of transfers
-                            for i in transfer_list:
+                            for i in self.iter_history(2):
                                 print(i)
                             print("\nMoney Received")
                             print("id\tType\tFrom\tAmount")
-                            for i in received_lsit:
+                            for i in self.iter_history(2, received=True):
                                 print(
                                     f"{i.rec_acc}\tReceive\t{i.id}\t{i.amount}")
                             pass
@@ -1158,15 +1238,12 @@ class Menu():
                                             # gets the balance before to write the transaction
                                             balance_before = deleted_account.balance
                                             # checks if we can send the money
-                                            if self._current_user.send_money(
+                                            if self.transfer(
                                                     deleted_account.balance,
                                                     self._accounts[deleted_account.id],
                                                     self._accounts[transfer_to.id]):
                                                 print(
                                                     f"€{balance_before} transferred from your account.")
-                                                # writes transaction
-                                                self.write_transaction(
-                                                    2, deleted_account.id, balance_before, transfer_to.id)
                                                 # deletes account
                                                 self.remove_account(
                                                     deleted_account)
@@ -1214,6 +1291,12 @@ class Menu():
 if __name__ == "__main__":
     # creates our main menu object
     main_object = Menu()
+    if FOLLOW is not None:
+        main_object.follower = follow.Follower(main_object, FOLLOW)
+    # folds the balance journal into the accounts file in the background
+    b.account_journal().start_checkpointer()
+    if b.UNIT_OF_WORK is not None and UNIT_OF_WORK_INTERVAL > 0:
+        b.UNIT_OF_WORK.start_timer(UNIT_OF_WORK_INTERVAL)
 
     # executes our menu loop
 
@@ -1221,6 +1304,22 @@ if __name__ == "__main__":
         main_object.main_menu()
     except KeyboardInterrupt:
         print("Logged out and exiting program")
+    if b.UNIT_OF_WORK is not None:
+        # unsaved changes of a session cut short
+        b.UNIT_OF_WORK.stop_timer()
+        b.UNIT_OF_WORK.commit()
+    # final checkpoint so the accounts file is up to date on exit
+    b.account_journal().stop_checkpointer()
+    b.account_journal().checkpoint()
+    b.close_ledger()
+    if b.STORAGE is not None:
+        b.STORAGE.close()
+    elif SNAPSHOT_FILE is not None:
+        # the next start only parses what changes after this
+        try:
+            snapshot.save(SNAPSHOT_FILE, CUSTOMER_FILE, ACCOUNTS_FILE, TRANSACTION_FILE)
+        except ValueError as e:
+            print(f"Snapshot not saved - the next start reads the text files. ({e})")
     if NON_DESTRUCT:
         # rempoves temporary files
         os.remove(CUSTOMER_FILE) if CUSTOMER_FILE != "customers.txt" else print(
@@ -0,0 +1,131 @@
+"""
+    Memory-mapped reader for the transaction file. The file is mapped read-only and
+    scanned in place - a bytes pattern finds each line's six fields and only those
+    small slices are copied out, so no string per line (or list of lines) is built
+    and the file's pages are shared with the OS cache instead of duplicated.
+
+    rows() yields plain (id, type, acc_id, amount, rec_acc, minutes) tuples - the
+    columns ColumnarLedger and parallel_load work with - and iter_transactions()
+    turns them into Transaction objects. Lines are accepted and skipped exactly as
+    parse_transaction does.
+"""
+import mmap
+import re
+from datetime import timedelta
+from functools import lru_cache
+
+import bank as b
+import timestamps
+
+# one transaction line - six columns, none containing a comma
+LINE = re.compile(rb"^([^,\n]*),([^,\n]*),([^,\n]*),([^,\n]*),([^,\n]*),([^,\n]*)$", re.MULTILINE)
+COMMENT = ord("#")
+MINUTE = timedelta(minutes=1)
+# bytes scanned before the pages behind them are handed back - mapped pages count
+# towards the process's resident size until released
+RELEASE_BYTES = 8 * 1024 * 1024
+
+
+@lru_cache(maxsize=timestamps.CACHE_SIZE)
+def minutes_of(raw: bytes) -> (int):
+    """
+    Converts a timestamp column straight from the file to minutes since Transaction.EPOCH
+
+        Args:
+            raw (bytes): the column, surrounding whitespace included
+
+        Returns:
+            int: the minutes
+
+        Raises:
+            ValueError: the column is not a valid timestamp
+    """
+    return (timestamps.parse(raw.strip().decode()) - b.Transaction.EPOCH) // MINUTE
+
+
+def rows(filename: str, start: int = 0, end: int = None):
+    """
+    Streams the valid transactions of a file, or a byte range of it, as tuples
+
+        Args:
+            filename (str): the transaction file
+            start (int): offset of the first line to read
+            end (int): offset just past the last line to read - the end of the file if None
+
+        Yields:
+            tuple: (id, transaction_type, acc_id, amount, rec_acc, minutes) of each valid line in file order
+    """
+    try:
+        file = open(filename, "rb")
+    except FileNotFoundError:
+        # lets file_handler create the missing file - nothing to stream
+        b.file_handler(filename)
+        return
+    with file:
+        size = file.seek(0, 2)
+        # an empty file can't be mapped
+        if size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # madvise needs page aligned offsets
+            released = start - start % mmap.PAGESIZE
+            for match in LINE.finditer(mapped, start, size if end is None else end):
+                if match.start() - released > RELEASE_BYTES and hasattr(mapped, "madvise"):
+                    # drops the pages already parsed - read-only so nothing is lost
+                    done = match.start() - match.start() % mmap.PAGESIZE
+                    mapped.madvise(mmap.MADV_DONTNEED, released, done - released)
+                    released = done
+                id, transaction_type, acc_id, amount, rec_acc, raw_time = match.groups()
+                # comments are not errors but aren't transactions either
+                if id[:1] and id[0] == COMMENT:
+                    continue
+                try:
+                    yield (int(id), int(transaction_type), int(acc_id), float(amount), int(rec_acc),
+                           minutes_of(raw_time))
+                except ValueError:
+                    # skips broken lines just like the loaders always have
+                    continue
+
+
+def line_end(filename: str, block_size: int = 4096) -> (int):
+    """
+    Finds where the last complete line of a file ends - a line another process is
+    still writing is left for the next read
+
+        Args:
+            filename (str): the file
+            block_size (int): bytes read at a time going backwards
+
+        Returns:
+            int: offset just past the last newline, 0 if there is none or no file
+    """
+    try:
+        file = open(filename, "rb")
+    except FileNotFoundError:
+        return 0
+    with file:
+        position = file.seek(0, 2)
+        while position > 0:
+            start = max(0, position - block_size)
+            file.seek(start)
+            newline = file.read(position - start).rfind(b"\n")
+            if newline != -1:
+                return start + newline + 1
+            position = start
+    return 0
+
+
+def iter_transactions(filename: str, end: int = None):
+    """
+    Streams Transaction objects out of the transaction file through the memory map
+
+        Args:
+            filename (str): the transaction file
+            end (int): offset just past the last line to read - the end of the file if None
+
+        Yields:
+            Transaction: each valid transaction in file order
+    """
+    from_minutes = b.Transaction.from_minutes
+    for row in rows(filename, 0, end):
+        yield from_minutes(*row)
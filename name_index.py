@@ -0,0 +1,175 @@
+"""
+    In-memory search index over customer names, so a customer can be found by
+    name without reading every customer.
+
+    Two sorted lists are kept, both lower-cased and searched with bisect:
+    - every full name, where a prefix finds "sean d" -> "Sean Dowling"
+    - every later part of a name, so "dow" finds "Sean Dowling" too
+    Each entry is "<name>\\0<id>" - plain strings sort several times faster and
+    take less memory than (name, id) tuples, and no name can contain a NUL.
+
+    A lookup costs a binary search plus the matches it returns, however many
+    customers there are. The lists are sorted once, on the first lookup after
+    attach(), so loading a Menu costs nothing extra; add(), rename() and remove()
+    keep them current afterwards.
+"""
+import bisect
+import threading
+
+SEPARATOR = "\0"
+
+
+def entry(text: str, id: int) -> (str):
+    """Returns the list entry of a name or name part"""
+    return f"{text}{SEPARATOR}{id}"
+
+
+def id_of(entry: str) -> (int):
+    """Returns the id an entry belongs to"""
+    return int(entry[entry.rindex(SEPARATOR) + 1:])
+
+
+class NameIndex():
+    """
+    Prefix and name part index of the customers of a dict.
+
+        Attributes:
+            customers : dict[int, Customer]
+                the customers indexed - None until attach()
+            _full : list[str]
+                entry of every full name, sorted - None until the first lookup
+            _parts : list[str]
+                entry of every name part after the first, sorted
+
+        Methods:
+            attach(customers):
+                indexes the customers of a dict from the next lookup on
+            add(id, name) / rename(id, old_name, name) / remove(id, name):
+                keeps the index current as customers change
+            prefix(text):
+                streams the ids whose full name starts with text
+            search(text):
+                streams full name prefix matches, then ids with a name part starting with each word of text
+    """
+
+    def __init__(self):
+        self.customers = None
+        self._full = None
+        self._parts = None
+        self._lock = threading.Lock()
+
+    def attach(self, customers: dict):
+        """
+        Indexes the customers of a dict - the lists are built on the next lookup
+
+            Args:
+                customers (dict[int, Customer]): the customers, kept by reference
+        """
+        with self._lock:
+            self.customers = customers
+            self._full = None
+            self._parts = None
+
+    def _build(self):
+        with self._lock:
+            if self._full is not None or self.customers is None:
+                return
+            full = []
+            parts = []
+            for customer in list(self.customers.values()):
+                name = customer.name.lower()
+                full.append(entry(name, customer.id))
+                for part in name.split()[1:]:
+                    parts.append(entry(part, customer.id))
+            full.sort()
+            parts.sort()
+            self._parts = parts
+            self._full = full
+
+    def _insert(self, name: str, id: int):
+        bisect.insort(self._full, entry(name, id))
+        for part in name.split()[1:]:
+            bisect.insort(self._parts, entry(part, id))
+
+    def _delete(self, name: str, id: int):
+        for entries, text in [(self._full, name)] + [(self._parts, part) for part in name.split()[1:]]:
+            i = bisect.bisect_left(entries, entry(text, id))
+            if i < entries.__len__() and entries[i] == entry(text, id):
+                del entries[i]
+
+    def add(self, id: int, name: str):
+        """Indexes a new customer"""
+        with self._lock:
+            # an index not built yet picks the customer up from the dict
+            if self._full is not None:
+                self._insert(name.lower(), id)
+
+    def rename(self, id: int, old_name: str, name: str):
+        """Moves a customer of the dict to a new name - anyone else is left out"""
+        with self._lock:
+            if self._full is not None and self.customers is not None and id in self.customers:
+                self._delete(old_name.lower(), id)
+                self._insert(name.lower(), id)
+
+    def remove(self, id: int, name: str):
+        """Drops a customer from the index"""
+        with self._lock:
+            if self._full is not None:
+                self._delete(name.lower(), id)
+
+    @staticmethod
+    def _starting(entries: list, text: str):
+        """Streams the ids of the entries starting with text"""
+        i = bisect.bisect_left(entries, text)
+        while i < entries.__len__() and entries[i].startswith(text):
+            yield id_of(entries[i])
+            i += 1
+
+    def prefix(self, text: str):
+        """
+        Streams the ids whose full name starts with text, in name order
+
+            Args:
+                text (str): the start of the name - any case
+
+            Yields:
+                int: each matching id
+        """
+        self._build()
+        if self._full is None or text == "":
+            return
+        yield from self._starting(self._full, text.lower())
+
+    def search(self, text: str):
+        """
+        Streams the ids matching a search - full name prefix matches first, then
+        names with a part starting with each word of text ("se dow" finds
+        "Sean Dowling")
+
+            Args:
+                text (str): what was typed - any case
+
+            Yields:
+                int: each matching id once
+        """
+        words = text.lower().split()
+        if words == []:
+            return
+        seen = set()
+        for id in self.prefix(" ".join(words)):
+            seen.add(id)
+            yield id
+        if self._full is None:
+            return
+        # the longest word narrows the candidates down the most
+        driver = max(words, key=len)
+        others = [word for word in words if word is not driver]
+        for entries in (self._full, self._parts):
+            for id in self._starting(entries, driver):
+                customer = self.customers.get(id)
+                if id in seen or customer is None:
+                    continue
+                parts = customer.name.lower().split()
+                if all(any(part.startswith(word) for part in parts) for word in others):
+                    seen.add(id)
+                    yield id
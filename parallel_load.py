@@ -0,0 +1,160 @@
+"""
+    Parallel loading of large data files. A file is cut into byte ranges that start
+    and end on line boundaries, each range is parsed by a worker process with the
+    usual parse_ functions, and the records come back in file order - so duplicate
+    ids resolve exactly as they do when the file is read serially.
+
+    Workers send plain tuples back rather than objects - they pickle several times
+    faster - and the parent rebuilds the objects from them. Nothing a worker does
+    touches the class-level indexes of the parent (Customer.account_owners,
+    Transaction.by_account) - the Menu loaders register every record they receive.
+"""
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import bank as b
+import mapped_ledger
+
+# files smaller than this are read serially - starting workers costs more
+MIN_PARALLEL_BYTES = 4 * 1024 * 1024
+# largest range handed to one worker - bounds the memory of a result in flight
+MAX_CHUNK_BYTES = 64 * 1024 * 1024
+# ranges in flight per worker - bounds how many parsed results wait to be consumed
+WINDOW_PER_WORKER = 2
+
+
+def chunk_ranges(filename: str, chunks: int, end: int = None) -> (list):
+    """
+    Splits a file into byte ranges that start and end on line boundaries
+
+        Args:
+            filename (str): the file to split
+            chunks (int): roughly how many ranges to make
+            end (int): offset just past the last line to cover - the end of the file if None
+
+        Returns:
+            list[tuple]: (start, end) byte offsets covering the whole file in order
+    """
+    size = os.path.getsize(filename) if end is None else end
+    chunks = max(1, chunks, -(-size // MAX_CHUNK_BYTES))
+    ranges = []
+    with open(filename, "rb") as file:
+        start = 0
+        for i in range(1, chunks + 1):
+            if start >= size:
+                break
+            end = size * i // chunks
+            if end < size:
+                # moves the cut to the start of the next line
+                file.seek(max(end, start))
+                file.readline()
+                end = file.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+# bank imports this module - the helpers below only touch it once they run
+
+def customer_row(customer) -> (tuple):
+    return (customer.id, customer.name, customer.age, customer.password, customer.account_ids)
+
+
+def account_row(account) -> (tuple):
+    acc_type, credit, timestamp = account.record_fields()
+    return (acc_type, account.id, account._balance, credit, timestamp)
+
+
+def transaction_row(transaction) -> (tuple):
+    return (transaction.id, transaction.transaction_type, transaction.acc_id,
+            transaction.amount, transaction.rec_acc, transaction._minutes)
+
+
+def account_from_row(row: tuple):
+    if row[0] == 0:
+        return b.SavingAccount(row[1], row[2], row[4])
+    return b.CheckingAccount(row[1], row[2], row[3])
+
+
+# parser name -> (record to tuple in the worker, tuple to record in the parent)
+ROW_CODECS = {"parse_customer": (customer_row, lambda row: b.Customer(*row)),
+              "parse_account": (account_row, account_from_row),
+              "parse_transaction": (transaction_row, lambda row: b.Transaction.from_minutes(*row))}
+
+
+def parse_range(filename: str, start: int, end: int, parser) -> (list):
+    """
+    Parses every valid line of a byte range - runs in a worker process
+
+        Args:
+            filename (str): the data file
+            start (int): offset of the first line
+            end (int): offset just past the last line
+            parser (function): parse_customer, parse_account or parse_transaction
+
+        Returns:
+            list[tuple]: the records as ROW_CODECS tuples in file order (invalid lines are skipped)
+    """
+    if parser.__name__ == "parse_transaction":
+        # transactions are parsed straight out of a memory map
+        return list(mapped_ledger.rows(filename, start, end))
+    to_row = ROW_CODECS[parser.__name__][0]
+    records = []
+    with open(filename, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    # only newlines end a line, like the serial readers - splitlines() also cuts on \x1c, \x85 and others
+    for line in data.decode().split("\n"):
+        try:
+            record = parser(line)
+        except b.InvalidRecord:
+            # skips broken lines just like the loaders always have
+            continue
+        if record is not None:
+            records.append(to_row(record))
+    return records
+
+
+def iter_parallel(filename: str, parser, workers: int, end: int = None):
+    """
+    Streams the records of a data file parsed by a pool of worker processes
+
+        Args:
+            filename (str): the data file
+            parser (function): parse_customer, parse_account or parse_transaction
+            workers (int): number of worker processes
+            end (int): offset just past the last line to read (transactions only) - the end of the file if None
+
+        Yields:
+            Customer, Account or Transaction: each valid record in file order
+    """
+    try:
+        size = os.path.getsize(filename) if end is None else end
+    except FileNotFoundError:
+        size = 0
+    if workers <= 1 or size < MIN_PARALLEL_BYTES:
+        if parser.__name__ == "parse_transaction":
+            yield from mapped_ledger.iter_transactions(filename, end)
+        else:
+            yield from b.iter_records(filename, parser)
+        return
+    # a few ranges per worker so one slow range doesn't hold up the others
+    ranges = chunk_ranges(filename, workers * 4, end)
+    from_row = ROW_CODECS[parser.__name__][1]
+    pending = iter(ranges)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # a bounded window of ranges is submitted - map would queue every range's result at once
+        window = collections.deque()
+        for start, stop in pending:
+            window.append(executor.submit(parse_range, filename, start, stop, parser))
+            if window.__len__() >= workers * WINDOW_PER_WORKER:
+                break
+        while window:
+            # results are taken in submission order - file order
+            rows = window.popleft().result()
+            for start, stop in pending:
+                window.append(executor.submit(parse_range, filename, start, stop, parser))
+                break
+            for row in rows:
+                yield from_row(row)
@@ -0,0 +1,269 @@
+"""
+    asyncio front-end serving the bank over a local socket, so many clients can use
+    one process at once. Each connection speaks JSON lines - one request object per
+    line, answered by one response object per line carrying the same "id".
+
+    Requests
+        {"id": 1, "op": "login", "customer": 3, "password": "Shane123"}
+        {"id": 2, "op": "accounts"}
+        {"id": 3, "op": "deposit", "account": 15, "amount": 10}
+        {"id": 4, "op": "withdraw", "account": 15, "amount": 5}
+        {"id": 5, "op": "transfer", "account": 15, "to": 9, "amount": 5}
+        {"id": 6, "op": "history", "account": 15, "limit": 20}
+        {"id": 7, "op": "logout"}
+    Responses
+        {"id": 3, "ok": true, "transaction": {...}, "balance": 10.0}
+        {"id": 4, "ok": false, "error": "insufficient funds or transaction limit reached"}
+
+    Money moves through an AccountEngine. The engine call and the wait for its
+    commit run in a thread pool so the event loop never blocks on disk.
+
+    Usage:
+        python server.py [--unix PATH | --host HOST --port PORT] [main.py arguments...]
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import bank as b
+import batch
+import engine
+
+# longest request line accepted
+LINE_LIMIT = 64 * 1024
+# threads available for posting and waiting on commits
+WORKERS = 32
+# pending connections the socket queues - thousands of clients can connect at once
+BACKLOG = 4096
+
+
+class RequestFailed(Exception):
+    """Raised by a handler to answer a request with an error"""
+
+
+def account_info(account: b.Account) -> (dict):
+    """Returns an account as a JSON-able dict"""
+    b.LIMIT_SCHEDULER.advance()
+    return {"id": account.id, "type": account.type, "balance": account.balance,
+            "limit_reached": account.limit_reached}
+
+
+def transaction_info(transaction: b.Transaction) -> (dict):
+    """Returns a transaction as a JSON-able dict"""
+    return {"id": transaction.id, "type": transaction.transaction_type, "account": transaction.acc_id,
+            "amount": transaction.amount, "to": transaction.rec_acc,
+            "timestamp": str(transaction.timestamp)}
+
+
+class BankServer():
+    """
+    JSON lines server on top of a Menu and an AccountEngine.
+
+        Attributes:
+            menu : Menu
+                the menu holding customers, accounts and the ledger
+            engine : AccountEngine
+                posts every money movement
+            executor : ThreadPoolExecutor
+                runs engine calls off the event loop
+
+        Methods:
+            serve(unix_path, host, port):
+                listens until cancelled
+            handle(reader, writer):
+                serves one connection
+            dispatch(session, request):
+                answers one request
+    """
+
+    def __init__(self, menu, account_engine: engine.AccountEngine = None, workers: int = WORKERS):
+        self.menu = menu
+        # history is served from the indexes - they have to be paged in first
+        self.menu.ensure_transactions()
+        self.engine = account_engine if account_engine is not None else engine.AccountEngine(menu)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bank-server")
+        self.handlers = {"login": self.login, "logout": self.logout, "accounts": self.accounts,
+                         "deposit": self.deposit, "withdraw": self.withdraw,
+                         "transfer": self.transfer, "history": self.history}
+
+    async def serve(self, unix_path: str = None, host: str = "127.0.0.1", port: int = 8765,
+                    ready: asyncio.Event = None):
+        """
+        Listens on a unix socket, or on host:port if no path is given, until cancelled
+
+            Args:
+                unix_path (str): unix socket path
+                host (str): TCP host
+                port (int): TCP port
+                ready (asyncio.Event): set once the socket is listening
+        """
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=unix_path, limit=LINE_LIMIT,
+                                                     backlog=BACKLOG)
+        else:
+            server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT, backlog=BACKLOG)
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves one connection until the client hangs up"""
+        # per connection state - who is logged in
+        session = {"customer": None}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be an object")
+                except ValueError as e:
+                    response = {"id": None, "ok": False, "error": f"bad request: {e}"}
+                else:
+                    response = await self.dispatch(session, request)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            # client went away or sent an oversized line
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, session: dict, request: dict) -> (dict):
+        """
+        Answers one request
+
+            Args:
+                session (dict): the connection's state
+                request (dict): the decoded request
+
+            Returns:
+                dict: the response
+        """
+        handler = self.handlers.get(request.get("op"))
+        try:
+            if handler is None:
+                raise RequestFailed(f"unknown op {request.get('op')!r}")
+            if handler != self.login and session["customer"] is None:
+                raise RequestFailed("not logged in")
+            response = await handler(session, request)
+        except RequestFailed as e:
+            response = {"ok": False, "error": str(e)}
+        except (KeyError, TypeError, ValueError) as e:
+            response = {"ok": False, "error": f"bad request: {e!r}"}
+        response["id"] = request.get("id")
+        return response
+
+    def own_account(self, session: dict, request: dict, field: str = "account") -> (b.Account):
+        """Returns the logged in customer's account named by a request field"""
+        acc_id = int(request[field])
+        if acc_id not in session["customer"].account_ids or acc_id not in self.menu._accounts:
+            raise RequestFailed(f"account {acc_id} is not one of yours")
+        return self.menu._accounts[acc_id]
+
+    async def post(self, operation: batch.Operation) -> (dict):
+        """Posts an operation on the executor and answers once it is committed"""
+        amount = float(operation.amount)
+        # json.loads reads Infinity and NaN - neither is an amount
+        if not (math.isfinite(amount) and amount > 0):
+            raise RequestFailed("amount must be a finite number greater than 0")
+        loop = asyncio.get_running_loop()
+        try:
+            transaction = await loop.run_in_executor(self.executor, self.engine.post_durable, operation)
+        except engine.EngineFailed:
+            raise RequestFailed("changes can't be saved - the server has stopped taking operations")
+        if transaction is None:
+            raise RequestFailed("insufficient funds or transaction limit reached")
+        return {"ok": True, "transaction": transaction_info(transaction),
+                "balance": self.menu._accounts[operation.acc_id].balance}
+
+    async def login(self, session: dict, request: dict) -> (dict):
+        customer = self.menu._customers.get(int(request["customer"]))
+        if customer is None or customer.password != request.get("password"):
+            raise RequestFailed("unknown customer or wrong password")
+        session["customer"] = customer
+        return {"ok": True, "customer": customer.id, "name": customer.name}
+
+    async def logout(self, session: dict, request: dict) -> (dict):
+        session["customer"] = None
+        return {"ok": True}
+
+    async def accounts(self, session: dict, request: dict) -> (dict):
+        return {"ok": True, "accounts": [account_info(self.menu._accounts[acc_id])
+                                         for acc_id in session["customer"].account_ids
+                                         if acc_id in self.menu._accounts]}
+
+    async def deposit(self, session: dict, request: dict) -> (dict):
+        account = self.own_account(session, request)
+        return await self.post(batch.Operation(batch.DEPOSIT, account.id, float(request["amount"])))
+
+    async def withdraw(self, session: dict, request: dict) -> (dict):
+        account = self.own_account(session, request)
+        return await self.post(batch.Operation(batch.WITHDRAW, account.id, float(request["amount"])))
+
+    async def transfer(self, session: dict, request: dict) -> (dict):
+        account = self.own_account(session, request)
+        rec_acc = int(request["to"])
+        # money can be sent to anyone's account, like in the menu
+        if rec_acc not in self.menu._accounts:
+            raise RequestFailed(f"account {rec_acc} does not exist")
+        return await self.post(batch.Operation(batch.TRANSFER, account.id, float(request["amount"]), rec_acc))
+
+    async def history(self, session: dict, request: dict) -> (dict):
+        account = self.own_account(session, request)
+        limit = int(request.get("limit", 20))
+        # everything the account sent plus transfers it received, newest last
+        streams = [b.Transaction.from_account(account.id, transaction_type) for transaction_type in (0, 1, 2)]
+        streams.append([transaction for transaction in b.Transaction.to_account(account.id, 2)
+                        if transaction.acc_id != account.id])
+        # ids come from per-process blocks so they aren't in time order - time orders, the id breaks ties
+        latest = heapq.nlargest(max(limit, 0), itertools.chain(*streams),
+                                key=lambda transaction: (transaction._minutes, transaction.id))
+        return {"ok": True, "transactions": [transaction_info(transaction) for transaction in reversed(latest)]}
+
+    def close(self):
+        """Waits for outstanding posts and stops the engine"""
+        self.executor.shutdown(wait=True)
+        self.engine.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves the bank over a local socket as JSON lines.")
+    parser.add_argument("--unix", help="unix socket path (TCP is used if not given)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args, remaining = parser.parse_known_args()
+    # anything else is for main.py (file names, debug) - it reads sys.argv on import
+    sys.argv = [sys.argv[0]] + remaining
+    import main
+    bank_server = BankServer(main.Menu(), workers=args.workers)
+    b.account_journal().start_checkpointer()
+    print(f"Serving on {args.unix or f'{args.host}:{args.port}'}", flush=True)
+
+    async def run():
+        # a SIGTERM stops serving the same way as ctrl-c so everything is flushed
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        await bank_server.serve(args.unix, args.host, args.port)
+    try:
+        asyncio.run(run())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        bank_server.close()
+        if b.UNIT_OF_WORK is not None:
+            b.UNIT_OF_WORK.commit()
+        b.account_journal().stop_checkpointer()
+        b.account_journal().checkpoint()
+        b.close_ledger()
+        if b.STORAGE is not None:
+            b.STORAGE.close()
@@ -0,0 +1,302 @@
+"""
+    Versioned binary snapshot of the data files, so a Menu can start without
+    parsing and validating every text line. Records are struct packed.
+
+    The snapshot of each file records where it came from: size, inode,
+    modification time and a checksum of its last bytes.
+    - An unchanged customers or accounts file is loaded from the snapshot.
+    - A transaction file that has only grown is loaded from the snapshot plus
+      the lines written after it.
+    - Anything else is parsed from the text as before.
+    - The balance journal is always applied on top.
+
+    Layout (little endian)
+        header      magic, version
+        sources     customers, accounts, transactions: size, inode, mtime_ns, crc32 of the tail
+        customers   count, then id, age, name, password and account ids of each
+        accounts    count, then id, type, balance, credit limit and last transfer of each
+        ledger      count, then id, type, acc_id, amount, rec_acc and minutes of each
+
+    Usage:
+        python snapshot.py save <snapshot> [customers.txt] [accounts.txt] [accountsTransactions.txt]
+"""
+import os
+import struct
+import sys
+import zlib
+
+import bank as b
+import mapped_ledger
+import parallel_load
+
+MAGIC = b"BANKSNAP"
+# bumped whenever the layout changes - other versions are ignored, not misread
+VERSION = 2
+HEADER = struct.Struct("<8sH")
+SOURCE = struct.Struct("<qqqI")
+COUNT = struct.Struct("<q")
+# followed by the name, the password and the account ids
+CUSTOMER = struct.Struct("<qqHHI")
+# followed by the last transfer timestamp of savings accounts
+# types are as wide as the ids - the loaders accept any integer there
+ACCOUNT = struct.Struct("<qqdqH")
+TRANSACTION = struct.Struct("<qqqdqq")
+ACCOUNT_ID = struct.Struct("<q")
+# bytes at the end of a file covered by its checksum
+TAIL_BYTES = 4096
+# ledger rows read from the snapshot at a time
+LEDGER_CHUNK = 65536
+# order of the sources in the file
+FILES = ("customers", "accounts", "transactions")
+
+
+def source_of(filename: str, size: int = None) -> (tuple):
+    """
+    Returns what identifies the contents of a file
+
+        Args:
+            filename (str): the file
+            size (int): bytes of the file covered - all of it if None
+
+        Returns:
+            tuple: (size, inode, modification time in ns, crc32 of the last TAIL_BYTES before size),
+                   None if there is no file
+    """
+    try:
+        with open(filename, "rb") as file:
+            stat = os.fstat(file.fileno())
+            size = stat.st_size if size is None else size
+            file.seek(max(0, size - TAIL_BYTES))
+            tail = file.read(size - max(0, size - TAIL_BYTES))
+    except FileNotFoundError:
+        return None
+    return (size, stat.st_ino, stat.st_mtime_ns, zlib.crc32(tail))
+
+
+class Snapshot():
+    """
+    A snapshot read back from disk. Customers and accounts are decoded up front,
+    the ledger is streamed out of the file when asked for.
+
+        Attributes:
+            filename : str
+                the snapshot file
+            sources : dict[str, tuple]
+                source_of() each data file when it was taken
+            customers : list[Customer]
+                the customers file's customers
+            accounts : list[Account]
+                the accounts file's accounts (without the journal)
+            ledger_count : int
+                number of transactions in the ledger section
+
+        Methods:
+            unchanged(name, filename):
+                whether a data file is exactly as it was
+            ledger_usable(filename):
+                whether the transaction file still starts with the snapshot's lines
+            iter_transactions(filename, end):
+                streams the snapshot's transactions followed by the newer lines of the file
+            rows():
+                streams the snapshot's transactions as tuples
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, "rb") as file:
+            magic, version = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{filename} is not a version {VERSION} snapshot")
+            self.sources = {}
+            for name in FILES:
+                source = SOURCE.unpack(file.read(SOURCE.size))
+                self.sources[name] = None if source[0] < 0 else source
+            self.customers = []
+            for i in range(0, COUNT.unpack(file.read(COUNT.size))[0]):
+                cust_id, age, name_length, password_length, accounts = CUSTOMER.unpack(file.read(CUSTOMER.size))
+                name = file.read(name_length).decode()
+                password = file.read(password_length).decode()
+                account_ids = [ACCOUNT_ID.unpack(file.read(ACCOUNT_ID.size))[0] for j in range(0, accounts)]
+                self.customers.append(b.Customer(cust_id, name, age, password, account_ids))
+            self.accounts = []
+            for i in range(0, COUNT.unpack(file.read(COUNT.size))[0]):
+                acc_id, acc_type, balance, credit, timestamp_length = ACCOUNT.unpack(file.read(ACCOUNT.size))
+                timestamp = file.read(timestamp_length).decode() if acc_type == 0 else None
+                self.accounts.append(parallel_load.account_from_row((acc_type, acc_id, balance, credit, timestamp)))
+            self.ledger_count = COUNT.unpack(file.read(COUNT.size))[0]
+            self._ledger_position = file.tell()
+
+    def unchanged(self, name: str, filename: str) -> (bool):
+        """Whether a data file ("customers" or "accounts") is exactly as it was"""
+        return self.sources[name] is not None and source_of(filename) == self.sources[name]
+
+    def ledger_usable(self, filename: str) -> (bool):
+        """Whether the transaction file is the same file and still starts with the snapshot's lines"""
+        source = self.sources["transactions"]
+        if source is None:
+            return False
+        try:
+            if os.path.getsize(filename) < source[0]:
+                return False
+        except FileNotFoundError:
+            return False
+        current = source_of(filename, source[0])
+        # appends change the time - only the file and the bytes before the cut matter
+        return current is not None and current[1] == source[1] and current[3] == source[3]
+
+    def rows(self):
+        """Streams the ledger section as (id, type, acc_id, amount, rec_acc, minutes) tuples"""
+        with open(self.filename, "rb") as file:
+            file.seek(self._ledger_position)
+            remaining = self.ledger_count
+            while remaining > 0:
+                count = min(remaining, LEDGER_CHUNK)
+                yield from TRANSACTION.iter_unpack(file.read(count * TRANSACTION.size))
+                remaining -= count
+
+    def iter_transactions(self, filename: str, end: int = None):
+        """
+        Streams the snapshot's transactions, then the lines written to the transaction file since
+
+            Args:
+                filename (str): the transaction file - ledger_usable() must be True for it
+                end (int): offset just past the last line to read - the end of the file if None
+
+            Yields:
+                Transaction: each transaction in file order
+        """
+        from_minutes = b.Transaction.from_minutes
+        for row in self.rows():
+            yield from_minutes(*row)
+        for row in mapped_ledger.rows(filename, self.sources["transactions"][0], end):
+            yield from_minutes(*row)
+
+
+def load(filename: str):
+    """
+    Reads a snapshot
+
+        Args:
+            filename (str): the snapshot file
+
+        Returns:
+            Snapshot: the snapshot, None if there is none or it can't be used
+    """
+    try:
+        return Snapshot(filename)
+    except (FileNotFoundError, ValueError, struct.error):
+        # a missing, old or damaged snapshot just means a text load
+        return None
+
+
+def pack(record: struct.Struct, *fields) -> (bytes):
+    """
+    Packs one record
+
+        Raises:
+            ValueError: a field doesn't fit its column (eg. an id past 64 bits or a credit limit that isn't whole)
+    """
+    try:
+        return record.pack(*fields)
+    except struct.error as e:
+        raise ValueError(f"can't snapshot record {fields}: {e}")
+
+
+def save(filename: str, customer_file: str, accounts_file: str, transaction_file: str) -> (tuple):
+    """
+    Takes a snapshot of the data files. Parts the previous snapshot still covers
+    are copied from it, so only what changed since is parsed.
+
+        Args:
+            filename (str): the snapshot file to write
+            customer_file, accounts_file, transaction_file (str): the text files
+
+        Returns:
+            tuple: number of (customers, accounts, transactions) in the snapshot
+
+        Raises:
+            ValueError: a record can't be stored - nothing is written
+    """
+    previous = load(filename)
+    b.flush_ledger()
+    end = mapped_ledger.line_end(transaction_file)
+    # taken before anything is read - a write during the read shows as a change next time
+    sources = {"customers": source_of(customer_file), "accounts": source_of(accounts_file),
+               "transactions": source_of(transaction_file, end)}
+    customers = {}
+    if previous is not None and previous.sources["customers"] == sources["customers"]:
+        records = previous.customers
+    else:
+        records = b.iter_records(customer_file, b.parse_customer)
+    for customer in records:
+        customers[customer.id] = customer
+    accounts = {}
+    if previous is not None and previous.sources["accounts"] == sources["accounts"]:
+        records = previous.accounts
+    else:
+        records = b.iter_records(accounts_file, b.parse_account)
+    for account in records:
+        accounts[account.id] = account
+    if previous is not None and previous.ledger_usable(transaction_file):
+        start = previous.sources["transactions"][0]
+        ledger = [previous.rows()]
+    else:
+        start = 0
+        ledger = []
+    ledger.append(mapped_ledger.rows(transaction_file, start, end))
+    tmp_file = f"{filename}.tmp"
+    count = 0
+    try:
+        with open(tmp_file, "wb") as myfile:
+            myfile.write(HEADER.pack(MAGIC, VERSION))
+            for name in FILES:
+                myfile.write(SOURCE.pack(*(sources[name] or (-1, 0, 0, 0))))
+            myfile.write(COUNT.pack(customers.__len__()))
+            for customer in customers.values():
+                name = customer.name.encode()
+                password = customer.password.encode()
+                myfile.write(pack(CUSTOMER, customer.id, customer.age, name.__len__(), password.__len__(),
+                                  customer.account_ids.__len__()))
+                myfile.write(name + password + b"".join([pack(ACCOUNT_ID, i) for i in customer.account_ids]))
+            myfile.write(COUNT.pack(accounts.__len__()))
+            for account in accounts.values():
+                acc_type, credit, timestamp = account.record_fields()
+                timestamp = (timestamp or "").encode()
+                myfile.write(pack(ACCOUNT, account.id, acc_type, account._balance, credit or 0, timestamp.__len__()))
+                myfile.write(timestamp)
+            count_position = myfile.tell()
+            myfile.write(COUNT.pack(0))
+            chunk = []
+            for rows in ledger:
+                for row in rows:
+                    chunk.append(pack(TRANSACTION, *row))
+                    if chunk.__len__() >= LEDGER_CHUNK:
+                        myfile.write(b"".join(chunk))
+                        count += chunk.__len__()
+                        chunk = []
+            myfile.write(b"".join(chunk))
+            count += chunk.__len__()
+            myfile.seek(count_position)
+            myfile.write(COUNT.pack(count))
+            myfile.flush()
+            os.fsync(myfile.fileno())
+    except ValueError:
+        # the previous snapshot stays - it is checked against the files like always
+        os.remove(tmp_file)
+        raise
+    # a crash never leaves half a snapshot behind
+    os.replace(tmp_file, filename)
+    return (customers.__len__(), accounts.__len__(), count)
+
+
+if __name__ == "__main__":
+    if sys.argv.__len__() < 3 or sys.argv[1] != "save":
+        print("Usage: python snapshot.py save <snapshot> [customers.txt] [accounts.txt] [accountsTransactions.txt]")
+        sys.exit(1)
+    files = sys.argv[3:6] + [b.CUSTOMER_FILE, b.ACCOUNTS_FILE, b.TRANSACTION_FILE][sys.argv[3:6].__len__():]
+    try:
+        counts = save(sys.argv[2], *files)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Saved {counts[0]} customers, {counts[1]} accounts and {counts[2]} transactions to {sys.argv[2]}.")
@@ -0,0 +1,309 @@
+"""
+    Pluggable storage for customers, accounts and transactions. bank.py keeps using
+    the .txt files (with the balance journal or account store) while bank.STORAGE is
+    None - setting it to a Storage sends every load and mutation to that backend.
+
+    SqliteStorage keeps the three record types in indexed SQLite tables. Statements
+    are constant strings so sqlite3 reuses their prepared form, and changes are
+    committed in transactions - either one per mutation or one per transaction() block.
+
+    Usage:
+        python storage.py migrate <database> [customers.txt] [accounts.txt] [accountsTransactions.txt]
+"""
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import sys
+import threading
+from contextlib import contextmanager
+
+import bank as b
+import journal
+import timestamps
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    password TEXT NOT NULL,
+    account_ids TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY,
+    type INTEGER NOT NULL,
+    balance REAL NOT NULL,
+    credit_limit INTEGER,
+    last_transfer TEXT
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER NOT NULL,
+    type INTEGER NOT NULL,
+    acc_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    rec_acc INTEGER NOT NULL,
+    time_stamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_acc_id ON transactions (acc_id, type);
+CREATE INDEX IF NOT EXISTS transactions_rec_acc ON transactions (rec_acc, type);
+"""
+
+# statements are kept constant so the connection's statement cache prepares each once
+SAVE_CUSTOMER = "INSERT OR REPLACE INTO customers (id, name, age, password, account_ids) VALUES (?, ?, ?, ?, ?)"
+SAVE_ACCOUNT = "INSERT OR REPLACE INTO accounts (id, type, balance, credit_limit, last_transfer) VALUES (?, ?, ?, ?, ?)"
+ADD_TRANSACTION = "INSERT INTO transactions (id, type, acc_id, amount, rec_acc, time_stamp) VALUES (?, ?, ?, ?, ?, ?)"
+REMOVE_CUSTOMER = "DELETE FROM customers WHERE id = ?"
+REMOVE_ACCOUNT = "DELETE FROM accounts WHERE id = ?"
+SELECT_CUSTOMERS = "SELECT id, name, age, password, account_ids FROM customers ORDER BY id"
+SELECT_ACCOUNTS = "SELECT id, type, balance, credit_limit, last_transfer FROM accounts ORDER BY id"
+SELECT_TRANSACTIONS = "SELECT id, type, acc_id, amount, rec_acc, time_stamp FROM transactions ORDER BY seq"
+LAST_TRANSACTION = "SELECT id FROM transactions ORDER BY seq DESC LIMIT 1"
+
+
+class Storage(ABC):
+    """
+    Interface every storage backend implements - a backend missing one of the
+    abstract methods can't be constructed.
+
+        Methods:
+            iter_customers() / iter_accounts() / iter_transactions():
+                streams the stored records as Customer, Account and Transaction objects
+            last_transaction_id():
+                id of the newest transaction, None if there are none
+            add_customer(customer) / save_customer(customer):
+                stores a new or changed customer
+            remove_customer(customer_id):
+                deletes a customer
+            add_account(account):
+                stores a new account
+            save_accounts(accounts):
+                stores the current state of several accounts at once
+            remove_account(account_id):
+                deletes an account
+            append_transactions(transactions):
+                adds transactions to the end of the ledger
+            transaction():
+                context manager - everything stored inside is committed together
+            close():
+                releases the backend
+    """
+
+    @abstractmethod
+    def iter_customers(self):
+        ...
+
+    @abstractmethod
+    def iter_accounts(self):
+        ...
+
+    @abstractmethod
+    def iter_transactions(self):
+        ...
+
+    @abstractmethod
+    def last_transaction_id(self):
+        ...
+
+    def add_customer(self, customer: b.Customer):
+        self.save_customer(customer)
+
+    @abstractmethod
+    def save_customer(self, customer: b.Customer):
+        ...
+
+    @abstractmethod
+    def remove_customer(self, customer_id: int):
+        ...
+
+    def add_account(self, account: b.Account):
+        self.save_accounts([account])
+
+    @abstractmethod
+    def save_accounts(self, accounts: list):
+        ...
+
+    @abstractmethod
+    def remove_account(self, account_id: int):
+        ...
+
+    @abstractmethod
+    def append_transactions(self, transactions: list):
+        ...
+
+    @contextmanager
+    def transaction(self):
+        yield self
+
+    def close(self):
+        pass
+
+
+class SqliteStorage(Storage):
+    """
+    Storage backend keeping customers, accounts and transactions in a SQLite database.
+
+        Attributes:
+            database : str
+                path of the database file
+            connection : sqlite3.Connection
+                connection in autocommit mode - transaction() opens explicit ones
+            _depth : int
+                how many transaction() blocks are open - only the outermost commits
+    """
+
+    def __init__(self, database: str):
+        self.database = database
+        # autocommit - every statement outside transaction() is its own transaction
+        self.connection = sqlite3.connect(database, isolation_level=None, check_same_thread=False)
+        # the write-ahead log makes a commit an append instead of a page rewrite,
+        # and NORMAL only syncs it at checkpoints - still safe against application crashes
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._depth = 0
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def transaction(self):
+        """Commits everything stored inside the block at once - nested blocks join the outer one"""
+        with self._lock:
+            if self._depth == 0:
+                self.connection.execute("BEGIN")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.connection.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.connection.execute("COMMIT")
+
+    def iter_customers(self):
+        for cust_id, name, age, password, account_ids in self.connection.execute(SELECT_CUSTOMERS):
+            yield b.Customer(cust_id, name, age, password,
+                             [int(i) for i in account_ids.split("-")] if account_ids != "" else [])
+
+    def iter_accounts(self):
+        for acc_id, acc_type, balance, credit, last_transfer in self.connection.execute(SELECT_ACCOUNTS):
+            if acc_type == 0:
+                yield b.SavingAccount(acc_id, balance, last_transfer)
+            else:
+                yield b.CheckingAccount(acc_id, balance, credit)
+
+    def iter_transactions(self):
+        for row in self.connection.execute(SELECT_TRANSACTIONS):
+            yield b.Transaction(*row)
+
+    def last_transaction_id(self):
+        row = self.connection.execute(LAST_TRANSACTION).fetchone()
+        return None if row is None else row[0]
+
+    def save_customer(self, customer: b.Customer):
+        with self._lock:
+            self.connection.execute(SAVE_CUSTOMER, customer_row(customer))
+
+    def remove_customer(self, customer_id: int):
+        with self._lock:
+            self.connection.execute(REMOVE_CUSTOMER, (customer_id,))
+
+    def save_accounts(self, accounts: list):
+        with self._lock:
+            self.connection.executemany(SAVE_ACCOUNT, [account_row(account) for account in accounts])
+
+    def remove_account(self, account_id: int):
+        with self._lock:
+            self.connection.execute(REMOVE_ACCOUNT, (account_id,))
+
+    def append_transactions(self, transactions: list):
+        with self._lock:
+            self.connection.executemany(ADD_TRANSACTION, [transaction_row(t) for t in transactions])
+
+    def close(self):
+        self.connection.close()
+
+
+def customer_row(customer: b.Customer) -> (tuple):
+    """Returns the customers table row of a customer"""
+    return (customer.id, customer.name, customer.age, customer.password,
+            "-".join(map(str, customer.account_ids)))
+
+
+def account_row(account: b.Account) -> (tuple):
+    """Returns the accounts table row of an account"""
+    acc_type, credit, timestamp = account.record_fields()
+    return (account.id, acc_type, account._balance, credit, timestamp)
+
+
+def transaction_row(transaction: b.Transaction) -> (tuple):
+    """Returns the transactions table row of a transaction"""
+    return (transaction.id, transaction.transaction_type, transaction.acc_id, transaction.amount,
+            transaction.rec_acc, timestamps.format(transaction.timestamp))
+
+
+def migrate(database: str, customer_file: str, accounts_file: str, transaction_file: str) -> (tuple):
+    """
+    Copies the .txt data files into a new SQLite database in one transaction
+
+        Args:
+            database (str): database file to create
+            customer_file, accounts_file, transaction_file (str): the text files
+
+        Returns:
+            tuple: number of (customers, accounts, transactions) copied
+
+        Raises:
+            FileExistsError: the database already exists
+    """
+    if os.path.exists(database):
+        raise FileExistsError(database)
+    # journaled balances are newer than the accounts file lines - replaying the
+    # journal also completes a transfer that never reached the transaction file
+    accounts = {}
+    for account in b.iter_records(accounts_file, b.parse_account):
+        accounts[account.id] = account
+    for line in journal.BalanceJournal(f"{accounts_file}.journal", accounts_file,
+                                       transaction_file).records():
+        try:
+            account = b.parse_account(line)
+        except b.InvalidRecord:
+            continue
+        if account is not None:
+            accounts[account.id] = account
+    storage = SqliteStorage(database)
+    counts = [0, accounts.__len__(), 0]
+    try:
+        with storage.transaction():
+            for customer in b.iter_records(customer_file, b.parse_customer):
+                storage.save_customer(customer)
+                counts[0] += 1
+            storage.save_accounts(list(accounts.values()))
+            # streams the ledger through in chunks rather than holding it all
+            chunk = []
+            for transaction in b.iter_records(transaction_file, b.parse_transaction):
+                chunk.append(transaction)
+                if chunk.__len__() >= 10000:
+                    storage.append_transactions(chunk)
+                    counts[2] += chunk.__len__()
+                    chunk = []
+            storage.append_transactions(chunk)
+            counts[2] += chunk.__len__()
+    finally:
+        storage.close()
+    return tuple(counts)
+
+
+if __name__ == "__main__":
+    if sys.argv.__len__() < 3 or sys.argv[1] != "migrate":
+        print("Usage: python storage.py migrate <database> [customers.txt] [accounts.txt] [accountsTransactions.txt]")
+        sys.exit(1)
+    files = sys.argv[3:6] + [b.CUSTOMER_FILE, b.ACCOUNTS_FILE, b.TRANSACTION_FILE][sys.argv[3:6].__len__():]
+    try:
+        counts = migrate(sys.argv[2], *files)
+    except FileExistsError:
+        print(f"{sys.argv[2]} already exists - migrate only creates new databases.")
+        sys.exit(1)
+    print(f"Migrated {counts[0]} customers, {counts[1]} accounts and {counts[2]} transactions into {sys.argv[2]}.")
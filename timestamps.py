@@ -0,0 +1,68 @@
+"""
+    Timestamp codec for the minute resolution '%b %d %Y %I:%M%p' format used by the
+    accounts and transaction files (eg. "Dec 14 2021 06:53PM").
+
+    datetime.strptime is slow and most transactions share a minute with their
+    neighbours, so parsing is hand rolled and memoised. Anything the fast path
+    does not recognise falls back to strptime so the accepted formats are unchanged.
+"""
+import datetime
+from functools import lru_cache
+
+TIME_FORMAT = '%b %d %Y %I:%M%p'
+# number of distinct minutes remembered by parse
+CACHE_SIZE = 4096
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+          "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+# month abbreviation (any case) -> month number
+MONTH_NUMBERS = {name.lower(): number for number, name in enumerate(MONTHS, start=1)}
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse(text: str) -> (datetime.datetime):
+    """
+    Parses a '%b %d %Y %I:%M%p' timestamp
+
+        Args:
+            text (str): the timestamp
+
+        Returns:
+            datetime: the parsed time
+
+        Raises:
+            ValueError: text is not a valid timestamp
+    """
+    try:
+        month, day, year, clock = text.split()
+        hour, minute = clock[:-2].split(":")
+        meridiem = clock[-2:].upper()
+        # anything unusual goes to strptime so nothing new is accepted - it takes
+        # 1-2 digit days and hours and no whitespace around the timestamp
+        if (year.__len__() != 4 or minute.__len__() != 2 or not
+                (1 <= day.__len__() <= 2 and 1 <= hour.__len__() <= 2) or text != text.strip() or not
+                (hour.isdigit() and minute.isdigit() and day.isdigit() and year.isdigit())):
+            raise ValueError
+        hour = int(hour)
+        if hour < 1 or hour > 12 or meridiem not in ("AM", "PM"):
+            raise ValueError
+        # 12AM is midnight and 12PM is noon
+        hour = hour % 12 + (12 if meridiem == "PM" else 0)
+        return datetime.datetime(int(year), MONTH_NUMBERS[month.lower()], int(day), hour, int(minute))
+    except (ValueError, KeyError):
+        return datetime.datetime.strptime(text, TIME_FORMAT)
+
+
+def format(time: datetime.datetime) -> (str):
+    """
+    Formats a time as a '%b %d %Y %I:%M%p' timestamp
+
+        Args:
+            time (datetime): the time to format
+
+        Returns:
+            str: the timestamp, identical to time.strftime(TIME_FORMAT)
+    """
+    hour = time.hour % 12 or 12
+    meridiem = "PM" if time.hour >= 12 else "AM"
+    return f"{MONTHS[time.month - 1]} {time.day:02d} {time.year} {hour:02d}:{time.minute:02d}{meridiem}"
@@ -0,0 +1,127 @@
+"""
+    Unit of work for customer and account records. While bank.UNIT_OF_WORK is set,
+    changing a customer (name, age or account list) or an account's balance only
+    marks the object dirty. commit() then writes every dirty record together:
+    accounts with one journal write, and customers with a single pass over the
+    customers file however many of them changed.
+
+    Commits happen when asked for, when a user logs out, on a timer, and for
+    accounts before any transaction line is appended, so the ledger never gets
+    ahead of the balances it describes.
+"""
+import threading
+
+import bank as b
+
+
+class UnitOfWork():
+    """
+    Dirty customer and account records waiting to be written.
+
+        Attributes:
+            _customers : dict[int, Customer]
+                changed customers by id
+            _accounts : dict[int, Account]
+                changed accounts by id
+            commits : int
+                commits that wrote something
+
+        Methods:
+            mark_customer(customer) / mark_account(account):
+                records that an object changed
+            discard_customer(customer_id) / discard_account(account_id):
+                forgets a removed object so a commit can't bring it back
+            dirty():
+                number of dirty customers and accounts
+            customer_dirty(customer_id) / account_dirty(account_id):
+                whether an object has changes not written yet
+            commit():
+                writes every dirty record
+            commit_accounts():
+                writes only the dirty accounts
+            start_timer(interval) / stop_timer():
+                commits in a background thread every interval seconds
+    """
+
+    def __init__(self):
+        self._customers = {}
+        self._accounts = {}
+        self.commits = 0
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def mark_customer(self, customer: b.Customer):
+        with self._lock:
+            self._customers[customer.id] = customer
+
+    def mark_account(self, account: b.Account):
+        with self._lock:
+            self._accounts[account.id] = account
+
+    def discard_customer(self, customer_id: int):
+        with self._lock:
+            self._customers.pop(customer_id, None)
+
+    def discard_account(self, account_id: int):
+        with self._lock:
+            self._accounts.pop(account_id, None)
+
+    def dirty(self) -> (tuple):
+        """Returns the number of (customers, accounts) waiting to be written"""
+        with self._lock:
+            return (self._customers.__len__(), self._accounts.__len__())
+
+    def customer_dirty(self, customer_id: int) -> (bool):
+        with self._lock:
+            return customer_id in self._customers
+
+    def account_dirty(self, account_id: int) -> (bool):
+        with self._lock:
+            return account_id in self._accounts
+
+    def commit(self):
+        """Writes every dirty account and customer"""
+        with self._lock:
+            if not self._customers and not self._accounts:
+                return
+            with b.storage_transaction():
+                self._write_accounts()
+                if self._customers:
+                    b.save_customers(list(self._customers.values()))
+                    self._customers.clear()
+            self.commits += 1
+
+    def commit_accounts(self):
+        """Writes only the dirty accounts"""
+        with self._lock:
+            if self._accounts:
+                self._write_accounts()
+                self.commits += 1
+
+    def _write_accounts(self):
+        if self._accounts:
+            # objects are live - their state now is what gets written
+            b.persist_accounts(list(self._accounts.values()))
+            self._accounts.clear()
+
+    def start_timer(self, interval: float = 5.0):
+        """
+        Commits in a background thread every interval seconds
+
+            Args:
+                interval (float): seconds between commits
+        """
+        def run():
+            self.commit()
+            self.start_timer(interval)
+        self.stop_timer()
+        self._timer = threading.Timer(interval, run)
+        # background commits should never keep the program alive
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop_timer(self):
+        """Stops the background commit thread"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
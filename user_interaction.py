@@ -2,6 +2,7 @@
     Used when user interaction is required - contains classes to handle different input
     types and return safe values
 """
+import itertools
 import random
 import string
 
@@ -19,6 +20,8 @@ class Transaction():
 
 
 CANCEL_FLAG = "x"
+# options shown per page by SelectionInteraction
+PAGE_SIZE = 20
 
 
 class UserInteraction():
@@ -279,6 +282,11 @@ class SelectionInteraction(UserInteraction):
 
     (My favourite aspect of this code) - spent a while on it
     (I do apologize that my code is so long and complex)
+
+    Options are shown a page at a time and only the page on screen is turned into
+    text, so a prompt costs the same however many options there are. Typing an id
+    selects it straight away, enter / "n" and "p" move between pages and "/text"
+    lists the options matching text.
         Attributes:
             fail : int
                 input validation failed value
@@ -293,9 +301,16 @@ class SelectionInteraction(UserInteraction):
             type_selection : type
                 used to indicate type of return
             available_options : list
-                list of acceptable choices
+                list of acceptable choices - every key of list_objs if None
             list_obs : list
                 list (type_selection type) of items to choose from
+            exclude : set
+                ids of list_objs that are not offered
+            page_size : int
+                options shown per page
+            search : function
+                takes the text after "/" and returns an iterable of matching ids -
+                a scan of the options' text if None
 
         Methods:
             set_output(value):
@@ -313,18 +328,139 @@ class SelectionInteraction(UserInteraction):
                  type_selection=Customer,
                  option_headers: list = None,
                  available_options: list = None,
-                 list_objs: dict = None):
+                 list_objs: dict = None,
+                 exclude: set = None,
+                 page_size: int = PAGE_SIZE,
+                 search=None):
         # updates variables
         self.option_headers = option_headers
         self.available_options = available_options
         self.list_objs = list_objs
         self.type_selection = type_selection
+        self.exclude = exclude if exclude is not None else set()
+        self.page_size = page_size
+        self.search = search
         super().__init__(prompt, cancel_flag, input_prompt)
     """Prompts the user and updates the output"""
 
+    def options(self):
+        """Streams the ids on offer without copying them"""
+        source = self.available_options if self.available_options is not None else self.list_objs
+        for i in source:
+            if i not in self.exclude:
+                yield i
+
+    def is_offered(self, option) -> (bool):
+        """Whether an id can be selected"""
+        if option not in self.list_objs or option in self.exclude:
+            return False
+        # a dict of options answers in O(1) - a given list is short
+        return self.available_options is None or option in self.available_options
+
+    def matches(self, text: str):
+        """Streams the ids on offer whose text contains text - the search mode without an index"""
+        text = text.lower()
+        for i in self.options():
+            if text in str(self.list_objs[i]).lower():
+                yield i
+
+    def option_range(self) -> (str):
+        """Returns the first and last id on offer for the prompt"""
+        source = self.available_options if self.available_options is not None else self.list_objs
+        return f"{next(iter(source))}-{next(reversed(source))}"
+
     def prompt_user(self) -> (int):
         """Prompts user for selection input
 
+        Returns:
+            int: success state of prompt
+        """
+        # the short fixed lists of choices are printed whole
+        if self.type_selection == int:
+            return self.prompt_choice()
+        # makes sure its a list or left to the dict before we check if its empty - helps with debugging
+        if not isinstance(self.available_options, list) and not (
+                self.available_options is None and isinstance(self.list_objs, dict)):
+            # indicates failure
+            return self.fail
+        # makes sure we have options on prompt
+        if next(self.options(), None) is None or self.option_headers == []:
+            # none of type in list - warn user
+            print(f"No {self.type_selection}s created, please create one.")
+            # indicates cancel
+            return self.cancelled
+        if(self.prompt != ""):
+            print(self.prompt)
+        header = ""
+        # runs through headers
+        for i in self.option_headers:
+            header += f"{i}\t"
+        # pages already shown - going back doesn't walk the options again
+        pages = []
+        page = -1
+        source = self.options()
+        while True:
+            if page + 1 == pages.__len__():
+                try:
+                    # only this page's options are read and formatted
+                    next_page = list(itertools.islice(source, self.page_size))
+                except RuntimeError:
+                    # the options changed under the pages - starts them again
+                    source = self.options()
+                    pages = []
+                    page = -1
+                    continue
+                if next_page != [] or pages == []:
+                    pages.append(next_page)
+                elif page >= 0:
+                    print("No more options.")
+            page = min(page + 1, pages.__len__() - 1)
+            if pages[page] == []:
+                print("No matches.")
+            else:
+                options = "".join(f"{str(self.list_objs[i])}\n" for i in pages[page])
+                # prints headers
+                print(f"{header}\n{options}")
+            print(f"Page {page + 1} - enter or \"n\" for the next page, \"p\" for the previous, \"/text\" to search")
+            # displays the input - shows user selection limits of their options
+            user_input = input(
+                f"{self.input_prompt} ({self.option_range()}) (\"{self.cancel_flag}\" to cancel): ")
+            # checks if user cancels
+            if user_input == self.cancel_flag:
+                return self.cancelled
+            elif user_input == "" or user_input.lower() == "n":
+                continue
+            elif user_input.lower() == "p":
+                # steps back two so moving on lands one page back
+                page = max(page - 2, -1)
+            elif user_input.startswith("/"):
+                # restarts the pages on the options matching the search
+                text = user_input[1:].strip()
+                found = self.search(text) if self.search is not None else self.matches(text)
+                source = (i for i in found if self.is_offered(i))
+                pages = []
+                page = -1
+            # checks if the choice was numeric
+            elif user_input.isnumeric():
+                # casts choice to int
+                user_input = int(user_input)
+                # checks if the user selected a safe option
+                if self.is_offered(user_input):
+                    # sets output to that selection
+                    self.set_output(user_input)
+
+                    # indicates success
+                    return self.succeed
+                else:
+                    # indicates invalid choice was selected
+                    return self.invalid_choice
+            else:
+                # indicates failure
+                return self.fail
+
+    def prompt_choice(self) -> (int):
+        """Prompts for one of a short list of numbered choices
+
         Returns:
             int: success state of prompt
         """
@@ -338,18 +474,13 @@ class SelectionInteraction(UserInteraction):
                     header += f"{i}\t"
                 # runs through available options
                 options = ""
-                if self.type_selection == int:
-                    for i in range(0, self.available_options.__len__()):
-                        options += f"{str(self.list_objs[i])}\t{self.available_options[i]}\n"
-                else:
-                    for i in self.available_options:
-                        # converts objects to string (accesses their __str__ magic method)
-                        options += f"{str(self.list_objs[i])}\n"
+                for i in range(0, self.available_options.__len__()):
+                    options += f"{str(self.list_objs[i])}\t{self.available_options[i]}\n"
                 # prints headers
                 print(f"{header}\n{options}")
                 # displays the input - shows user selection limits of their options
                 user_input = input(
-                    f"{self.input_prompt} ({self.available_options[0]}-{self.available_options[-1]}) (\"{self.cancel_flag}\" to cancel): ")
+                    f"{self.input_prompt} ({self.list_objs[0]}-{self.list_objs[self.available_options.__len__() - 1]}) (\"{self.cancel_flag}\" to cancel): ")
                 # checks if user cancels
                 if user_input == self.cancel_flag:
                     return self.cancelled
@@ -357,8 +488,8 @@ class SelectionInteraction(UserInteraction):
                 elif user_input.isnumeric():
                     # casts choice to int
                     user_input = int(user_input)
-                    # checks if the user selected a safe option
-                    if user_input in self.list_objs:
+                    # only the choices that were shown can be picked
+                    if user_input in self.list_objs[:self.available_options.__len__()]:
                         # sets output to that selection
                         self.set_output(user_input)
 